@@ -0,0 +1,74 @@
+"""
+Startup benchmark of the command line interface with a fixed time budget.
+
+Runs `solar-tracking --help` and the help of every subcommand in fresh
+interpreters and reports the best wall time of --repeat runs, next to a bare
+`python -c pass` as reference. With --importtime the slowest imports of
+`import solar_tracking.cli` (python -X importtime) are listed. The exit code is
+1 if `solar-tracking --help` exceeds --budget seconds, so the benchmark can
+guard against heavy libraries (sunpy, matplotlib, OpenCV, astropy) creeping
+back into the import path of the CLI.
+
+Usage:
+    python benchmarks/bench_cli_startup.py [--budget 0.5] [--repeat 5] [--importtime]
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "python -c pass": [sys.executable, "-c", "pass"],
+    "solar-tracking --help": [sys.executable, "-m", "solar_tracking.cli", "--help"],
+    "run_tracking --help": [sys.executable, "-m", "solar_tracking.cli", "run_tracking", "--help"],
+    "detect_spots --help": [sys.executable, "-m", "solar_tracking.cli", "detect_spots", "--help"],
+    "downloader --help": [sys.executable, "-m", "solar_tracking.cli", "downloader", "--help"],
+    "watch --help": [sys.executable, "-m", "solar_tracking.cli", "watch", "--help"],
+}
+
+
+def _best(command, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _slowest_imports(count: int):
+    """Cumulative import times in seconds of `import solar_tracking.cli`, slowest first."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import solar_tracking.cli"],
+                            capture_output=True, text=True, check=True).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line.split("|")
+            entries.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(entries, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget", type=float, default=0.5, help="time budget of `solar-tracking --help` in seconds")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per command (best time is reported)")
+    parser.add_argument("--importtime", action="store_true", help="list the slowest imports of the CLI")
+    args = parser.parse_args()
+
+    results = {label: _best(command, args.repeat) for label, command in COMMANDS.items()}
+    for label, seconds in results.items():
+        print(f"{label:<24} {seconds * 1e3:>8.1f} ms")
+    if args.importtime:
+        print("slowest imports of solar_tracking.cli (cumulative):")
+        for seconds, name in _slowest_imports(10):
+            print(f"  {name:<40} {seconds * 1e3:>8.1f} ms")
+
+    help_time = results["solar-tracking --help"]
+    if help_time > args.budget:
+        print(f"FAIL: solar-tracking --help took {help_time:.3f} s, budget {args.budget:.3f} s")
+        sys.exit(1)
+    print(f"OK: solar-tracking --help within the budget of {args.budget:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
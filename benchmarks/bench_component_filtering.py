@@ -0,0 +1,113 @@
+"""
+Micro-benchmark for the component filter and cluster-merge stage of find_spots_and_boxes.
+
+Compares the previous per-label Python loop (kept below as reference) with the
+vectorized _filter_components/_group_clusters on synthetic
+connectedComponentsWithStats output with increasing component counts, and
+checks that both give identical boxes and centroids.
+
+Usage:
+    python benchmarks/bench_component_filtering.py [--repeat 5]
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from solar_tracking.sunspot_detection import _filter_components, _group_clusters
+
+
+def _legacy_filter(stats, centroids, sun_radius, sun_center, min_area, max_area, max_distance_ratio):
+    filtered_boxes = []
+    filtered_centroids = []
+    for label in range(1, len(stats)):
+        area = stats[label, cv2.CC_STAT_AREA]
+        if not (min_area < area < max_area):
+            continue
+        centroid = centroids[label]
+        distance = np.linalg.norm(np.array(centroid) - np.array(sun_center))
+        if distance > max_distance_ratio * sun_radius:
+            continue
+        x = stats[label, cv2.CC_STAT_LEFT]
+        y = stats[label, cv2.CC_STAT_TOP]
+        w = stats[label, cv2.CC_STAT_WIDTH]
+        h = stats[label, cv2.CC_STAT_HEIGHT]
+        filtered_boxes.append((x, y, w, h))
+        filtered_centroids.append(centroid)
+    return filtered_boxes, filtered_centroids
+
+
+def _legacy_group(filtered_boxes, filtered_centroids, cluster_labels):
+    grouped_boxes = []
+    grouped_centroids = []
+    for cluster in np.unique(cluster_labels):
+        indices = np.where(cluster_labels == cluster)[0]
+        cluster_boxes = [filtered_boxes[i] for i in indices]
+        cluster_centroids = [filtered_centroids[i] for i in indices]
+        x_min = min(box[0] for box in cluster_boxes)
+        y_min = min(box[1] for box in cluster_boxes)
+        x_max = max(box[0] + box[2] for box in cluster_boxes)
+        y_max = max(box[1] + box[3] for box in cluster_boxes)
+        grouped_boxes.append((x_min, y_min, x_max - x_min, y_max - y_min))
+        grouped_centroids.append(np.mean(cluster_centroids, axis=0))
+    return grouped_boxes, grouped_centroids
+
+
+def _synthetic_components(n: int, res: int = 4096, seed: int = 0):
+    """Random component statistics like connectedComponentsWithStats on a noisy frame."""
+    rng = np.random.default_rng(seed)
+    stats = np.zeros((n + 1, 5), dtype=np.int32)
+    stats[1:, cv2.CC_STAT_LEFT] = rng.integers(0, res - 100, n)
+    stats[1:, cv2.CC_STAT_TOP] = rng.integers(0, res - 100, n)
+    stats[1:, cv2.CC_STAT_WIDTH] = rng.integers(1, 100, n)
+    stats[1:, cv2.CC_STAT_HEIGHT] = rng.integers(1, 100, n)
+    stats[1:, cv2.CC_STAT_AREA] = rng.integers(1, 6000, n)
+    centroids = np.zeros((n + 1, 2))
+    centroids[1:] = stats[1:, :2] + stats[1:, 2:4] / 2
+    return stats, centroids
+
+
+def _best_of(repeat, func, *args):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (best time is reported)")
+    args = parser.parse_args()
+
+    sun_radius, sun_center = 1884, (2048, 2048)
+    limits = (1000, 5000, 0.9)
+    print(f"{'components':>10} {'kept':>6} {'loop [ms]':>10} {'vectorized [ms]':>16} {'speedup':>8} {'identical':>9}")
+    for n in (100, 1_000, 10_000, 100_000):
+        stats, centroids = _synthetic_components(n)
+        rng = np.random.default_rng(n)
+        # Several spots share a cluster label, like DBSCAN groups of neighbouring spots
+        rng_labels = rng.integers(0, max(1, n // 20), n)
+
+        def legacy():
+            boxes, cents = _legacy_filter(stats, centroids, sun_radius, sun_center, *limits)
+            labels = rng_labels[:len(boxes)]
+            return _legacy_group(boxes, cents, labels)
+
+        def vectorized():
+            boxes, cents, areas = _filter_components(stats, centroids, sun_radius, sun_center, *limits)
+            labels = rng_labels[:len(boxes)]
+            return _group_clusters(boxes, cents, labels, areas)[:2]
+
+        t_loop, (loop_boxes, loop_cents) = _best_of(args.repeat, legacy)
+        t_vec, (vec_boxes, vec_cents) = _best_of(args.repeat, vectorized)
+        identical = ([[int(v) for v in box] for box in loop_boxes] == vec_boxes.tolist()
+                     and np.allclose(loop_cents, vec_cents, rtol=0, atol=1e-9))
+        print(f"{n:>10} {len(vec_boxes):>6} {t_loop * 1e3:>10.2f} {t_vec * 1e3:>16.3f} "
+              f"{t_loop / t_vec:>8.1f} {str(identical):>9}")
+
+
+if __name__ == "__main__":
+    main()
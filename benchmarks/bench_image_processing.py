@@ -0,0 +1,81 @@
+"""
+Benchmark for image_processing_fits: default loader vs. memory-mapped fused loader.
+
+Writes synthetic 4k frames (uncompressed float32, Rice-compressed float32 and
+Rice-compressed scaled int32 like HMI Ic) to a temporary directory and reports
+the time and the peak traced allocation per frame for both loader modes.
+
+Usage:
+    python benchmarks/bench_image_processing.py [--size 4096] [--repeat 3]
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from astropy.io import fits
+
+from solar_tracking.image_processing import image_processing_fits
+
+
+def _disk_image(size: int) -> np.ndarray:
+    """Limb-darkened solar disk with NaN outside the disk, like HMI Ic."""
+    yy, xx = np.mgrid[:size, :size]
+    rho = np.hypot(xx - size / 2, yy - size / 2) / (0.46 * size)
+    mu = np.sqrt(np.clip(1 - rho ** 2, 0, 1))
+    image = (5e4 * (1 - 0.6 * (1 - mu))).astype(np.float32)
+    image[rho >= 1] = np.nan
+    return image
+
+
+def _write_frames(directory: Path, size: int) -> dict:
+    image = _disk_image(size)
+    paths = {"uncompressed float32": directory / "plain.fits",
+             "rice float32": directory / "rice.fits",
+             "rice scaled int32": directory / "rice_int.fits"}
+    fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(image)]).writeto(paths["uncompressed float32"])
+    fits.HDUList([fits.PrimaryHDU(),
+                  fits.CompImageHDU(image, compression_type="RICE_1")]).writeto(paths["rice float32"])
+    raw = np.nan_to_num(image, nan=-2147483648).astype(np.int32)
+    hdu = fits.CompImageHDU(raw, compression_type="RICE_1")
+    hdu.header["BSCALE"] = 1.0
+    hdu.header["BZERO"] = 0.0
+    hdu.header["BLANK"] = -2147483648
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(paths["rice scaled int32"])
+    return paths
+
+
+def _measure(path: Path, memmap: bool, repeat: int):
+    times = []
+    peaks = []
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        image_processing_fits(path, memmap=memmap)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(times), max(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=4096, help="image size in pixels")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode (best time is reported)")
+    args = parser.parse_args()
+
+    output_mb = args.size * args.size / 2**20
+    print(f"{args.size}x{args.size} frames, 8-bit output buffer = {output_mb:.0f} MiB")
+    print(f"{'file':<22} {'mode':<8} {'time [s]':>9} {'peak [MiB]':>11} {'peak/output':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, path in _write_frames(Path(tmp), args.size).items():
+            for memmap in (False, True):
+                seconds, peak = _measure(path, memmap, args.repeat)
+                print(f"{label:<22} {'memmap' if memmap else 'default':<8} {seconds:>9.3f} "
+                      f"{peak / 2**20:>11.1f} {peak / 2**20 / output_mb:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
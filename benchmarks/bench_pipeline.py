@@ -0,0 +1,182 @@
+"""
+Benchmark suite of the pipeline stages on synthetic HMI-like traces, with regression tracking.
+
+For every resolution (1k, 2k and 4k by default) a Rice-compressed trace with
+spots that rotate at a known differential rate is written to a temporary
+directory (see solar_tracking.synthetic). The suite times
+  - image_processing_fits (per frame),
+  - find_spots_and_boxes (first frame),
+  - the tracking loop of track_spots (per frame),
+  - cal_lon_and_lat (per point, sunpy) and cal_lon_and_lat_header (per point),
+  - perform_fitting and perform_bootstrap_fitting,
+and reports the error of the rotation rates measured from the tracked spots
+against the rates the trace was rendered with.
+
+Every run is appended to a JSON history file. Each stage is compared with the
+median of the last runs on the same host; stages that are slower by more than
+--threshold are reported as regressions (with --check the exit code is 1).
+
+Usage:
+    python benchmarks/bench_pipeline.py [--sizes 1024 2048 4096] [--frames 4] [--repeat 3]
+    python benchmarks/bench_pipeline.py --sizes 1024 --check --threshold 0.25
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+from solar_tracking.fitting import fit_func, perform_bootstrap_fitting, perform_fitting
+from solar_tracking.image_processing import image_processing_fits
+from solar_tracking.linking import drift_direction
+from solar_tracking.rotation_analysis import cal_lon_and_lat, cal_lon_and_lat_header, fit_rotation_rates
+from solar_tracking.sunspot_detection import find_spots_and_boxes, sun_infos
+from solar_tracking.synthetic import DIFFERENTIAL_ROTATION, write_synthetic_trace
+from solar_tracking.tracking import track_spots
+
+DEFAULT_HISTORY = Path(__file__).parent / "results" / "bench_pipeline.json"
+
+
+def _best(function, repeat: int):
+    """Best wall time of `repeat` runs and the result of the last run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def _bench_size(size: int, n_frames: int, cadence: float, repeat: int, tracker: str, fit_points: int) -> dict:
+    import sunpy.map
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths, headers, spots, truth = write_synthetic_trace(Path(tmp) / "TR_01", n_frames, size, cadence)
+        timings = {}
+
+        seconds, frames = _best(lambda: [image_processing_fits(path) for path in paths], repeat)
+        timings["image_processing_fits"] = seconds / n_frames
+
+        sun_radius, sun_center, _ = sun_infos(paths[0])
+        # The area limits of the detection are in pixels, scale them with the resolution. The
+        # block size of the adaptive threshold is fixed, so at 4k only the darker core of a
+        # spot is segmented and the lower limit grows only linearly.
+        scale = size / 1024
+        detection = {"min_area": int(1000 * scale), "max_area": int(5000 * scale ** 2)}
+        timings["find_spots_and_boxes"], (bbox, centroids) = _best(
+            lambda: find_spots_and_boxes(frames[0], sun_radius, sun_center, **detection), repeat)
+
+        options = {}
+        if tracker != "mil":
+            options = {"sun_radius": sun_radius, "sun_center": sun_center, "cadence": cadence,
+                       "direction": drift_direction(paths[0])}
+            if tracker == "link":
+                options["detection_kwargs"] = detection
+        seconds, tracks = _best(lambda: track_spots(frames[0], iter(frames[1:]), bbox, centroids,
+                                                    tracker=tracker, tracker_options=options), repeat)
+        timings["tracking_loop"] = seconds / max(1, n_frames - 1)
+        tracked = [track for track in tracks if track["success"]]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            first_map, last_map = sunpy.map.Map(str(paths[0])), sunpy.map.Map(str(paths[-1]))
+            n_points = 2 * max(1, len(tracked))
+            seconds, coords = _best(lambda: [(cal_lon_and_lat(t["x1"], t["y1"], first_map),
+                                              cal_lon_and_lat(t["x2"], t["y2"], last_map)) for t in tracked],
+                                    repeat)
+        timings["cal_lon_and_lat"] = seconds / n_points
+        x1, y1, x2, y2 = (np.array([t[key] for t in tracked], dtype=float) for key in ("x1", "y1", "x2", "y2"))
+        seconds, (lat1, lon1, lat2, lon2) = _best(
+            lambda: (*cal_lon_and_lat_header(x1, y1, headers[0]), *cal_lon_and_lat_header(x2, y2, headers[-1])),
+            repeat)
+        timings["cal_lon_and_lat_header"] = seconds / n_points
+
+        rng = np.random.default_rng(0)
+        lat = rng.uniform(-35, 35, fit_points)
+        omega = fit_func(lat, *DIFFERENTIAL_ROTATION) + rng.normal(0, 0.3, fit_points)
+        timings["perform_fitting"], _ = _best(lambda: perform_fitting(lat, omega), repeat)
+        timings["perform_bootstrap_fitting"], _ = _best(
+            lambda: perform_bootstrap_fitting(lat, omega, n_bootstrap=1000, seed=0), repeat)
+
+    # Rotation rates of the tracked spots against the rates the trace was rendered with
+    measured, _ = fit_rotation_rates([0.0, cadence * (n_frames - 1)], np.column_stack([lon1, lon2]))
+    error = np.abs(measured - fit_func(lat1, *DIFFERENTIAL_ROTATION))
+    return {"timings": timings, "spots": len(bbox), "tracked": len(tracked),
+            "omega_error": float(np.nanmean(error)) if len(error) else None}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _regressions(history: list, run: dict, threshold: float, baseline_runs: int) -> list:
+    """Stages of `run` slower than the median of the last runs on the same host by more than `threshold`."""
+    previous = [entry for entry in history if entry.get("host") == run["host"]][-baseline_runs:]
+    found = []
+    for size, result in run["sizes"].items():
+        for stage, seconds in result["timings"].items():
+            baseline = [entry["sizes"][size]["timings"][stage] for entry in previous
+                        if stage in entry.get("sizes", {}).get(size, {}).get("timings", {})]
+            if baseline:
+                reference = statistics.median(baseline)
+                if seconds > reference * (1 + threshold):
+                    found.append((size, stage, reference, seconds))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048, 4096], help="image sizes in pixels")
+    parser.add_argument("--frames", type=int, default=4, help="frames per synthetic trace")
+    parser.add_argument("--cadence", type=float, default=6.0, help="hours between two frames")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage (best time is reported)")
+    parser.add_argument("--tracker", choices=("mil", "link", "roi"), default="mil", help="tracker of the loop")
+    parser.add_argument("--fit-points", type=int, default=1000, help="data points of the fitting stages")
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY, help="JSON file with previous runs")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown reported as regression")
+    parser.add_argument("--baseline-runs", type=int, default=5, help="previous runs the median is taken over")
+    parser.add_argument("--check", action="store_true", help="exit with code 1 if a stage regressed")
+    args = parser.parse_args()
+
+    import cv2
+
+    run = {"date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+           "commit": _git_commit(), "host": platform.node(), "python": platform.python_version(),
+           "numpy": np.__version__, "opencv": cv2.__version__, "tracker": args.tracker,
+           "frames": args.frames, "sizes": {}}
+    for size in args.sizes:
+        result = _bench_size(size, args.frames, args.cadence, args.repeat, args.tracker, args.fit_points)
+        run["sizes"][str(size)] = result
+        error = "n/a" if result["omega_error"] is None else f"{result['omega_error']:.3f} deg/day"
+        print(f"{size}x{size}: {result['spots']} spots, {result['tracked']} tracked, omega error {error}")
+        for stage, seconds in result["timings"].items():
+            print(f"  {stage:<26} {seconds * 1e3:>10.3f} ms")
+
+    history = json.loads(args.history.read_text()) if args.history.exists() else []
+    regressions = _regressions(history, run, args.threshold, args.baseline_runs)
+    for size, stage, reference, seconds in regressions:
+        print(f"REGRESSION {size}px {stage}: {reference * 1e3:.3f} ms -> {seconds * 1e3:.3f} ms "
+              f"({seconds / reference - 1:+.0%})")
+    if not args.no_save:
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        args.history.write_text(json.dumps(history + [run], indent=2))
+        print(f"run {len(history) + 1} appended to {args.history}")
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
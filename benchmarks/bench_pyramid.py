@@ -0,0 +1,122 @@
+"""
+Benchmark of the coarse-to-fine pyramid mode (pyramid_levels) against full resolution.
+
+For every resolution a synthetic trace with known spot positions is written
+to a temporary directory (see solar_tracking.synthetic) and decoded once. For
+each pyramid level the benchmark times
+  - find_spots_and_boxes on the first frame,
+  - the tracking loop of every tracker (per frame),
+and reports the endpoint error of the tracked spots against the true
+positions and against the endpoints of the same tracker at full resolution
+(level 0). Detection at a pyramid level is compared with full-resolution
+detection by the largest centroid offset.
+
+Usage:
+    python benchmarks/bench_pyramid.py [--sizes 2048 4096] [--levels 0 1 2] [--frames 8]
+    python benchmarks/bench_pyramid.py --trackers roi link --repeat 3
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from solar_tracking.image_processing import image_processing_fits
+from solar_tracking.linking import drift_direction
+from solar_tracking.sunspot_detection import find_spots_and_boxes, sun_infos
+from solar_tracking.synthetic import write_synthetic_trace
+from solar_tracking.tracking import track_spots
+
+
+def _best(function, repeat: int):
+    """Best wall time of `repeat` runs and the result of the last run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def _endpoints(tracks):
+    return np.array([(t["x2"], t["y2"]) if t["success"] else (np.nan, np.nan) for t in tracks], dtype=float)
+
+
+def _nearest_distance(points, reference):
+    """Distance of every point to the nearest reference point (NaN rows stay NaN)."""
+    if len(points) == 0 or len(reference) == 0:
+        return np.full(len(points), np.nan)
+    distance = np.linalg.norm(np.asarray(points)[:, None] - np.asarray(reference)[None], axis=2)
+    return np.nanmin(np.where(np.isnan(distance), np.inf, distance), axis=1)
+
+
+def _bench_size(size: int, levels, trackers, n_frames: int, cadence: float, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths, _, _, truth = write_synthetic_trace(Path(tmp) / "TR_01", n_frames, size, cadence)
+        frames = [image_processing_fits(path) for path in paths]
+        sun_radius, sun_center, _ = sun_infos(paths[0])
+        direction = drift_direction(paths[0])
+
+    # Area limits as in bench_pipeline: scaled with the resolution
+    scale = size / 1024
+    detection = {"min_area": int(1000 * scale), "max_area": int(5000 * scale ** 2)}
+    print(f"{size}x{size}, {n_frames} frames, {truth.shape[1]} true spots")
+
+    full = {}
+    for level in levels:
+        kwargs = dict(detection, pyramid_levels=level) if level else dict(detection)
+        seconds, (bbox, centroids) = _best(lambda: find_spots_and_boxes(frames[0], sun_radius, sun_center, **kwargs),
+                                           repeat)
+        if level == 0:
+            full["detection"] = (seconds, np.asarray(centroids))
+        line = f"  level {level}  detection {seconds * 1e3:8.1f} ms, {len(bbox)} spots"
+        if level and "detection" in full:
+            offset = _nearest_distance(np.asarray(centroids), full["detection"][1])
+            line += (f", speedup {full['detection'][0] / seconds:5.1f}x, "
+                     f"max centroid offset {np.max(offset, initial=0):.2f} px")
+        print(line)
+
+        for tracker in trackers:
+            options = {}
+            if tracker != "mil":
+                options = {"sun_radius": sun_radius, "sun_center": sun_center, "cadence": cadence,
+                           "direction": direction}
+                if tracker == "link":
+                    options["detection_kwargs"] = kwargs
+            if level and tracker != "link":
+                options = dict(options, sun_radius=sun_radius, sun_center=sun_center, pyramid_levels=level,
+                               detection_kwargs=kwargs)
+            seconds, tracks = _best(lambda: track_spots(frames[0], iter(frames[1:]), bbox, centroids,
+                                                        tracker=tracker, tracker_options=options), repeat)
+            per_frame = seconds / max(1, n_frames - 1)
+            endpoints = _endpoints(tracks)
+            error = _nearest_distance(endpoints, truth[-1])
+            line = (f"    {tracker:>4}: {per_frame * 1e3:8.1f} ms/frame, {sum(t['success'] for t in tracks)} tracked, "
+                    f"endpoint error vs. truth mean {np.nanmean(error):.2f} px, max {np.nanmax(error):.2f} px")
+            if level == 0:
+                full[tracker] = (per_frame, endpoints)
+            elif tracker in full:
+                difference = _nearest_distance(endpoints, full[tracker][1])
+                line += (f", speedup {full[tracker][0] / per_frame:5.1f}x, "
+                         f"vs. level 0 max {np.nanmax(difference):.2f} px")
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 4096], help="edge lengths of the frames")
+    parser.add_argument("--levels", type=int, nargs="+", default=[0, 1, 2], help="pyramid levels (0 = full resolution)")
+    parser.add_argument("--trackers", nargs="+", default=["roi", "link", "mil"], help="trackers to run")
+    parser.add_argument("--frames", type=int, default=8, help="number of frames per trace")
+    parser.add_argument("--cadence", type=float, default=6.0, help="hours between two frames")
+    parser.add_argument("--repeat", type=int, default=1, help="repetitions per measurement (best is reported)")
+    args = parser.parse_args()
+
+    levels = sorted(set(args.levels) | {0})
+    for size in args.sizes:
+        _bench_size(size, levels, args.trackers, args.frames, args.cadence, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark of the tracker backends: OpenCV MIL vs. detection linking vs. ROI correlation.
+
+Renders a synthetic trace (limb-darkened disk, noise, spots with umbra and
+penumbra that move with the differential rotation model of
+solar_tracking.linking) and runs all trackers on the same frames (the ROI
+tracker with normalized cross-correlation and with phase correlation).
+Reports the time per frame and the error of the tracked displacement
+(x2 - x1, y2 - y1, which feeds the rotation fit) against the true motion.
+With --trace, a real trace from data/TR_XX is used instead; without ground
+truth the endpoints of the trackers are compared with MIL.
+
+Usage:
+    python benchmarks/bench_trackers.py [--size 2048] [--frames 12] [--fast-detection]
+    python benchmarks/bench_trackers.py --trace 1
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from solar_tracking.linking import predict_positions
+from solar_tracking.sunspot_detection import find_spots_and_boxes
+from solar_tracking.tracking import FAST_DETECTION, _create_session
+
+
+def _synthetic_trace(size: int, n_frames: int, cadence: float, seed: int = 0):
+    """Frames, sun geometry and true spot positions per frame."""
+    rng = np.random.default_rng(seed)
+    sun_radius, center = int(size * 0.46), size // 2
+    yy, xx = np.mgrid[:size, :size]
+    rho = np.hypot(xx - center, yy - center) / sun_radius
+    disk = np.where(rho < 1, 1 - 0.6 * (1 - np.sqrt(np.clip(1 - rho**2, 0, 1))), 0) * 230
+    offsets = np.array([[-0.45, -0.30], [-0.20, 0.25], [0.05, -0.10], [-0.35, 0.45], [0.10, 0.35]])
+    positions = center + offsets * sun_radius
+    scale = size / 1024
+    frames, truth = [], []
+    for _ in range(n_frames):
+        image = disk.copy()
+        for x, y in positions:
+            # Penumbra und Umbra, leicht elliptisch wie ein Spot außerhalb der Scheibenmitte
+            cv2.ellipse(image, (int(round(x)), int(round(y))), (int(22 * scale), int(18 * scale)),
+                        0, 0, 360, float(disk[int(y), int(x)]) * 0.65, thickness=-1)
+            cv2.circle(image, (int(round(x)), int(round(y))), int(10 * scale),
+                       float(disk[int(y), int(x)]) * 0.3, thickness=-1)
+        image = np.clip(image + rng.normal(0, 2, image.shape), 0, 255).astype(np.uint8)
+        frames.append(image)
+        truth.append(positions)
+        positions = predict_positions(positions, sun_radius, (center, center), cadence)
+    return frames, sun_radius, (center, center), np.array(truth)
+
+
+def _trace_frames(trace: int):
+    from solar_tracking.image_processing import iter_frames
+    from solar_tracking.linking import drift_direction
+    from solar_tracking.sunspot_detection import sun_infos
+    from solar_tracking.traces import trace_files
+
+    fit_paths = trace_files(trace)
+    sun_radius, sun_center, _ = sun_infos(fit_paths[0])
+    return list(iter_frames(fit_paths)), sun_radius, sun_center, drift_direction(fit_paths[0])
+
+
+def _run(tracker, frames, bbox, centroids, options):
+    start = time.perf_counter()
+    session = _create_session(tracker, frames[0], bbox, centroids, **options)
+    for image in frames[1:]:
+        session.update(image)
+    elapsed = time.perf_counter() - start
+    return session.tracks, elapsed / max(1, len(frames) - 1)
+
+
+def _endpoints(tracks):
+    return np.array([(t["x2"], t["y2"]) if t["success"] else (np.nan, np.nan) for t in tracks], dtype=float)
+
+
+def _displacements(tracks):
+    return _endpoints(tracks) - np.array([(t["x1"], t["y1"]) for t in tracks], dtype=float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=2048, help="edge length of the synthetic frames")
+    parser.add_argument("--frames", type=int, default=12, help="number of synthetic frames")
+    parser.add_argument("--cadence", type=float, default=1.0, help="hours between two frames")
+    parser.add_argument("--trace", type=int, default=None, help="use data/TR_XX instead of synthetic frames")
+    parser.add_argument("--fast-detection", action="store_true", help="use FAST_DETECTION for the detection")
+    args = parser.parse_args()
+
+    detection_kwargs = FAST_DETECTION if args.fast_detection else {}
+    truth, direction = None, 1
+    if args.trace is None:
+        frames, sun_radius, sun_center, truth = _synthetic_trace(args.size, args.frames, args.cadence)
+    else:
+        frames, sun_radius, sun_center, direction = _trace_frames(args.trace)
+    bbox, centroids = find_spots_and_boxes(frames[0], sun_radius, sun_center, **detection_kwargs)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, {len(bbox)} spots")
+
+    link_options = {"sun_radius": sun_radius, "sun_center": sun_center, "cadence": args.cadence,
+                    "direction": direction, "detection_kwargs": detection_kwargs}
+    roi_options = {key: link_options[key] for key in ("sun_radius", "sun_center", "cadence", "direction")}
+    results = {}
+    for name, tracker, options in (("mil", "mil", {}), ("link", "link", link_options),
+                                   ("roi", "roi", roi_options),
+                                   ("roi-phase", "roi", dict(roi_options, method="phase"))):
+        tracks, per_frame = _run(tracker, frames, bbox, centroids, options)
+        results[name] = _endpoints(tracks)
+        line = f"{name:>9}: {per_frame * 1e3:8.1f} ms/frame, {sum(t['success'] for t in tracks)} tracked"
+        if truth is not None:
+            # Each detected spot is matched to the nearest true start position
+            nearest = np.argmin(np.linalg.norm(np.asarray(centroids)[:, None] - truth[0], axis=2), axis=1)
+            error = np.linalg.norm(_displacements(tracks) - (truth[-1] - truth[0])[nearest], axis=1)
+            line += f", displacement error mean {np.nanmean(error):.2f} px, max {np.nanmax(error):.2f} px"
+        print(line)
+    if truth is None:
+        for name in ("link", "roi", "roi-phase"):
+            difference = np.linalg.norm(results["mil"] - results[name], axis=1)
+            print(f"endpoint difference mil vs. {name}: mean {np.nanmean(difference):.2f} px, "
+                  f"max {np.nanmax(difference):.2f} px")
+
+
+if __name__ == "__main__":
+    main()
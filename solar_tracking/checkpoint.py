@@ -0,0 +1,68 @@
+"""
+Checkpoints für lange Tracking-Läufe.
+
+Ein Checkpoint hält die Position in der Bildserie, die Tracking-Session mit
+dem Zustand aller Spots und die bisherige Trajectory. Er wird von track_spots
+alle checkpoint_every Bilder als 'data/TR_XX/tracking_checkpoint.pkl'
+geschrieben (temporäre Datei + os.replace, ein abgebrochener Schreibvorgang
+hinterlässt also immer den vorherigen Checkpoint). Mit run_tracking(...,
+resume=True) wird nach dem Bild des Checkpoints weitergemacht, ohne die
+bereits verfolgten Bilder erneut zu dekodieren. Nach einem vollständigen Lauf
+wird der Checkpoint gelöscht.
+
+Der TraceWatcher (solar_tracking.watch) speichert seinen Zustand nach jeder
+Abfrage auf dieselbe Weise in 'data/TR_XX/watch_checkpoint.pkl'.
+
+Die OpenCV-MIL-Tracker lassen sich nicht speichern; sie werden beim Fortsetzen
+auf dem Bild des Checkpoints an der letzten Box jedes Spots neu angelegt (siehe
+TrackingSession.resume), ihr gelerntes Modell beginnt dort also von vorn.
+"""
+import os
+import pickle
+import uuid
+from pathlib import Path
+
+# Wird erhöht, wenn sich der Inhalt eines Checkpoints ändert
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(trace: int, kind: str = "tracking") -> Path:
+    """Datei des Checkpoints einer Trace-Serie; kind "watch" für den TraceWatcher."""
+    from solar_tracking.traces import trace_dir
+
+    return trace_dir(trace) / f"{kind}_checkpoint.pkl"
+
+
+def save_checkpoint(path, **state):
+    """
+    Schreibt einen Checkpoint atomar.
+
+    Args:
+        path (Path): Datei des Checkpoints
+        **state: Inhalt, z. B. frame, tracker, session und trajectory (siehe track_spots)
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(dict(state, version=CHECKPOINT_VERSION), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """
+    Lädt einen Checkpoint.
+
+    Returns:
+        dict or None: Inhalt des Checkpoints, None wenn keiner existiert
+
+    Raises:
+        ValueError: wenn der Checkpoint aus einer anderen Version stammt
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Der Checkpoint {path} stammt aus einer anderen Version und kann nicht fortgesetzt werden.")
+    return state
@@ -1,11 +1,15 @@
 import argparse
-import matplotlib.pyplot as plt
-import sunpy.map
-from solar_tracking.downloader import download_fits
-from solar_tracking.tracking import run_tracking  # Falls dein Tracking-Tool so heißt
+
+# Schwere Bibliotheken (sunpy, matplotlib, OpenCV, astropy) werden erst im
+# jeweiligen Befehl importiert, damit `--help` und kurze Aufrufe schnell starten.
+from solar_tracking import profiling
+from solar_tracking.defaults import FAST_DETECTION, TRACKERS
 
 def view_fits(file_path):
     """Zeigt eine FITS-Datei als Bild an."""
+    import matplotlib.pyplot as plt
+    import sunpy.map
+
     try:
         smap = sunpy.map.Map(file_path)
         smap.plot()
@@ -25,11 +29,80 @@ def main():
     parser_download.add_argument("--end", required=True, help="Endzeit (YYYY-MM-DD HH:MM:SS)")
     parser_download.add_argument("--instrument", default="hmi", help="Instrument (Standard: hmi)")
     parser_download.add_argument("--sample", type=int, default=1, help="Zeitintervall in Stunden")
+    parser_download.add_argument("--max-conn", type=int, default=4, help="Anzahl paralleler Downloads (Standard: 4)")
+    parser_download.add_argument("--retries", type=int, default=3,
+                                 help="Wiederholungen pro fehlgeschlagenem Download (Standard: 3)")
 
     # 📌 Tracking-Befehl
     parser_tracking = subparsers.add_parser("run_tracking", help="Führt Sonnenflecken-Tracking aus")
-    parser_tracking.add_argument("--trace", type=int, default=1, help="Nummer der Trace-Serie (z. B. 1 für data/TR_01)")
-    parser_tracking.add_argument("--no-interactive", action="store_true", help="Tracking ohne Benutzerinteraktion ausführen")
+    parser_tracking.add_argument("--trace", type=int, nargs="+", default=[1],
+                                 help="Nummer(n) der Trace-Serie(n) (z. B. 1 für data/TR_01)")
+    parser_tracking.add_argument("--no-interactive", action="store_true", help="Tracking ohne Anzeige und Benutzerinteraktion ausführen, alle erfolgreich verfolgten Spots werden gespeichert")
+    parser_tracking.add_argument("--workers", type=int, default=1,
+                                 help="Anzahl der Prozesse (mehrere Traces: ein Prozess pro Trace, sonst pro Spot-Gruppe)")
+    parser_tracking.add_argument("--memmap", action="store_true",
+                                 help="FITS-Dateien per Memory-Mapping und ohne Zwischenkopien laden")
+    parser_tracking.add_argument("--cache-dir", default=None,
+                                 help="Ordner für den Cache der normalisierten Bilder (z. B. data/.frame_cache)")
+    parser_tracking.add_argument("--cache-size", type=float, default=20.0,
+                                 help="Maximale Größe des Bild-Caches in GB (Standard: 20)")
+    parser_tracking.add_argument("--decode-workers", type=int, default=1,
+                                 help="Anzahl der Prozesse, die die FITS-Dateien parallel dekodieren")
+    parser_tracking.add_argument("--fast-detection", action="store_true",
+                                 help="Spot-Detektion nur auf der Sonnenscheibe und mit verkleinerter adaptiver Schwelle")
+    parser_tracking.add_argument("--tracker", choices=TRACKERS, default="mil",
+                                 help="mil: OpenCV-MIL-Tracker pro Spot, link: Verknüpfen der Detektionen pro Bild, "
+                                      "roi: subpixelgenaue Korrelation auf kleinen Suchfenstern (Standard: mil)")
+    parser_tracking.add_argument("--checkpoint-every", type=int, default=0, metavar="N",
+                                 help="Alle N Bilder einen Checkpoint nach data/TR_XX/tracking_checkpoint.pkl "
+                                      "schreiben (Standard: 0 = aus)")
+    parser_tracking.add_argument("--resume", action="store_true",
+                                 help="Nach dem letzten Checkpoint fortsetzen, ohne die verfolgten Bilder erneut zu dekodieren")
+    parser_tracking.add_argument("--pyramid-levels", type=int, default=0, metavar="L",
+                                 help="Detektion und Tracking auf der um 2^L verkleinerten Bildstufe, verfeinert in voller "
+                                      "Auflösung (Standard: 0 = volle Auflösung)")
+
+    _add_profile_arguments(parser_tracking)
+
+    # 📌 Spot-Katalog-Befehl
+    parser_detect = subparsers.add_parser("detect_spots", help="Erstellt den Spot-Katalog einer Trace-Serie")
+    parser_detect.add_argument("--trace", type=int, nargs="+", default=[1],
+                               help="Nummer(n) der Trace-Serie(n) (z. B. 1 für data/TR_01)")
+    parser_detect.add_argument("--every", type=int, default=1, help="Nur jedes n-te Bild auswerten")
+    parser_detect.add_argument("--workers", type=int, default=1, help="Anzahl der Threads für die Spot-Detektion")
+    parser_detect.add_argument("--decode-workers", type=int, default=1,
+                               help="Anzahl der Prozesse, die die FITS-Dateien parallel dekodieren")
+    parser_detect.add_argument("--fast-detection", action="store_true",
+                               help="Spot-Detektion nur auf der Sonnenscheibe und mit verkleinerter adaptiver Schwelle")
+    parser_detect.add_argument("--pyramid-levels", type=int, default=0, metavar="L",
+                               help="Detektion auf der um 2^L verkleinerten Bildstufe, verfeinert in voller "
+                                    "Auflösung (Standard: 0 = volle Auflösung)")
+
+    _add_profile_arguments(parser_detect)
+
+    # 📌 Watch-Befehl
+    parser_watch = subparsers.add_parser("watch", help="Verfolgt die Spots einer Trace-Serie, während neue FITS-Dateien eintreffen")
+    parser_watch.add_argument("--trace", type=int, default=1, help="Nummer der Trace-Serie (z. B. 1 für data/TR_01)")
+    parser_watch.add_argument("--interval", type=float, default=60.0,
+                              help="Sekunden zwischen zwei Abfragen des Ordners (Standard: 60)")
+    parser_watch.add_argument("--polls", type=int, default=None,
+                              help="Nach so vielen Abfragen beenden (Standard: bis Strg+C)")
+    parser_watch.add_argument("--tracker", choices=TRACKERS, default="roi",
+                              help="Tracker wie bei run_tracking (Standard: roi)")
+    parser_watch.add_argument("--detect-every", type=int, default=1,
+                              help="Neue Spots nur in jedem n-ten Bild suchen (Standard: 1)")
+    parser_watch.add_argument("--min-frames", type=int, default=3,
+                              help="Mindestzahl der Bilder, damit ein abgeschlossener Spot gespeichert wird (Standard: 3)")
+    parser_watch.add_argument("--memmap", action="store_true",
+                              help="FITS-Dateien per Memory-Mapping und ohne Zwischenkopien laden")
+    parser_watch.add_argument("--cache-dir", default=None,
+                              help="Ordner für den Cache der normalisierten Bilder (z. B. data/.frame_cache)")
+    parser_watch.add_argument("--cache-size", type=float, default=20.0,
+                              help="Maximale Größe des Bild-Caches in GB (Standard: 20)")
+    parser_watch.add_argument("--fast-detection", action="store_true",
+                              help="Spot-Detektion nur auf der Sonnenscheibe und mit verkleinerter adaptiver Schwelle")
+
+    _add_profile_arguments(parser_watch)
 
     # 📌 `view_fits`-Befehl
     parser_view = subparsers.add_parser("view_fits", help="Zeigt eine FITS-Datei an")
@@ -37,19 +110,83 @@ def main():
 
     args = parser.parse_args()
 
+    if getattr(args, "profile", None):
+        profiling.enable(memory=not args.profile_time_only)
+        try:
+            _run_command(args)
+        finally:
+            profiling.disable()
+            profiling.write_report(args.profile)
+            print(profiling.summary())
+            print(f"Profil gespeichert in {args.profile}")
+    else:
+        _run_command(args)
+
+def _add_profile_arguments(subparser):
+    subparser.add_argument("--profile", default=None, metavar="PFAD",
+                           help="Laufzeit, Aufrufe und Speicherspitzen pro Stufe messen und als JSON-Datei speichern "
+                                "(nur der Hauptprozess und seine Threads)")
+    subparser.add_argument("--profile-time-only", action="store_true",
+                           help="Mit --profile nur Zeiten messen (ohne tracemalloc, geringerer Mehraufwand)")
+
+def _run_command(args):
     # 🛰️ Downloader ausführen
     if args.command == "downloader":
+        from solar_tracking.downloader import download_fits
         print(f"Lade Daten von {args.start} bis {args.end} mit {args.instrument} herunter...")
-        downloaded_files = download_fits(args.start, args.end, args.instrument, args.sample)
+        downloaded_files = download_fits(args.start, args.end, args.instrument, args.sample,
+                                         max_conn=args.max_conn, retries=args.retries)
         print(f"Heruntergeladene Dateien: {downloaded_files}")
 
     # 🌞 Tracking starten
     elif args.command == "run_tracking":
+        from solar_tracking.tracking import run_tracking, track_traces
         interactive_mode = not args.no_interactive  # Invertiert den `--no-interactive`-Flag
-        print(f"Starte Tracking für Trace {args.trace}...")
-        run_tracking(trace=args.trace, interactive=interactive_mode)
+        cache = None
+        if args.cache_dir:
+            from solar_tracking.frame_cache import FrameCache
+            cache = FrameCache(args.cache_dir, max_bytes=int(args.cache_size * 2**30))
+        if len(args.trace) > 1 and not interactive_mode:
+            # Mehrere Traces ohne Interaktion werden auf den Prozesspool verteilt
+            print(f"Starte Tracking für Traces {args.trace} mit {args.workers} Prozessen...")
+            track_traces(args.trace, workers=args.workers, memmap=args.memmap, cache=cache,
+                         decode_workers=args.decode_workers, fast_detection=args.fast_detection,
+                         tracker=args.tracker, checkpoint_every=args.checkpoint_every, resume=args.resume,
+                         pyramid_levels=args.pyramid_levels)
+        else:
+            for trace in args.trace:
+                print(f"Starte Tracking für Trace {trace}...")
+                run_tracking(trace=trace, interactive=interactive_mode, workers=args.workers,
+                             memmap=args.memmap, cache=cache, decode_workers=args.decode_workers,
+                             fast_detection=args.fast_detection, tracker=args.tracker,
+                             checkpoint_every=args.checkpoint_every, resume=args.resume,
+                             pyramid_levels=args.pyramid_levels)
         print("Tracking abgeschlossen.")
 
+    # 🔎 Spot-Katalog erstellen
+    elif args.command == "detect_spots":
+        from solar_tracking.sunspot_detection import detect_trace_spots
+        for trace in args.trace:
+            catalog = detect_trace_spots(trace, every=args.every, workers=args.workers,
+                                         decode_workers=args.decode_workers,
+                                         pyramid_levels=args.pyramid_levels,
+                                         **(FAST_DETECTION if args.fast_detection else {}))
+            n_frames = len(set(catalog["frame"].tolist()))
+            print(f"Trace {trace}: {len(catalog)} Spots in {n_frames} Bildern gefunden.")
+
+    # 👀 Trace-Ordner beobachten
+    elif args.command == "watch":
+        from solar_tracking.watch import watch_trace
+        cache = None
+        if args.cache_dir:
+            from solar_tracking.frame_cache import FrameCache
+            cache = FrameCache(args.cache_dir, max_bytes=int(args.cache_size * 2**30))
+        print(f"Beobachte Trace {args.trace} (alle {args.interval:g} s, Abbruch mit Strg+C)...")
+        watcher = watch_trace(args.trace, interval=args.interval, polls=args.polls, tracker=args.tracker,
+                              memmap=args.memmap, cache=cache, fast_detection=args.fast_detection,
+                              detect_every=args.detect_every, min_frames=args.min_frames)
+        print(f"{watcher.n_frames} Bilder verarbeitet, {len(watcher.omegas)} Spots verfolgt.")
+
     # 🔍 FITS-Datei anzeigen
     elif args.command == "view_fits":
         print(f"Öffne FITS-Datei: {args.file}")
@@ -0,0 +1,13 @@
+"""
+Einstellungen, die die Kommandozeile schon beim Aufbau der Argumente braucht.
+
+Das Modul importiert nur die Standardbibliothek, damit `solar-tracking --help`
+und das Parsen der Argumente ohne OpenCV, astropy, sunpy und matplotlib
+auskommen (siehe cli). tracking übernimmt die Werte von hier.
+"""
+
+# Optionen von find_spots_and_boxes für die schnelle Detektion
+FAST_DETECTION = {"crop_to_disk": True, "threshold_downsample": 4}
+# Verfügbare Tracker: OpenCV-MIL pro Spot, Verknüpfen der Detektionen pro Bild
+# oder Subpixel-Korrelation auf kleinen Suchfenstern
+TRACKERS = ("mil", "link", "roi")
@@ -1,21 +1,139 @@
 from sunpy.net import Fido, attrs as a
+from sunpy.net.fido_factory import UnifiedResponse
 from astropy import units as u
+from concurrent.futures import ThreadPoolExecutor
+import json
 import os
 import glob
+import shutil
+import uuid
 
-def download_fits(start_time: str, end_time: str, instrument: str = 'hmi', sample_seperation: int = 1):
+# Spalten der Suchergebnisse, die einen Datensatz eindeutig beschreiben
+RECORD_COLUMNS = ("Instrument", "Physobs", "Wavelength", "Start Time", "fileid")
+
+
+class FitsIndex:
+    """
+    Lokaler Index der bereits heruntergeladenen Datensätze.
+
+    Jede Datei liegt genau einmal im Ordner des Index ('data/.fits_store') und
+    wird per Hardlink in die Trace-Ordner übernommen. Der Index ordnet jedem
+    Datensatz (Instrument, Zeit, ...; siehe RECORD_COLUMNS) seinen Dateinamen
+    zu. Neue Datensätze werden mit `save` einmal pro Download-Aufruf in eine
+    eigene Datei 'index-<id>.json' geschrieben und beim Laden mit allen anderen
+    Indexdateien zusammengeführt; gleichzeitige Aufrufe überschreiben sich so
+    nicht gegenseitig, und ein abgebrochener Download lädt beim nächsten Aufruf
+    nur die fehlenden Datensätze.
+
+    Args:
+        directory (str): Ordner der Dateien und der Indexdateien
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._records = {}
+        self._new = {}
+        # 'index.json' stammt von älteren Versionen mit einer einzigen Indexdatei
+        for index_path in sorted(glob.glob(os.path.join(directory, "index*.json"))):
+            with open(index_path) as f:
+                self._records.update(json.load(f))
+
+    @staticmethod
+    def key(row) -> str:
+        """Schlüssel eines Datensatzes (Zeile eines Suchergebnisses)."""
+        parts = []
+        for column in RECORD_COLUMNS:
+            if column in row.colnames:
+                value = row[column]
+                parts.append(value.isot if hasattr(value, "isot") else str(value))
+        return "|".join(parts)
+
+    def get(self, key: str):
+        """Pfad der Datei eines Datensatzes oder None, wenn er fehlt."""
+        file_name = self._records.get(key)
+        if file_name is None:
+            return None
+        path = os.path.join(self.directory, file_name)
+        return path if os.path.exists(path) else None
+
+    def add(self, key: str, downloaded_path: str) -> str:
+        """Verschiebt eine heruntergeladene Datei in den Index und gibt ihren neuen Pfad zurück."""
+        path = os.path.join(self.directory, os.path.basename(downloaded_path))
+        os.replace(downloaded_path, path)
+        self._records[key] = self._new[key] = os.path.basename(path)
+        return path
+
+    def save(self):
+        """Schreibt die seit dem letzten Aufruf aufgenommenen Datensätze atomar in eine neue Indexdatei."""
+        if not self._new:
+            return
+        index_path = os.path.join(self.directory, f"index-{uuid.uuid4().hex}.json")
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._new, f, indent=1)
+        os.replace(tmp_path, index_path)
+        self._new = {}
+
+
+def _link(source: str, target_folder: str) -> str:
+    """Übernimmt eine Datei per Hardlink (oder Kopie über Dateisystemgrenzen) in einen Ordner."""
+    target = os.path.join(target_folder, os.path.basename(source))
+    if not os.path.exists(target):
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+    return target
+
+
+def _fetch_record(record, partial_folder: str, retries: int) -> str:
+    """
+    Lädt einen einzelnen Datensatz in einen eigenen Ordner und wiederholt fehlgeschlagene Versuche.
+
+    Returns:
+        str: Pfad der heruntergeladenen Datei
+    """
+    os.makedirs(partial_folder, exist_ok=True)
+    last_error = None
+    for _ in range(retries + 1):
+        try:
+            files = Fido.fetch(record, path=os.path.join(partial_folder, "{file}"), max_conn=1,
+                               progress=False, overwrite=True)
+        except Exception as e:
+            last_error = e
+            continue
+        errors = getattr(files, "errors", None)
+        if files and not errors:
+            return files[0]
+        last_error = errors
+    raise RuntimeError(f"Download fehlgeschlagen nach {retries + 1} Versuchen: {last_error}")
+
+
+def download_fits(start_time: str, end_time: str, instrument: str = 'hmi', sample_seperation: int = 1,
+                  max_conn: int = 4, retries: int = 3, store_directory: str = None):
     """
     Lädt FITS-Dateien von der Sonne mit SunPy herunter und speichert sie in einem neuen Trace-Ordner.
     
     Für jeden Aufruf wird im aktuellen Arbeitsverzeichnis ein neuer Unterordner im Format "data/TR_XX"
     erstellt (XX = fortlaufende Nummer). In diesem Ordner werden die FITS-Dateien abgelegt und eine 
-    "names.txt" erstellt, die die Dateinamen enthält.
+    "names.txt" erstellt, die die Dateinamen enthält. Der Ordner wird erst angelegt, wenn alle
+    Datensätze geladen sind; ein fehlgeschlagener Aufruf hinterlässt keinen Trace-Ordner.
+
+    Bereits heruntergeladene Datensätze (siehe FitsIndex) werden nicht erneut geladen,
+    sondern per Hardlink übernommen. Die fehlenden Datensätze werden einzeln mit bis
+    zu `max_conn` parallelen Verbindungen geladen, fehlgeschlagene Downloads werden
+    `retries`-mal wiederholt. Bricht ein Aufruf ab, lädt der nächste Aufruf nur noch
+    die Datensätze, die noch nicht im Index stehen.
     
     Args:
         start_time (str): Startzeit im Format 'YYYY-MM-DD HH:MM:SS'
         end_time (str): Endzeit im Format 'YYYY-MM-DD HH:MM:SS'
         instrument (str): Name des Instruments (z. B. "hmi")
         sample_seperation (int): Intervall in Stunden (wird mit u.hour multipliziert)
+        max_conn (int): Anzahl paralleler Downloads
+        retries (int): Anzahl der Wiederholungen pro Datensatz
+        store_directory (str, optional): Ordner des Index (Standard: 'data/.fits_store')
         
     Returns:
         list: Liste der heruntergeladenen Dateien (vollständige Pfade)
@@ -29,26 +147,6 @@ def download_fits(start_time: str, end_time: str, instrument: str = 'hmi', sampl
     base_directory = os.path.join(os.getcwd(), "data")
     os.makedirs(base_directory, exist_ok=True)
 
-    # Ermittle den nächsten freien Trace-Ordner (Format: TR_XX, z. B. TR_01)
-    existing_traces = glob.glob(os.path.join(base_directory, "TR_*"))
-    trace_numbers = []
-    for trace_dir in existing_traces:
-        basename = os.path.basename(trace_dir)
-        # Erwartetes Format: "TR_XX"
-        try:
-            num = int(basename.replace("TR_", ""))
-            trace_numbers.append(num)
-        except ValueError:
-            continue
-    if trace_numbers:
-        new_trace = max(trace_numbers) + 1
-    else:
-        new_trace = 1
-
-    # Neuen Trace-Ordner erstellen (mit führender Null, z. B. TR_01)
-    trace_folder = os.path.join(base_directory, f"TR_{new_trace:02d}")
-    os.makedirs(trace_folder, exist_ok=True)
-
     # Suche-Parameter vorbereiten
     instrument_attr = getattr(a.Instrument, instrument, a.Instrument.hmi)
     results = Fido.search(
@@ -58,9 +156,27 @@ def download_fits(start_time: str, end_time: str, instrument: str = 'hmi', sampl
         a.Sample(sample_seperation * u.hour)
     )
 
-    # Herunterladen in den neuen Trace-Ordner
-    downloaded_files = Fido.fetch(results, path=os.path.join(trace_folder, "{file}"))
-    
+    # Der Trace-Ordner wird erst nach dem erfolgreichen Download angelegt, damit ein
+    # abgebrochener Aufruf keinen leeren Ordner hinterlässt und die Nummer frei bleibt
+    if isinstance(results, UnifiedResponse):
+        index = FitsIndex(store_directory or os.path.join(base_directory, ".fits_store"))
+        store_files = _download_records(results, index, max_conn, retries)
+        trace_folder = _new_trace_folder(base_directory)
+        downloaded_files = [_link(path, trace_folder) for path in store_files]
+    else:
+        # Unbekanntes Suchergebnis: in einen eigenen Zwischenordner laden und in den Trace-Ordner verschieben
+        partial_folder = os.path.join(base_directory, ".partial", uuid.uuid4().hex)
+        try:
+            files = Fido.fetch(results, path=os.path.join(partial_folder, "{file}"), max_conn=max_conn)
+            trace_folder = _new_trace_folder(base_directory)
+            downloaded_files = []
+            for file_path in files:
+                target = os.path.join(trace_folder, os.path.basename(file_path))
+                os.replace(file_path, target)
+                downloaded_files.append(target)
+        finally:
+            shutil.rmtree(partial_folder, ignore_errors=True)
+
     # Erstelle die names.txt im neuen Trace-Ordner, die die Dateinamen enthält
     names_path = os.path.join(trace_folder, "names.txt")
     with open(names_path, "w") as f:
@@ -69,3 +185,59 @@ def download_fits(start_time: str, end_time: str, instrument: str = 'hmi', sampl
             f.write(os.path.basename(file_path) + "\n")
     
     return downloaded_files
+
+
+def _new_trace_folder(base_directory: str) -> str:
+    """Legt den nächsten freien Trace-Ordner an (Format: TR_XX, z. B. TR_01) und gibt seinen Pfad zurück."""
+    trace_numbers = []
+    for trace_dir in glob.glob(os.path.join(base_directory, "TR_*")):
+        # Erwartetes Format: "TR_XX"
+        try:
+            trace_numbers.append(int(os.path.basename(trace_dir).replace("TR_", "")))
+        except ValueError:
+            continue
+    new_trace = max(trace_numbers, default=0) + 1
+    # os.mkdir schlägt fehl, wenn ein gleichzeitiger Aufruf dieselbe Nummer belegt hat
+    while True:
+        trace_folder = os.path.join(base_directory, f"TR_{new_trace:02d}")
+        try:
+            os.mkdir(trace_folder)
+            return trace_folder
+        except FileExistsError:
+            new_trace += 1
+
+
+def _download_records(results, index: FitsIndex, max_conn: int, retries: int) -> list:
+    """
+    Lädt die fehlenden Datensätze der Suchergebnisse parallel herunter und nimmt sie in den Index auf.
+
+    Jeder Aufruf lädt in einen eigenen Zwischenordner unter '.partial', so dass
+    gleichzeitige Aufrufe ihre laufenden Downloads nicht gegenseitig löschen.
+    Der Index wird einmal am Ende gespeichert, auch wenn Downloads fehlschlagen.
+
+    Returns:
+        list: Pfade der Dateien im Index in der Reihenfolge der Suchergebnisse
+    """
+    records = [(index.key(block[i]), block[i:i + 1]) for block in results for i in range(len(block))]
+    missing = {key: record for key, record in records if index.get(key) is None}
+    print(f"{len(records) - len(missing)} von {len(records)} Datensätzen sind bereits vorhanden.")
+
+    partial_root = os.path.join(index.directory, ".partial", uuid.uuid4().hex)
+    errors = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_conn)) as pool:
+            futures = {key: pool.submit(_fetch_record, record, os.path.join(partial_root, uuid.uuid4().hex),
+                                        retries)
+                       for key, record in missing.items()}
+            for key, future in futures.items():
+                try:
+                    index.add(key, future.result())
+                except Exception as e:
+                    errors.append(e)
+    finally:
+        index.save()
+        shutil.rmtree(partial_root, ignore_errors=True)
+    if errors:
+        raise RuntimeError(f"{len(errors)} Datensätze konnten nicht geladen werden; ein erneuter Aufruf "
+                           f"lädt nur die fehlenden Datensätze. Erster Fehler: {errors[0]}")
+    return [index.get(key) for key, _ in records]
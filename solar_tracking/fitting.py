@@ -1,25 +1,122 @@
 import numpy as np
-from scipy.optimize import curve_fit
+
+# Schwelle der Huber-Verlustfunktion in Einheiten der robusten Streuung (95 % Effizienz)
+HUBER_DELTA = 1.345
 
 def fit_func(B_0, a, b):
     """Fit-Funktion für die differentielle Rotation."""
     return a + b * np.sin(np.deg2rad(B_0))**2
 
-def perform_fitting(lat_all, omega_all):
+def fit_linear(lat, omega, weights=None, loss: str = "linear", max_iter: int = 50, tol: float = 1e-10):
+    """
+    Passt fit_func (linear in a und b) per gewichteter linearer Ausgleichsrechnung an.
+
+    Alle führenden Achsen werden als unabhängige Datensätze behandelt und in einem
+    Durchlauf gelöst (z. B. alle Bootstrap-Stichproben auf einmal). Mit loss="huber"
+    werden Ausreißer per IRLS (iterativ neu gewichtete kleinste Quadrate) mit der
+    Huber-Verlustfunktion heruntergewichtet; die Streuung wird robust über den
+    MAD der Residuen geschätzt.
+
+    Args:
+        lat (array): Breitengrade in Grad, Form (..., n)
+        omega (array): Rotationsgeschwindigkeiten, Form (..., n)
+        weights (array, optional): Gewichte der Punkte (z. B. 1/sigma²), Form (..., n)
+        loss (str): "linear" (kleinste Quadrate) oder "huber"
+        max_iter (int): maximale Anzahl der IRLS-Iterationen
+        tol (float): Abbruchschwelle für die Änderung der Parameter
+
+    Returns:
+        np.ndarray: Parameter (a, b), Form (..., 2)
+    """
+    if loss not in ("linear", "huber"):
+        raise ValueError(f"Unbekannte Verlustfunktion: {loss}. Verfügbare Optionen: ['linear', 'huber']")
+    lat = np.asarray(lat, dtype=float)
+    omega = np.asarray(omega, dtype=float)
+    weights = np.ones_like(omega) if weights is None else np.broadcast_to(np.asarray(weights, dtype=float), omega.shape)
+    x = np.sin(np.deg2rad(lat))**2
+
+    def solve(w):
+        # Normalgleichungen des 2x2-Systems, geschlossen gelöst
+        s_w, s_x, s_xx = w.sum(-1), (w * x).sum(-1), (w * x * x).sum(-1)
+        s_y, s_xy = (w * omega).sum(-1), (w * x * omega).sum(-1)
+        det = s_w * s_xx - s_x**2
+        b = (s_w * s_xy - s_x * s_y) / det
+        a = (s_y - b * s_x) / s_w
+        return np.stack([a, b], axis=-1)
+
+    params = solve(weights)
+    if loss == "linear":
+        return params
+    for _ in range(max_iter):
+        residuals = omega - params[..., :1] - params[..., 1:] * x
+        scale = 1.4826 * np.median(np.abs(residuals - np.median(residuals, axis=-1, keepdims=True)),
+                                   axis=-1, keepdims=True)
+        scale = np.where(scale > 0, scale, np.finfo(float).tiny)
+        huber = np.minimum(1.0, HUBER_DELTA * scale / np.maximum(np.abs(residuals), np.finfo(float).tiny))
+        new_params = solve(weights * huber)
+        converged = np.all(np.abs(new_params - params) <= tol * (1 + np.abs(params)))
+        params = new_params
+        if converged:
+            break
+    return params
+
+def perform_fitting(lat_all, omega_all, weights=None, loss: str = "linear"):
     """
     Führt das Curve Fitting für die differentielle Rotation durch.
 
+    Da fit_func linear in a und b ist, wird direkt die lineare Ausgleichsrechnung
+    gelöst (siehe fit_linear); ohne Gewichte entspricht das Ergebnis curve_fit.
+
     Args:
         lat_all (array): Breitengrade der Sonnenflecken
         omega_all (array): Rotationsgeschwindigkeiten
+        weights (array, optional): Gewichte der Punkte (z. B. 1/sigma²)
+        loss (str): "linear" oder "huber" (robust gegen Ausreißer)
 
     Returns:
         tuple: (Fit-Parameter, R-Quadrat-Wert)
     """
-    popt, pcov = curve_fit(fit_func, lat_all, omega_all)
+    lat_all = np.asarray(lat_all, dtype=float)
+    omega_all = np.asarray(omega_all, dtype=float)
+    popt = fit_linear(lat_all, omega_all, weights, loss)
     residuals = omega_all - fit_func(lat_all, *popt)
     ss_res = np.sum(residuals**2)
     ss_tot = np.sum((omega_all - np.mean(omega_all))**2)
     r_squared = 1 - (ss_res / ss_tot)
 
     return popt, r_squared
+
+def perform_bootstrap_fitting(lat_all, omega_all, n_bootstrap: int = 1000, weights=None, loss: str = "linear",
+                              seed=None, chunk_size: int = 1000):
+    """
+    Schätzt die Unsicherheit der Fit-Parameter per Bootstrap.
+
+    Alle Stichproben (Ziehen mit Zurücklegen) eines Blocks von `chunk_size`
+    Stichproben werden in einem Durchlauf von fit_linear gelöst.
+
+    Args:
+        lat_all (array): Breitengrade der Sonnenflecken
+        omega_all (array): Rotationsgeschwindigkeiten
+        n_bootstrap (int): Anzahl der Bootstrap-Stichproben
+        weights (array, optional): Gewichte der Punkte
+        loss (str): "linear" oder "huber"
+        seed (int, optional): Startwert des Zufallsgenerators
+        chunk_size (int): Anzahl der Stichproben pro Block (begrenzt den Speicherbedarf)
+
+    Returns:
+        tuple: (Fit-Parameter auf allen Daten, Standardabweichung der Parameter,
+        Parameter aller Stichproben als (n_bootstrap, 2)-Array)
+    """
+    lat_all = np.asarray(lat_all, dtype=float)
+    omega_all = np.asarray(omega_all, dtype=float)
+    weights_all = None if weights is None else np.asarray(weights, dtype=float)
+    rng = np.random.default_rng(seed)
+    popt = fit_linear(lat_all, omega_all, weights_all, loss)
+
+    samples = np.empty((n_bootstrap, 2))
+    for start in range(0, n_bootstrap, chunk_size):
+        stop = min(start + chunk_size, n_bootstrap)
+        idx = rng.integers(0, len(lat_all), size=(stop - start, len(lat_all)))
+        samples[start:stop] = fit_linear(lat_all[idx], omega_all[idx],
+                                         None if weights_all is None else weights_all[idx], loss)
+    return popt, np.nanstd(samples, axis=0, ddof=1), samples
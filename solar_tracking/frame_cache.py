@@ -0,0 +1,127 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+
+class FrameCache:
+    """
+    Persistent on-disk cache of normalized uint8 frames.
+
+    Every frame is stored as an uncompressed .npy file, so a cache hit is a
+    memory-mapped read without FITS decompression or normalization. The key is
+    built from the absolute path, mtime and size of the FITS file (or a hash
+    of its content), the data layer and the loader mode. Writes are atomic
+    (temporary file + os.replace), so several processes can share one cache.
+    When the cache grows beyond `max_bytes`, the least recently used frames
+    are removed (a hit refreshes the file's mtime). The total size is scanned
+    once and then kept as a running sum; the directory is only scanned again
+    when that sum exceeds `max_bytes` or when the directory's mtime shows that
+    another process added or removed frames since this one last wrote. Filling
+    the cache from one process stays linear in the number of frames, and a
+    cache shared by several processes still respects `max_bytes` as a whole.
+
+    Args:
+        directory (str): folder of the cache, created if necessary
+        max_bytes (int): size cap of the cache in bytes
+        hash_content (bool): key by a SHA-1 of the file content instead of mtime/size
+    """
+
+    def __init__(self, directory, max_bytes: int = 20 * 2**30, hash_content: bool = False):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Running total of the cache size in bytes, None until the first scan, and the
+        # directory mtime it belongs to (another mtime means other processes wrote)
+        self._total = None
+        self._mtime = None
+
+    def key(self, fits_path, data_layer: int = 1, mode: str = "default") -> str:
+        """Returns the cache key of a FITS file."""
+        fits_path = Path(fits_path).resolve()
+        if self.hash_content:
+            digest = hashlib.sha1()
+            with open(fits_path, "rb") as f:
+                for chunk in iter(lambda: f.read(2**20), b""):
+                    digest.update(chunk)
+            source = digest.hexdigest()
+        else:
+            stat = fits_path.stat()
+            source = f"{fits_path}|{stat.st_mtime_ns}|{stat.st_size}"
+        return hashlib.sha1(f"{source}|{data_layer}|{mode}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npy"
+
+    def get(self, fits_path, data_layer: int = 1, mode: str = "default"):
+        """
+        Returns the cached frame as a copy-on-write memmap, or None on a miss.
+        """
+        path = self._path(self.key(fits_path, data_layer, mode))
+        try:
+            image = np.load(path, mmap_mode="c")
+            os.utime(path)  # marks the frame as recently used
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return image
+
+    def put(self, fits_path, image: np.ndarray, data_layer: int = 1, mode: str = "default"):
+        """Stores a normalized frame and evicts old frames if the cache is too large."""
+        path = self._path(self.key(fits_path, data_layer, mode))
+        if self._total is None or self.directory.stat().st_mtime_ns != self._mtime:
+            self._total = self.size()
+        tmp_path = self.directory / f".{path.stem}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(image, dtype=np.uint8))
+        try:
+            self._total -= path.stat().st_size  # an existing entry is replaced
+        except FileNotFoundError:
+            pass
+        self._total += tmp_path.stat().st_size
+        os.replace(tmp_path, path)
+        if self._total > self.max_bytes:
+            self.evict()
+        self._mtime = self.directory.stat().st_mtime_ns
+
+    def size(self) -> int:
+        """Total size of the cached frames in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".npy"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # removed by another process
+                entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        return entries
+
+    def evict(self):
+        """Removes the least recently used frames until the cache fits into max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total = total
+
+    def clear(self):
+        """Removes all cached frames."""
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._total = 0
@@ -0,0 +1,249 @@
+"""
+Index der FITS-Header aller Bilder einer Trace-Serie.
+
+Die Header werden in einem parallelen Durchlauf gelesen, ohne die Bilddaten zu
+laden oder zu dekomprimieren: _read_cards liest nur die 2880-Byte-Blöcke der
+Header und springt über die Daten vorangehender HDUs. Pro Bild werden
+Beobachtungszeit, Geometrie und Beobachterposition in einer Zeile mit
+HEADER_INDEX_DTYPE abgelegt und als 'header_index.npz' im Ordner der Serie
+gespeichert. Beim nächsten Aufruf werden nur Dateien neu gelesen, deren Größe
+oder Änderungszeit sich geändert hat oder die neu hinzugekommen sind.
+
+Die Zeilen können direkt an cal_lon_and_lat_header und trajectory_lon_and_lat
+übergeben werden; frame_hours liefert die echten Zeitpunkte der Bilder.
+"""
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# FITS-Schlüsselwort -> Feld im Index (Zahlenwerte, NaN wenn das Schlüsselwort fehlt)
+HEADER_FIELDS = {"CRPIX1": "crpix1", "CRPIX2": "crpix2", "CDELT1": "cdelt1", "CDELT2": "cdelt2",
+                 "CRVAL1": "crval1", "CRVAL2": "crval2", "CROTA2": "crota2",
+                 "RSUN_OBS": "rsun_obs", "RSUN_REF": "rsun_ref", "DSUN_OBS": "dsun_obs",
+                 "CRLN_OBS": "crln_obs", "CRLT_OBS": "crlt_obs", "HGLN_OBS": "hgln_obs", "HGLT_OBS": "hglt_obs"}
+# Eine Zeile pro Bild; size und mtime_ns erkennen geänderte Dateien
+HEADER_INDEX_DTYPE = np.dtype([("date_obs", "datetime64[ms]"), ("naxis1", np.int32), ("naxis2", np.int32)]
+                              + [(field, np.float64) for field in HEADER_FIELDS.values()]
+                              + [("size", np.int64), ("mtime_ns", np.int64)])
+FITS_BLOCK = 2880
+
+
+def _card_value(text: str):
+    """Wert einer Header-Karte (Zeichenkette, logischer Wert oder Zahl)."""
+    text = text.strip()
+    if text.startswith("'"):
+        # Zeichenkette, '' steht für ein Hochkomma
+        value, i = [], 1
+        while i < len(text):
+            if text[i] == "'":
+                if text[i + 1:i + 2] == "'":
+                    value.append("'")
+                    i += 2
+                    continue
+                break
+            value.append(text[i])
+            i += 1
+        return "".join(value).rstrip()
+    text = text.split("/", 1)[0].strip()
+    if text in ("T", "F"):
+        return text == "T"
+    try:
+        return int(text)
+    except ValueError:
+        return float(text.replace("D", "E"))
+
+
+def _read_cards(fits_path, data_layer: int = 1) -> dict:
+    """
+    Liest die Karten des Headers der HDU `data_layer`, ohne Bilddaten zu lesen.
+
+    Raises:
+        ValueError: wenn die Datei kein lesbares (unkomprimiertes) FITS ist
+    """
+    with open(fits_path, "rb") as f:
+        for hdu in range(data_layer + 1):
+            cards = {}
+            end = False
+            while not end:
+                block = f.read(FITS_BLOCK)
+                if len(block) < FITS_BLOCK:
+                    raise ValueError(f"Unvollständiger FITS-Header in {fits_path}")
+                for start in range(0, FITS_BLOCK, 80):
+                    card = block[start:start + 80].decode("ascii", "replace")
+                    key = card[:8].strip()
+                    if key == "END":
+                        end = True
+                        break
+                    if card[8:10] == "= " and key not in cards:
+                        cards[key] = _card_value(card[10:])
+            if hdu == 0 and cards.get("SIMPLE") is not True:
+                raise ValueError(f"{fits_path} ist keine FITS-Datei")
+            if hdu < data_layer:
+                # Daten der HDU überspringen (auf ganze Blöcke aufgerundet)
+                n_axes = cards.get("NAXIS", 0)
+                n_values = int(np.prod([cards[f"NAXIS{k}"] for k in range(1, n_axes + 1)])) if n_axes else 0
+                size = abs(cards.get("BITPIX", 8)) // 8 * cards.get("GCOUNT", 1) * (cards.get("PCOUNT", 0) + n_values)
+                f.seek(-(-size // FITS_BLOCK) * FITS_BLOCK, os.SEEK_CUR)
+    return cards
+
+
+def _header_cards(fits_path, data_layer: int) -> dict:
+    """Karten des Headers; für gzip-komprimierte oder ungewöhnliche Dateien über astropy."""
+    try:
+        return _read_cards(fits_path, data_layer)
+    except (ValueError, KeyError):
+        from astropy.io import fits
+        return dict(fits.getheader(fits_path, data_layer))
+
+
+def _parse_date(value) -> np.datetime64:
+    """DATE-OBS als datetime64 (ohne Zeitzonen- oder Zeitskalen-Zusatz wie 'Z' oder '_TAI')."""
+    if not isinstance(value, str) or not value.strip():
+        return np.datetime64("NaT", "ms")
+    value = value.strip().removesuffix("_TAI").removesuffix("Z")
+    # HMI-Format 2023.11.23_00:00:45 -> 2023-11-23T00:00:45
+    date, _, time = value.replace("_", "T").partition("T")
+    value = date.replace(".", "-") + ("T" + time if time else "")
+    try:
+        return np.datetime64(value, "ms")
+    except ValueError:
+        return np.datetime64("NaT", "ms")
+
+
+def read_header_row(fits_path, data_layer: int = 1) -> np.ndarray:
+    """
+    Liest den Header eines Bildes als Zeile des Index.
+
+    Bei Rice-komprimierten Bildern (ZIMAGE = T) kommt die Bildgröße aus ZNAXIS1/ZNAXIS2.
+
+    Args:
+        fits_path (str): Pfad der FITS-Datei
+        data_layer (int): Index der HDU mit den Bilddaten
+
+    Returns:
+        np.ndarray: Zeile mit HEADER_INDEX_DTYPE (0-dimensional)
+    """
+    stat = os.stat(fits_path)
+    cards = _header_cards(fits_path, data_layer)
+    prefix = "Z" if cards.get("ZIMAGE") is True else ""
+    row = np.zeros((), dtype=HEADER_INDEX_DTYPE)
+    row["date_obs"] = _parse_date(cards.get("DATE-OBS", cards.get("DATE_OBS")))
+    row["naxis1"] = cards.get(f"{prefix}NAXIS1", 0)
+    row["naxis2"] = cards.get(f"{prefix}NAXIS2", 0)
+    for key, field in HEADER_FIELDS.items():
+        value = cards.get(key)
+        row[field] = value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+    row["size"] = stat.st_size
+    row["mtime_ns"] = stat.st_mtime_ns
+    return row
+
+
+def build_header_index(fits_paths, workers: int = 8, data_layer: int = 1, previous=None) -> np.ndarray:
+    """
+    Liest die Header aller Bilder parallel (Threads) in ein Array mit HEADER_INDEX_DTYPE.
+
+    Args:
+        fits_paths (list): Pfade der FITS-Dateien
+        workers (int): Anzahl der Threads
+        data_layer (int): Index der HDU mit den Bilddaten
+        previous (dict, optional): Dateiname -> bekannte Zeile; Zeilen mit
+            unveränderter Größe und Änderungszeit werden übernommen
+
+    Returns:
+        np.ndarray: eine Zeile pro Datei in der Reihenfolge von fits_paths
+    """
+    fits_paths = [Path(path) for path in fits_paths]
+    index = np.zeros(len(fits_paths), dtype=HEADER_INDEX_DTYPE)
+    missing = []
+    for i, path in enumerate(fits_paths):
+        known = None if previous is None else previous.get(path.name)
+        if known is not None:
+            stat = os.stat(path)
+            if known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                index[i] = known
+                continue
+        missing.append(i)
+    if missing:
+        read = lambda i: read_header_row(fits_paths[i], data_layer)
+        if workers > 1 and len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                rows = list(pool.map(read, missing))
+        else:
+            rows = [read(i) for i in missing]
+        index[missing] = rows
+    return index
+
+
+def trace_header_index(trace: int, workers: int = 8, save: bool = True) -> np.ndarray:
+    """
+    Header-Index einer Trace-Serie ('data/TR_XX/header_index.npz').
+
+    Ein gespeicherter Index wird wiederverwendet; nur neue oder geänderte
+    Dateien werden gelesen. Der Index wird atomar ersetzt, siehe save_header_index.
+
+    Args:
+        trace (int): Nummer der Trace-Serie
+        workers (int): Anzahl der Threads für das Lesen der Header
+        save (bool): den aktualisierten Index speichern
+
+    Returns:
+        np.ndarray: eine Zeile pro Bild in der Reihenfolge von names.txt
+    """
+    from solar_tracking.traces import trace_dir, trace_files
+
+    fit_paths = trace_files(trace)
+    index_file = trace_dir(trace) / "header_index.npz"
+    previous = None
+    if index_file.exists():
+        with np.load(index_file) as data:
+            if data["rows"].dtype == HEADER_INDEX_DTYPE:
+                previous = dict(zip(data["names"].tolist(), data["rows"]))
+    index = build_header_index(fit_paths, workers=workers, previous=previous)
+    names = np.array([path.name for path in fit_paths])
+    changed = previous is None or len(previous) != len(names) or any(
+        name not in previous or previous[name] != row for name, row in zip(names.tolist(), index))
+    if save and changed:
+        save_header_index(index_file, names, index)
+    return index
+
+
+def save_header_index(index_file, names, index: np.ndarray):
+    """Speichert einen Header-Index mit den Dateinamen atomar (temporäre Datei + os.replace)."""
+    index_file = Path(index_file)
+    tmp_path = index_file.with_name(f".{index_file.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, names=np.asarray(names, dtype=str), rows=index)
+    os.replace(tmp_path, index_file)
+
+
+def frame_hours(index: np.ndarray) -> np.ndarray:
+    """
+    Zeitpunkte der Bilder in Stunden seit dem ersten Bild.
+
+    Fehlt DATE-OBS in einem Header, wird wie bisher eine Stunde pro Bild angenommen.
+    """
+    if len(index) == 0:
+        return np.zeros(0)
+    dates = index["date_obs"]
+    if np.isnat(dates).any():
+        return np.arange(len(index), dtype=float)
+    return (dates - dates[0]).astype("timedelta64[ms]").astype(np.float64) / 3.6e6
+
+
+def index_sun_infos(index: np.ndarray, frame: int = 0):
+    """
+    Sonnenradius, Mittelpunkt und Auflösung eines Bildes wie sun_infos, aber aus dem Index.
+
+    Returns:
+        tuple: (Sonnenradius in Pixeln, (x, y) des Mittelpunkts, Auflösung)
+
+    Raises:
+        ValueError: wenn RSUN_OBS, CDELT1, CRPIX1 oder CRPIX2 im Header fehlen
+    """
+    row = index[frame]
+    if not all(np.isfinite(row[key]) for key in ("rsun_obs", "cdelt1", "crpix1", "crpix2")):
+        raise ValueError(f"Im Header von Bild {frame} fehlen RSUN_OBS, CDELT1 oder CRPIX1/CRPIX2.")
+    return (int(row["rsun_obs"] / row["cdelt1"]), (int(row["crpix1"]), int(row["crpix2"])), int(row["naxis2"]))
@@ -1,16 +1,39 @@
 import cv2
 import numpy as np
 from astropy.io import fits
+import collections
+import multiprocessing
 import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-def image_processing_fits(fits_path:str, data_layer: int = 1):
+from solar_tracking.profiling import profiled
+
+# Marks the end of the series in the prefetch queue of iter_frames
+_END = object()
+
+@profiled()
+def image_processing_fits(fits_path:str, data_layer: int = 1, memmap: bool = False, cache=None):
     """
     Opens the fits image and noramalize it that it can be used in the 
     function to find the boxes around the spots(features)
 
+    With memmap=True the raw (unscaled) data is memory-mapped for uncompressed
+    HDUs, and BSCALE/BZERO scaling, NaN/BLANK replacement and the min-max
+    normalization run fused over row blocks (see _normalize_to_uint8), so the
+    only full-size allocation is the 8-bit output (plus the decompressed
+    tiles for compressed HDUs). The result equals the default path up to
+    rounding (at most 1 grey level).
+
+    With a FrameCache, a frame that was normalized before is read back
+    memory-mapped from the cache instead of being decoded again.
+
     Args:
         fits_path (str): path to the fits file that should be used in the func
         data_layer int): the index of the data layer in the fits file
+        memmap (bool): use the memory-mapped, fused loader
+        cache (FrameCache): optional cache of normalized frames, see frame_cache
     Returns:
         normalized_image (np.ndarry): normalized image between 0 and 255
     """
@@ -18,15 +41,31 @@ def image_processing_fits(fits_path:str, data_layer: int = 1):
     if not os.path.exists(fits_path):
         raise FileNotFoundError(f"Die Datei {fits_path} wurde nicht gefunden!")
 
+    if cache is not None:
+        mode = "memmap" if memmap else "default"
+        normalized_image = cache.get(fits_path, data_layer, mode)
+        if normalized_image is None:
+            normalized_image = image_processing_fits(fits_path, data_layer, memmap)
+            cache.put(fits_path, normalized_image, data_layer, mode)
+        return normalized_image
+
+    if memmap:
+        with fits.open(fits_path, memmap=True, do_not_scale_image_data=True) as hdul:
+            hdu = hdul[data_layer]
+            header = hdu.header
+            return _normalize_to_uint8(hdu.data,
+                                       bscale=header.get('BSCALE', 1.0),
+                                       bzero=header.get('BZERO', 0.0),
+                                       blank=header.get('BLANK'))
     
     # Open the FITS file and read the data
     with fits.open(fits_path) as hdul:
         data = hdul[data_layer].data  # The 1 because in this fits files is the data safed
                                         # in the second position 
     
-    #Converte the image in to a ndarray    
+    #Converte the image in to a ndarray (native float32, also for big-endian data)
     image_data = np.array(data, dtype=np.float32)
-    image_data = np.nan_to_num(data, nan=0.0)  # Alle NaN-Werte werden durch 0 ersetzt
+    image_data = np.nan_to_num(image_data, nan=0.0, copy=False)  # Alle NaN-Werte werden durch 0 ersetzt
    
     #Normalizing the image
     normalized_image = cv2.normalize(image_data, None, alpha=0, beta=255,\
@@ -34,3 +73,185 @@ def image_processing_fits(fits_path:str, data_layer: int = 1):
 
     return normalized_image
 
+
+def _scaled_block(raw, bscale, bzero, blank):
+    """
+    Converts a block of raw FITS data to native float32 physical values with
+    NaN (and BLANK) pixels set to 0, like np.nan_to_num in the default path.
+    """
+    block = np.array(raw, dtype=np.float32)
+    if bscale != 1.0:
+        block *= bscale
+    if bzero != 0.0:
+        block += bzero
+    np.nan_to_num(block, nan=0.0, copy=False)
+    if blank is not None and np.issubdtype(raw.dtype, np.integer):
+        block[raw == blank] = 0.0
+    return block
+
+
+def _normalize_to_uint8(data, bscale=1.0, bzero=0.0, blank=None, block_rows: int = 32):
+    """
+    Fused NaN replacement and 8-bit min-max normalization over row blocks.
+
+    The first pass finds min and max, the second pass scales each block
+    directly into the output, so apart from the output only one block of
+    `block_rows` rows is allocated at a time. `data` may be a read-only memmap.
+
+    Args:
+        data (np.ndarray): raw image data (any dtype and byte order)
+        bscale (float): FITS BSCALE of the raw data
+        bzero (float): FITS BZERO of the raw data
+        blank (int): FITS BLANK value of integer data, treated like NaN
+        block_rows (int): number of rows processed at once
+    Returns:
+        normalized_image (np.ndarray): normalized uint8 image between 0 and 255
+    """
+    n_rows = data.shape[0]
+    lo, hi = np.inf, -np.inf
+    for start in range(0, n_rows, block_rows):
+        block = _scaled_block(data[start:start + block_rows], bscale, bzero, blank)
+        lo = min(lo, float(block.min()))
+        hi = max(hi, float(block.max()))
+
+    # Same scale and shift as cv2.normalize with NORM_MINMAX
+    scale = 255.0 / (hi - lo) if hi > lo else 0.0
+    shift = -lo * scale
+    normalized_image = np.empty(data.shape, dtype=np.uint8)
+    for start in range(0, n_rows, block_rows):
+        block = _scaled_block(data[start:start + block_rows], bscale, bzero, blank)
+        block *= np.float32(scale)
+        block += np.float32(shift)
+        np.rint(block, out=block)
+        np.clip(block, 0, 255, out=block)
+        normalized_image[start:start + block_rows] = block
+    return normalized_image
+
+
+def iter_frames(fits_paths, data_layer: int = 1, prefetch: int = 2, memmap: bool = False,
+                cache=None, workers: int = 1, executor: str = "process"):
+    """
+    Yields the normalized images of a series one after another.
+
+    A background thread decodes up to `prefetch` frames ahead of the consumer,
+    so at most `prefetch + 1` frames are held in memory at any time and the
+    first frame is available as soon as it has been decoded. With workers > 1
+    the frames are decoded concurrently on a pool instead (see
+    _iter_frames_pool), still delivered in order.
+
+    Args:
+        fits_paths (iterable): paths to the fits files, in the order of the series
+        data_layer (int): the index of the data layer in the fits files
+        prefetch (int): number of frames decoded in advance (0 disables the thread)
+        memmap (bool): use the memory-mapped loader, see image_processing_fits
+        cache (FrameCache): optional cache of normalized frames, see image_processing_fits
+        workers (int): number of frames decoded concurrently
+        executor (str): "process" or "thread" pool for workers > 1
+    Yields:
+        normalized_image (np.ndarray): normalized image between 0 and 255
+    """
+    if workers > 1:
+        yield from _iter_frames_pool(fits_paths, data_layer, max(prefetch, workers), memmap,
+                                     cache, workers, executor)
+        return
+
+    if prefetch <= 0:
+        for fits_path in fits_paths:
+            yield image_processing_fits(fits_path, data_layer, memmap, cache)
+        return
+
+    frame_queue = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def _put(item):
+        # Blocks while the window is full, but gives up if the consumer is gone
+        while not stop.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _producer():
+        try:
+            for fits_path in fits_paths:
+                if not _put((image_processing_fits(fits_path, data_layer, memmap, cache), None)):
+                    return
+        except Exception as e:
+            _put((None, e))
+            return
+        _put(_END)
+
+    worker = threading.Thread(target=_producer, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = frame_queue.get()
+            if item is _END:
+                break
+            frame, error = item
+            if error is not None:
+                raise error
+            yield frame
+    finally:
+        stop.set()
+        worker.join()
+
+
+def _iter_frames_pool(fits_paths, data_layer, max_in_flight, memmap, cache, workers, executor):
+    """
+    Decodes frames concurrently and yields them in the order of the series.
+
+    At most `max_in_flight` frames are submitted but not yet consumed. Rice
+    decompression in astropy runs a Python loop over the tiles, so a process
+    pool scales better than threads for HMI files.
+    """
+    if executor == "process":
+        context = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    elif executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unbekannter Executor: {executor}. Verfügbare Optionen: ['process', 'thread']")
+
+    in_flight = collections.deque()
+    paths = iter(fits_paths)
+    try:
+        for fits_path in paths:
+            in_flight.append(pool.submit(image_processing_fits, fits_path, data_layer, memmap, cache))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def load_trace_frames(trace: int, workers: int = 1, max_in_flight: int = None,
+                      executor: str = "process", data_layer: int = 1, memmap: bool = False,
+                      cache=None):
+    """
+    Loads the normalized frames of a trace ('data/TR_XX/names.txt') in order,
+    decoding up to `workers` files concurrently.
+
+    Args:
+        trace (int): number of the trace series
+        workers (int): number of concurrent decoders
+        max_in_flight (int): bound on decoded but not yet consumed frames
+            (default: 2 * workers)
+        executor (str): "process" or "thread" pool
+        data_layer (int): the index of the data layer in the fits files
+        memmap (bool): use the memory-mapped loader, see image_processing_fits
+        cache (FrameCache): optional cache of normalized frames
+    Returns:
+        generator of np.ndarray: normalized images in the order of the series
+    """
+    from solar_tracking.traces import trace_files
+
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+    return iter_frames(trace_files(trace), data_layer, prefetch=max_in_flight, memmap=memmap,
+                       cache=cache, workers=workers, executor=executor)
@@ -0,0 +1,231 @@
+"""
+Tracking durch Verknüpfen von Detektionen (Alternative zum OpenCV-MIL-Tracker).
+
+In jedem Bild werden die Spots mit find_spots_and_boxes neu detektiert und mit
+den bestehenden Spuren verknüpft. Die Position jeder Spur wird mit der
+differentiellen Rotation der Sonne vorhergesagt, anschließend wird die nächste
+Detektion im Suchradius um die Vorhersage gesucht (KD-Baum). Wird ein Spot in
+einzelnen Bildern nicht gefunden, läuft die Spur bis zu max_gap Bilder auf der
+Vorhersage weiter (Lückenfüllung), danach gilt sie als verloren.
+"""
+import numpy as np
+
+from solar_tracking.sunspot_detection import _detect_spots
+
+# Synodische differentielle Rotation in °/Tag: A + B*sin²(b) + C*sin⁴(b)
+# (Snodgrass & Ulrich 1990, siderisch 14.713/-2.396/-1.787, minus 0.986 °/Tag Erdumlauf)
+ROTATION_COEFFICIENTS = (13.727, -2.396, -1.787)
+
+
+def drift_direction(fits_path=None, data_layer: int = 1, crota2: float = None) -> int:
+    """
+    Gibt die Richtung der Rotation in x an: +1, wenn Westen rechts liegt (CROTA2 = 0),
+    -1 für um 180° gedrehte Bilder (z. B. HMI mit CROTA2 ≈ 180).
+
+    Ist crota2 angegeben (z. B. aus dem Header-Index), wird die Datei nicht gelesen.
+    """
+    if crota2 is None:
+        from astropy.io import fits
+
+        crota2 = fits.getheader(fits_path, data_layer).get("CROTA2", 0.0)
+    if not np.isfinite(crota2):
+        crota2 = 0.0
+    return 1 if np.cos(np.deg2rad(crota2)) >= 0 else -1
+
+
+def predict_positions(positions: np.ndarray, sun_radius: float, sun_center: tuple,
+                      hours: float, direction: int = 1) -> np.ndarray:
+    """
+    Sagt Pixelpositionen nach `hours` Stunden differentieller Rotation voraus.
+
+    Die Rotationsachse wird parallel zur y-Achse des Bildes angenommen
+    (B0 = 0, P = 0); für die Vorhersage über wenige Bilder ist das genau genug.
+
+    Args:
+        positions (np.ndarray): (n, 2)-Array der (x, y)-Positionen in Pixeln
+        sun_radius (float): Sonnenradius in Pixeln
+        sun_center (tuple): (x, y)-Koordinate des Sonnenmittelpunkts
+        hours (float): Zeitraum der Vorhersage in Stunden
+        direction (int): Richtung der Rotation in x, siehe drift_direction
+
+    Returns:
+        np.ndarray: vorhergesagte (x, y)-Positionen
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    sin_lat = np.clip((positions[:, 1] - sun_center[1]) / sun_radius, -1, 1)
+    cos_lat = np.sqrt(1 - sin_lat**2)
+    # Länge relativ zum Zentralmeridian, in Richtung der Rotation gezählt
+    sin_lon = direction * (positions[:, 0] - sun_center[0]) / np.maximum(sun_radius * cos_lat, 1e-9)
+    lon = np.arcsin(np.clip(sin_lon, -1, 1))
+    a, b, c = ROTATION_COEFFICIENTS
+    omega = np.deg2rad(a + b * sin_lat**2 + c * sin_lat**4) / 24.0  # rad/h
+    new_lon = np.minimum(lon + omega * hours, np.pi / 2)
+    predicted = positions.copy()
+    predicted[:, 0] = sun_center[0] + direction * sun_radius * cos_lat * np.sin(new_lon)
+    return predicted
+
+
+def step_hours(cadence: float, frame_hours, frame: int) -> float:
+    """
+    Zeit in Stunden zwischen Bild `frame - 1` und Bild `frame`: aus den echten
+    Zeitpunkten frame_hours (siehe header_index.frame_hours), sonst die feste cadence.
+    """
+    if frame_hours is None or frame >= len(frame_hours):
+        return cadence
+    return float(frame_hours[frame] - frame_hours[frame - 1])
+
+
+def _nearest_neighbours(points: np.ndarray, queries: np.ndarray, max_distance: float):
+    """
+    Nächste Detektion zu jeder Vorhersage innerhalb von max_distance.
+
+    Returns:
+        tuple: (Abstände, Indizes); ohne Treffer ist der Abstand inf und der Index len(points)
+    """
+    if len(points) == 0:
+        return np.full(len(queries), np.inf), np.full(len(queries), 0)
+    try:
+        from scipy.spatial import cKDTree
+        return cKDTree(points).query(queries, distance_upper_bound=max_distance)
+    except ImportError:
+        # Fallback ohne SciPy: alle Abstände (wenige Spots pro Bild)
+        distances = np.linalg.norm(queries[:, None, :] - points[None, :, :], axis=2)
+        idx = np.argmin(distances, axis=1)
+        best = distances[np.arange(len(queries)), idx]
+        return np.where(best <= max_distance, best, np.inf), np.where(best <= max_distance, idx, len(points))
+
+
+class LinkTrackingSession:
+    """
+    Verfolgt alle Spots einer Bildserie durch Verknüpfen der Detektionen pro Bild.
+
+    Hat dieselbe Schnittstelle wie TrackingSession (tracks, n_frames, update),
+    zusätzlich hält jede Spur 'gap', die Anzahl der aufeinanderfolgenden Bilder,
+    in denen ihre Position nur vorhergesagt wurde (0 = im aktuellen Bild detektiert).
+    `detections` hält die Boxen und Zentroiden aller Detektionen des letzten Bildes.
+    Die Zuordnung erfolgt gierig nach Abstand, jede Detektion wird höchstens
+    einer Spur zugeordnet.
+
+    Parameter
+    ----------
+    first_image : np.ndarray
+        Das erste Bild der Serie (wird nur für die Schnittstelle benötigt).
+    bbox : list of tuples
+        Bounding-Boxen der Spots im ersten Bild, siehe find_spots_and_boxes.
+    centroids : list of np.ndarray
+        Zentroiden der Spots im ersten Bild.
+    spot_ids : list of int, optional
+        IDs der Spots (Standard: 0, 1, 2, ...).
+    sun_radius : int
+        Sonnenradius in Pixeln.
+    sun_center : tuple
+        (x, y)-Koordinate des Sonnenmittelpunkts.
+    cadence : float, optional
+        Zeit zwischen zwei Bildern in Stunden (Standard: 1).
+    frame_hours : array, optional
+        Zeitpunkte aller Bilder in Stunden (siehe header_index.frame_hours); ersetzt
+        cadence bei unregelmäßigen Abständen.
+    direction : int, optional
+        Richtung der Rotation in x, siehe drift_direction (Standard: 1).
+    search_radius : float, optional
+        Suchradius um die Vorhersage in Pixeln (Standard: 2 % des Sonnenradius, mindestens 5).
+    max_gap : int, optional
+        Anzahl der Bilder, die eine Spur ohne Detektion überbrücken darf (Standard: 3).
+    detection_kwargs : dict, optional
+        Parameter von find_spots_and_boxes für die Detektion in jedem Bild.
+    """
+
+    def __init__(self, first_image: np.ndarray, bbox, centroids, spot_ids=None, *, sun_radius,
+                 sun_center, cadence: float = 1.0, direction: int = 1, search_radius: float = None,
+                 max_gap: int = 3, detection_kwargs=None, frame_hours=None):
+        if spot_ids is None:
+            spot_ids = range(len(bbox))
+        self.sun_radius = sun_radius
+        self.sun_center = sun_center
+        self.cadence = cadence
+        self.frame_hours = frame_hours
+        self.direction = direction
+        self.search_radius = search_radius if search_radius is not None else max(5.0, 0.02 * sun_radius)
+        self.max_gap = max_gap
+        self.detection_kwargs = detection_kwargs or {}
+        self.detections = (np.empty((0, 4)), np.empty((0, 2)))
+        self.tracks = []
+        self._positions = np.empty((0, 2))
+        self._boxes = np.empty((0, 4))
+        self.add_spots(first_image, bbox, centroids, spot_ids)
+        self.n_frames = 1
+
+    def add_spots(self, image: np.ndarray, bbox, centroids, spot_ids):
+        """Nimmt weitere Spots, die im Bild `image` detektiert wurden, in die Verfolgung auf."""
+        for spot_id, centroid in zip(spot_ids, centroids):
+            self.tracks.append({"spot": int(spot_id),
+                                "x1": int(centroid[0]), "y1": int(centroid[1]),
+                                "x2": None, "y2": None,
+                                "success": True, "box": None, "gap": 0})
+        self._positions = np.vstack([self._positions, np.array(centroids, dtype=float).reshape(-1, 2)])
+        self._boxes = np.vstack([self._boxes, np.array(bbox, dtype=float).reshape(-1, 4)])
+
+    def drop_lost(self):
+        """Entfernt die verlorenen Spots, damit sie bei den nächsten Bildern keine Arbeit mehr kosten."""
+        keep = np.array([track["success"] for track in self.tracks], dtype=bool)
+        self.tracks = [track for track, k in zip(self.tracks, keep) if k]
+        self._positions = self._positions[keep]
+        self._boxes = self._boxes[keep]
+
+    def update(self, image: np.ndarray):
+        """
+        Detektiert die Spots im nächsten Bild und verknüpft sie mit den Spuren.
+
+        Returns:
+            None: anders als TrackingSession wird kein BGR-Bild erzeugt
+        """
+        boxes, centroids, _ = _detect_spots(image, self.sun_radius, self.sun_center, **self.detection_kwargs)
+        self.update_detections(boxes, centroids)
+
+    def update_detections(self, boxes, centroids):
+        """
+        Verknüpft bereits vorliegende Detektionen eines Bildes mit den Spuren,
+        z. B. aus einem Spot-Katalog (siehe detect_spots_batch).
+
+        Args:
+            boxes (np.ndarray): (k, 4)-Array der Boxen (x, y, w, h)
+            centroids (np.ndarray): (k, 2)-Array der Zentroiden
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        centroids = np.asarray(centroids, dtype=float).reshape(-1, 2)
+        self.detections = (boxes, centroids)
+        alive = np.array([track["success"] for track in self.tracks], dtype=bool)
+        predicted = predict_positions(self._positions, self.sun_radius, self.sun_center,
+                                      step_hours(self.cadence, self.frame_hours, self.n_frames), self.direction)
+
+        matched = np.full(len(self.tracks), -1)
+        if alive.any() and len(centroids):
+            candidates = np.flatnonzero(alive)
+            distances, idx = _nearest_neighbours(centroids, predicted[candidates], self.search_radius)
+            taken = np.zeros(len(centroids), dtype=bool)
+            for k in np.argsort(distances, kind="stable"):
+                if not np.isfinite(distances[k]) or taken[idx[k]]:
+                    continue
+                taken[idx[k]] = True
+                matched[candidates[k]] = idx[k]
+
+        for i, track in enumerate(self.tracks):
+            if not track["success"]:
+                continue
+            if matched[i] >= 0:
+                self._positions[i] = centroids[matched[i]]
+                self._boxes[i] = boxes[matched[i]]
+                track["gap"] = 0
+            else:
+                # Lückenfüllung: Die Spur läuft auf der Vorhersage weiter
+                self._boxes[i, :2] += predicted[i] - self._positions[i]
+                self._positions[i] = predicted[i]
+                track["gap"] += 1
+                if track["gap"] > self.max_gap:
+                    track["success"] = False
+                    track["box"], track["x2"], track["y2"] = None, None, None
+                    continue
+            track["box"] = tuple(int(round(v)) for v in self._boxes[i])
+            track["x2"] = int(self._positions[i, 0])
+            track["y2"] = int(self._positions[i, 1])
+        self.n_frames += 1
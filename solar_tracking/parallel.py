@@ -0,0 +1,208 @@
+"""
+Paralleles Tracking der Spots einer Bildserie auf mehreren Prozessen.
+
+Die Spots werden gleichmäßig auf Worker-Prozesse verteilt, jeder Worker führt
+eine eigene TrackingSession für seinen Teil der Spots. Die Bilder werden nicht
+an die Worker gepickelt, sondern vom Hauptprozess in einen Ringpuffer im
+Shared Memory geschrieben, aus dem alle Worker lesen. Über die Pipes werden nur
+Bildindizes und die (kleinen) Ergebnisse pro Spot verschickt.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedFrameRing:
+    """
+    Ringpuffer für Bilder gleicher Größe im Shared Memory.
+
+    Args:
+        shape (tuple): Form eines Bildes
+        slots (int): Anzahl der Bilder im Ring
+        name (str, optional): Name eines bestehenden Rings, an den angehängt wird;
+            ohne Namen wird ein neuer Ring angelegt
+    """
+
+    def __init__(self, shape, slots: int, name: str = None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        size = int(np.prod(self.shape)) * slots
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self._shm.buf)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def write(self, slot: int, image: np.ndarray):
+        """Kopiert ein Bild in den angegebenen Platz des Rings."""
+        if image.shape != self.shape:
+            raise ValueError(f"Bildgröße {image.shape} passt nicht zum Ringpuffer {self.shape}.")
+        self._frames[slot] = image
+
+    def read(self, slot: int) -> np.ndarray:
+        """Gibt eine Ansicht (ohne Kopie) auf das Bild im angegebenen Platz zurück."""
+        return self._frames[slot]
+
+    def close(self):
+        """Gibt den Ring frei; der erzeugende Prozess entfernt zusätzlich den Speicher."""
+        self._frames = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _spot_worker(conn, ring_name, shape, slots, bbox, centroids, spot_ids):
+    """
+    Arbeitsschleife eines Worker-Prozesses.
+
+    Protokoll: Nach der Initialisierung auf dem Bild in Platz 0 wird (0, Spots)
+    gesendet. Danach wird für jeden empfangenen Bildindex i das Bild aus Platz
+    i % slots verarbeitet und (i, Spots) zurückgeschickt. None beendet den Worker.
+    """
+    import cv2
+    from solar_tracking.tracking import TrackingSession
+
+    # Die Parallelität kommt aus den Prozessen, nicht aus OpenCV-Threads
+    cv2.setNumThreads(1)
+    ring = SharedFrameRing(shape, slots, name=ring_name)
+    try:
+        session = TrackingSession(ring.read(0), bbox, centroids, spot_ids)
+        conn.send((0, session.tracks))
+        while True:
+            frame_index = conn.recv()
+            if frame_index is None:
+                break
+            session.update(ring.read(frame_index % slots))
+            conn.send((frame_index, session.tracks))
+    except Exception as e:
+        conn.send((None, e))
+    finally:
+        ring.close()
+        conn.close()
+
+
+def _send(conn, message):
+    """
+    Schickt eine Nachricht an einen Worker. Ist der Worker schon beendet, wird statt
+    des BrokenPipeError der Fehler gemeldet, den er vorher noch gesendet hat.
+    """
+    try:
+        conn.send(message)
+    except (BrokenPipeError, OSError) as e:
+        try:
+            while conn.poll():
+                frame_index, payload = conn.recv()
+                if frame_index is None:
+                    raise RuntimeError(f"Fehler im Tracking-Worker: {payload!r}") from payload
+        except (EOFError, OSError):
+            pass
+        raise RuntimeError("Ein Tracking-Worker wurde unerwartet beendet.") from e
+
+
+def track_spots_parallel(first_image: np.ndarray, frames, bbox, centroids, on_frame=None,
+                         workers: int = 2, slots: int = 4, trajectory=None):
+    """
+    Verfolgt alle Spots über die Bildserie, verteilt auf mehrere Prozesse.
+
+    Entspricht track_spots, die Spots werden aber reihum auf `workers` Prozesse
+    verteilt. Der Hauptprozess schreibt jedes Bild einmal in den Ringpuffer; ein
+    Platz wird erst wieder beschrieben, wenn alle Worker das alte Bild darin
+    verarbeitet haben. Die Ergebnisse werden nach Spot-ID sortiert zusammengeführt
+    und sind damit unabhängig von der Anzahl der Worker geordnet.
+
+    Args:
+        first_image (np.ndarray): erstes Bild der Serie (Initialisierung der Tracker)
+        frames (iterable): die weiteren Bilder der Serie
+        bbox (list): Bounding-Boxen der Spots im ersten Bild
+        centroids (list): Zentroiden der Spots im ersten Bild
+        on_frame (callable, optional): siehe track_spots
+        workers (int): Anzahl der Worker-Prozesse
+        slots (int): Anzahl der Bilder im Ringpuffer (mindestens 2)
+        trajectory (Trajectory, optional): erhält die zusammengeführten Spots jedes Bildes
+
+    Returns:
+        list of dict: siehe track_spots
+    """
+    import cv2
+
+    workers = max(1, min(workers, len(bbox)))
+    slots = max(2, slots)
+    context = multiprocessing.get_context("spawn")
+    ring = SharedFrameRing(first_image.shape, slots)
+    ring.write(0, first_image)
+
+    conns, processes = [], []
+    try:
+        for w in range(workers):
+            spot_ids = list(range(w, len(bbox), workers))
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_spot_worker,
+                args=(child_conn, ring.name, ring.shape, slots,
+                      [bbox[i] for i in spot_ids], [centroids[i] for i in spot_ids], spot_ids),
+                daemon=True)
+            process.start()
+            child_conn.close()
+            conns.append(parent_conn)
+            processes.append(process)
+
+        def collect(expected_index):
+            # Sammelt die Ergebnisse aller Worker zu einem Bild ein
+            tracks = []
+            for conn in conns:
+                frame_index, worker_tracks = conn.recv()
+                if frame_index is None:
+                    raise RuntimeError(f"Fehler im Tracking-Worker: {worker_tracks!r}") from worker_tracks
+                if frame_index != expected_index:
+                    raise RuntimeError(f"Tracking-Worker antwortet für Bild {frame_index}, "
+                                       f"erwartet war Bild {expected_index}.")
+                tracks.extend(worker_tracks)
+            tracks.sort(key=lambda track: track["spot"])
+            if trajectory is not None:
+                trajectory.append(tracks)
+            if (on_frame is not None and expected_index > 0
+                    and on_frame(expected_index, tracks,
+                                 cv2.cvtColor(ring.read(expected_index % slots), cv2.COLOR_GRAY2BGR)) is False):
+                return None
+            return tracks
+
+        tracks = None
+        next_collect = 0
+        n_sent = 0
+        for frame_index, image in enumerate(frames, start=1):
+            # Der Platz darf erst überschrieben werden, wenn das alte Bild fertig ist
+            while next_collect <= frame_index - slots:
+                tracks = collect(next_collect)
+                if tracks is None:
+                    return None
+                next_collect += 1
+            ring.write(frame_index % slots, image)
+            for conn in conns:
+                _send(conn, frame_index)
+            n_sent = frame_index
+        while next_collect <= n_sent:
+            tracks = collect(next_collect)
+            if tracks is None:
+                return None
+            next_collect += 1
+        return tracks
+    finally:
+        for conn in conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for conn in conns:
+            conn.close()
+        ring.close()
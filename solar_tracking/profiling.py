@@ -0,0 +1,240 @@
+"""
+Optionale Messung von Laufzeit, Aufrufzahl und Speicherspitzen pro Stufe der Pipeline.
+
+Die Stufen (Dekodieren mit image_processing_fits, Spot-Detektion, die
+Tracker-Updates in track_spots, die Koordinatenumrechnung in
+rotation_analysis, ...) sind mit `profiled` bzw. `stage` markiert. Solange die
+Messung nicht mit `enable` eingeschaltet ist, kostet eine Markierung nur eine
+Abfrage einer globalen Variable.
+
+Eingeschaltet wird pro Stufe die Wandzeit, die Anzahl der Aufrufe und, mit
+memory=True, die größte zusätzliche Speicherbelegung eines Aufrufs über
+tracemalloc gemessen (nur Allokationen über Python/NumPy, nicht die internen
+Puffer von OpenCV). Verschachtelte Stufen werden jeweils einzeln gezählt, ein
+rekursiver Aufruf derselben Stufe nur einmal. Gemessen wird nur im aktuellen
+Prozess; die Zeiten aus Threads (z. B. dem Vorlauf von iter_frames) werden
+mitgezählt, ihre Speicherspitzen sind dann aber nur Näherungen, weil
+tracemalloc die Spitze global für alle Threads führt.
+
+Beispiel:
+    from solar_tracking import profiling
+    profiling.enable()
+    run_tracking(1, interactive=False)
+    profiling.write_report("profile.json")
+"""
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_enabled = False
+_memory = False
+_own_tracing = False  # tracemalloc wurde von enable gestartet
+_max_peak = 0
+_started = None
+_stopped = None
+_lock = threading.Lock()
+_stats = {}
+_local = threading.local()
+
+
+def enable(memory: bool = True):
+    """
+    Schaltet die Messung ein und verwirft bisherige Ergebnisse.
+
+    Args:
+        memory (bool): Speicherspitzen über tracemalloc messen (verlangsamt
+            Allokationen deutlich, die Zeiten sind dann etwas höher)
+    """
+    global _enabled, _memory, _own_tracing, _started, _stopped
+    reset()
+    _memory = memory
+    _own_tracing = memory and not tracemalloc.is_tracing()
+    if _own_tracing:
+        tracemalloc.start()
+    _started, _stopped = time.perf_counter(), None
+    _enabled = True
+
+
+def disable():
+    """Schaltet die Messung aus; die Ergebnisse bleiben für report erhalten."""
+    global _enabled, _own_tracing, _stopped
+    _enabled = False
+    _stopped = time.perf_counter()
+    if _memory and tracemalloc.is_tracing():
+        _observe(tracemalloc.get_traced_memory()[1])
+        if _own_tracing:
+            tracemalloc.stop()
+    _own_tracing = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """Verwirft alle bisherigen Ergebnisse."""
+    global _max_peak
+    with _lock:
+        _stats.clear()
+        _max_peak = 0
+
+
+def _observe(peak: int):
+    global _max_peak
+    _max_peak = max(_max_peak, peak)
+
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _record(name: str, seconds: float, peak_bytes):
+    with _lock:
+        entry = _stats.setdefault(name, {"calls": 0, "total_s": 0.0, "min_s": float("inf"),
+                                         "max_s": 0.0, "peak_bytes": None})
+        entry["calls"] += 1
+        entry["total_s"] += seconds
+        entry["min_s"] = min(entry["min_s"], seconds)
+        entry["max_s"] = max(entry["max_s"], seconds)
+        if peak_bytes is not None:
+            entry["peak_bytes"] = max(entry["peak_bytes"] or 0, peak_bytes)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Misst den eingeschlossenen Block als Stufe `name`.
+
+    Die Speicherspitze einer Stufe ist die größte Belegung während des Blocks
+    abzüglich der Belegung beim Eintritt. Vor dem Eintritt in eine innere Stufe
+    wird die bisherige Spitze der äußeren gesichert, weil tracemalloc dafür
+    zurückgesetzt wird.
+    """
+    stack = _stack()
+    if not _enabled or any(frame["name"] == name for frame in stack):
+        yield
+        return
+    memory = _memory and tracemalloc.is_tracing()
+    frame = {"name": name, "start": 0, "peak": 0}
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        _observe(peak)
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame["start"] = frame["peak"] = current
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        peak_bytes = None
+        if memory and tracemalloc.is_tracing():
+            frame["peak"] = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            _observe(frame["peak"])
+            peak_bytes = frame["peak"] - frame["start"]
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], frame["peak"])
+        _record(name, seconds, peak_bytes)
+
+
+def profiled(name: str = None):
+    """
+    Dekorator, der jeden Aufruf der Funktion als Stufe misst.
+
+    Args:
+        name (str, optional): Name der Stufe (Standard: Name der Funktion)
+    """
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with stage(stage_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_iter(name: str, iterable):
+    """
+    Misst das Warten auf jedes Element eines Iterators als Stufe `name`,
+    z. B. das Warten auf das nächste dekodierte Bild.
+    """
+    iterator = iter(iterable)
+    while True:
+        if _enabled:
+            with stage(name):
+                item = next(iterator, StopIteration)
+        else:
+            item = next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
+
+
+def report() -> dict:
+    """
+    Ergebnisse der Messung.
+
+    Returns:
+        dict: 'wall_time_s' (seit enable), 'memory' (ob Speicher gemessen wurde),
+        'peak_bytes' (größte Belegung insgesamt) und 'stages' mit 'calls',
+        'total_s', 'mean_s', 'min_s', 'max_s' und 'peak_bytes' pro Stufe,
+        nach Gesamtzeit absteigend sortiert
+    """
+    with _lock:
+        stages = {name: dict(entry, mean_s=entry["total_s"] / entry["calls"])
+                  for name, entry in sorted(_stats.items(), key=lambda item: -item[1]["total_s"])}
+    if _enabled and _memory and tracemalloc.is_tracing():
+        _observe(tracemalloc.get_traced_memory()[1])
+    wall_time = None if _started is None else (_stopped or time.perf_counter()) - _started
+    return {"wall_time_s": wall_time,
+            "memory": _memory,
+            "peak_bytes": _max_peak if _memory else None,
+            "stages": stages}
+
+
+def summary() -> str:
+    """Ergebnisse als Tabelle für die Konsole."""
+    data = report()
+    lines = [f"{'Stufe':<28} {'Aufrufe':>8} {'gesamt [s]':>11} {'Mittel [ms]':>12} {'Spitze [MiB]':>13}"]
+    for name, entry in data["stages"].items():
+        peak = "-" if entry["peak_bytes"] is None else f"{entry['peak_bytes'] / 2**20:.1f}"
+        lines.append(f"{name:<28} {entry['calls']:>8} {entry['total_s']:>11.3f} "
+                     f"{entry['mean_s'] * 1e3:>12.2f} {peak:>13}")
+    return "\n".join(lines)
+
+
+def write_report(path):
+    """Schreibt die Ergebnisse (siehe report) als JSON-Datei."""
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
+
+
+@contextmanager
+def profile(memory: bool = True):
+    """
+    Misst den eingeschlossenen Block und liefert am Ende die Ergebnisse.
+
+    Beispiel:
+        with profiling.profile() as result:
+            run_tracking(1, interactive=False)
+        print(result["stages"])
+    """
+    result = {}
+    enable(memory)
+    try:
+        yield result
+    finally:
+        disable()
+        result.update(report())
@@ -0,0 +1,182 @@
+"""
+Subpixel-Tracking der Spots auf kleinen Suchfenstern (ROI).
+
+Statt das ganze Bild an einen Tracker zu übergeben, wird für jeden Spot nur ein
+Fenster um die vorhergesagte Position ausgeschnitten und mit einem Template
+des Spots aus dem vorherigen Bild verglichen, per normierter Kreuzkorrelation
+(cv2.matchTemplate) oder FFT-Phasenkorrelation (cv2.phaseCorrelate). Der
+Aufwand pro Bild hängt damit nur von der Größe der Fenster ab, nicht von der
+Bildgröße, und die Positionen werden subpixelgenau bestimmt.
+"""
+import cv2
+import numpy as np
+
+from solar_tracking.linking import predict_positions, step_hours
+
+# Standard-Mindestwerte der Übereinstimmung, unter denen ein Spot als verloren gilt
+MIN_SCORES = {"ncc": 0.5, "phase": 0.05}
+
+
+def _subpixel_peak(result: np.ndarray):
+    """
+    Position des Maximums einer Korrelationsfläche mit Parabel-Interpolation
+    in x und y.
+
+    Returns:
+        tuple: ((x, y) des Maximums als float, Wert des Maximums)
+    """
+    _, score, _, (px, py) = cv2.minMaxLoc(result)
+    x, y = float(px), float(py)
+    if 0 < px < result.shape[1] - 1:
+        left, center, right = result[py, px - 1], result[py, px], result[py, px + 1]
+        denominator = left - 2 * center + right
+        if denominator < 0:
+            x += 0.5 * (left - right) / denominator
+    if 0 < py < result.shape[0] - 1:
+        top, center, bottom = result[py - 1, px], result[py, px], result[py + 1, px]
+        denominator = top - 2 * center + bottom
+        if denominator < 0:
+            y += 0.5 * (top - bottom) / denominator
+    return (x, y), score
+
+
+class RoiTrackingSession:
+    """
+    Verfolgt alle Spots einer Bildserie auf kleinen Suchfenstern, subpixelgenau.
+
+    Hat dieselbe Schnittstelle wie TrackingSession (tracks, n_frames, update), die
+    Koordinaten x1, y1, x2 und y2 sind aber Gleitkommazahlen. Das Template jedes
+    Spots ist die Box aus dem vorherigen Bild plus `padding`, es wird nach jedem
+    Bild an der neuen (subpixelgenauen) Position aktualisiert.
+
+    Die Position im nächsten Bild wird mit der differentiellen Rotation
+    vorhergesagt, wenn sun_radius und sun_center angegeben sind (siehe
+    solar_tracking.linking.predict_positions), sonst aus der letzten Verschiebung.
+
+    Parameter
+    ----------
+    first_image : np.ndarray
+        Das erste (normalisierte) Bild der Serie.
+    bbox : list of tuples
+        Bounding-Boxen der Spots im ersten Bild, siehe find_spots_and_boxes.
+    centroids : list of np.ndarray
+        Zentroiden der Spots im ersten Bild.
+    spot_ids : list of int, optional
+        IDs der Spots (Standard: 0, 1, 2, ...).
+    method : str, optional
+        "ncc" (normierte Kreuzkorrelation, Standard) oder "phase" (Phasenkorrelation).
+    search_radius : int, optional
+        Maximale Abweichung von der Vorhersage in Pixeln (Standard: 10).
+    padding : int, optional
+        Rand um die Box im Template in Pixeln (Standard: 10).
+    min_score : float, optional
+        Mindestwert der Übereinstimmung (Standard: siehe MIN_SCORES).
+    sun_radius, sun_center, cadence, direction, frame_hours : optional
+        Geometrie und Bildabstand in Stunden für die Vorhersage, siehe LinkTrackingSession.
+    """
+
+    def __init__(self, first_image: np.ndarray, bbox, centroids, spot_ids=None, *, method: str = "ncc",
+                 search_radius: int = 10, padding: int = 10, min_score: float = None,
+                 sun_radius=None, sun_center=None, cadence: float = 1.0, direction: int = 1,
+                 frame_hours=None):
+        if method not in MIN_SCORES:
+            raise ValueError(f"Unbekannte Methode: {method}. Verfügbare Optionen: {list(MIN_SCORES)}")
+        if spot_ids is None:
+            spot_ids = range(len(bbox))
+        self.method = method
+        self.search_radius = int(search_radius)
+        self.min_score = MIN_SCORES[method] if min_score is None else min_score
+        self.sun_radius = sun_radius
+        self.sun_center = sun_center
+        self.cadence = cadence
+        self.frame_hours = frame_hours
+        self.direction = direction
+        self.padding = padding
+        self.tracks = []
+        self._templates = []
+        self._sizes = []
+        self._windows = []
+        self._positions = np.empty((0, 2))
+        self._velocities = np.empty((0, 2))
+        self.add_spots(first_image, bbox, centroids, spot_ids)
+        self.n_frames = 1
+
+    def add_spots(self, image: np.ndarray, bbox, centroids, spot_ids):
+        """Nimmt weitere Spots, die im Bild `image` detektiert wurden, in die Verfolgung auf."""
+        positions = np.array(centroids, dtype=float).reshape(-1, 2)
+        for spot_id, spot, position in zip(spot_ids, bbox, positions):
+            size = (int(spot[2]) + 2 * self.padding, int(spot[3]) + 2 * self.padding)
+            self._sizes.append(size)
+            self._templates.append(cv2.getRectSubPix(image, size, tuple(position), patchType=cv2.CV_32F))
+            if self.method == "phase":
+                self._windows.append(cv2.createHanningWindow(size, cv2.CV_32F))
+            self.tracks.append({"spot": int(spot_id),
+                                "x1": float(position[0]), "y1": float(position[1]),
+                                "x2": None, "y2": None,
+                                "success": True, "box": None, "score": None})
+        self._positions = np.vstack([self._positions, positions])
+        self._velocities = np.vstack([self._velocities, np.zeros_like(positions)])
+
+    def drop_lost(self):
+        """Entfernt die verlorenen Spots, damit sie bei den nächsten Bildern keine Arbeit mehr kosten."""
+        keep = np.array([track["success"] for track in self.tracks], dtype=bool)
+        self.tracks = [track for track, k in zip(self.tracks, keep) if k]
+        self._templates = [template for template, k in zip(self._templates, keep) if k]
+        self._sizes = [size for size, k in zip(self._sizes, keep) if k]
+        if self.method == "phase":
+            self._windows = [window for window, k in zip(self._windows, keep) if k]
+        self._positions = self._positions[keep]
+        self._velocities = self._velocities[keep]
+
+    def _predict(self) -> np.ndarray:
+        if self.sun_radius is not None:
+            return predict_positions(self._positions, self.sun_radius, self.sun_center,
+                                     step_hours(self.cadence, self.frame_hours, self.n_frames), self.direction)
+        return self._positions + self._velocities
+
+    def _match(self, i: int, image: np.ndarray, predicted: np.ndarray):
+        """Sucht Spot i um die Vorhersage; gibt (neue Position, Übereinstimmung) zurück."""
+        template, (w, h) = self._templates[i], self._sizes[i]
+        # Auf ganze Pixel gerundetes Zentrum: das Fenster wird ohne Interpolation ausgeschnitten
+        center = np.round(predicted)
+        if self.method == "ncc":
+            r = self.search_radius
+            window = cv2.getRectSubPix(image, (w + 2 * r, h + 2 * r), tuple(center), patchType=cv2.CV_32F)
+            result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            (x, y), score = _subpixel_peak(result)
+            return center + (x - r, y - r), score
+        position = center
+        # Der Subpixelanteil von phaseCorrelate ist zu ganzen Pixeln hin verzerrt; ein zweiter
+        # Durchlauf auf dem (interpolierten) Fenster um die erste Schätzung verringert den Fehler
+        for _ in range(2):
+            window = cv2.getRectSubPix(image, (w, h), tuple(position), patchType=cv2.CV_32F)
+            (dx, dy), score = cv2.phaseCorrelate(template, window, self._windows[i])
+            position = position + (dx, dy)
+        if np.abs(position - predicted).max() > self.search_radius:
+            return position, 0.0
+        return position, score
+
+    def update(self, image: np.ndarray):
+        """
+        Sucht alle Spots im nächsten Bild.
+
+        Returns:
+            None: anders als TrackingSession wird kein BGR-Bild erzeugt
+        """
+        predicted = self._predict()
+        for i, track in enumerate(self.tracks):
+            if not track["success"]:
+                continue
+            position, score = self._match(i, image, predicted[i])
+            track["score"] = float(score)
+            if score < self.min_score:
+                track["success"] = False
+                track["box"], track["x2"], track["y2"] = None, None, None
+                continue
+            self._velocities[i] = position - self._positions[i]
+            self._positions[i] = position
+            self._templates[i] = cv2.getRectSubPix(image, self._sizes[i], tuple(position), patchType=cv2.CV_32F)
+            w, h = self._sizes[i]
+            track["x2"], track["y2"] = float(position[0]), float(position[1])
+            track["box"] = (int(round(position[0] - w / 2)), int(round(position[1] - h / 2)), w, h)
+        self.n_frames += 1
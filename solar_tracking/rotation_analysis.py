@@ -2,6 +2,9 @@ import numpy as np
 import astropy.units as u
 from astropy.coordinates import SkyCoord
 
+from solar_tracking.profiling import profiled
+
+@profiled()
 def cal_lon_and_lat(x_pix, y_pix, hmi_map):
     """
     Konvertiert Pixelkoordinaten in heliographische Koordinaten.
@@ -20,6 +23,154 @@ def cal_lon_and_lat(x_pix, y_pix, hmi_map):
                  observer=hmi_map.observer_coordinate, frame='heliographic_carrington')
     )
 
+@profiled()
+def cal_lon_and_lat_batch(x_pix, y_pix, maps, frame_indices=None):
+    """
+    Konvertiert viele Pixelkoordinaten auf einmal in heliographische
+    Carrington-Koordinaten.
+
+    Pro Karte werden genau ein pixel_to_world und ein transform_to auf allen
+    Punkten dieser Karte ausgeführt, der Carrington-Frame wird einmal pro Karte
+    erzeugt. Punkte außerhalb der Sonnenscheibe ergeben NaN.
+
+    Args:
+        x_pix (array): X-Pixelpositionen
+        y_pix (array): Y-Pixelpositionen
+        maps (sunpy.map.Map or list): eine Karte für alle Punkte oder eine Liste von Karten
+        frame_indices (array, optional): Index der Karte in `maps` für jeden Punkt
+            (erforderlich bei mehreren Karten)
+
+    Returns:
+        tuple: (Breitengrade, Längengrade) in Grad als NumPy-Arrays in der Form von x_pix
+    """
+    from sunpy.coordinates import frames
+
+    x_pix = np.asarray(x_pix, dtype=float)
+    y_pix = np.asarray(y_pix, dtype=float)
+    if isinstance(maps, (list, tuple)):
+        if frame_indices is None:
+            if len(maps) != 1:
+                raise ValueError("Bei mehreren Karten muss frame_indices angegeben werden.")
+            frame_indices = np.zeros(x_pix.shape, dtype=int)
+    else:
+        maps = [maps]
+        frame_indices = np.zeros(x_pix.shape, dtype=int)
+    frame_indices = np.broadcast_to(np.asarray(frame_indices), x_pix.shape)
+
+    lat = np.full(x_pix.shape, np.nan)
+    lon = np.full(x_pix.shape, np.nan)
+    for index in np.unique(frame_indices):
+        hmi_map = maps[index]
+        points = frame_indices == index
+        carrington = frames.HeliographicCarrington(obstime=hmi_map.date, observer=hmi_map.observer_coordinate)
+        coords = hmi_map.pixel_to_world(x_pix[points] * u.pix, y_pix[points] * u.pix).transform_to(carrington)
+        lat[points] = coords.lat.deg
+        lon[points] = coords.lon.deg
+    return lat, lon
+
+# Header-Schlüsselwörter, die cal_lon_and_lat_header benötigt (DSUN_OBS optional)
+HEADER_KEYWORDS = ("CRPIX1", "CRPIX2", "CDELT1", "CDELT2", "CRVAL1", "CRVAL2", "CROTA2",
+                   "RSUN_OBS", "DSUN_OBS", "RSUN_REF", "CRLN_OBS", "CRLT_OBS")
+# Sonnenradius in Metern, falls RSUN_REF fehlt (Standardwert von sunpy)
+RSUN_METERS = 695700000.0
+# Siderische Rotationsrate des Carrington-Systems in °/Tag
+CARRINGTON_RATE = 14.1844
+
+
+def _header_values(headers, frame_indices, shape):
+    """
+    Liest die Schlüsselwörter aller Header und verteilt sie auf die Punkte.
+
+    `headers` ist eine Liste von Headern oder ein Header-Index (siehe header_index),
+    dessen Spalten die Schlüsselwörter in Kleinbuchstaben sind.
+    """
+    values = {}
+    for key in HEADER_KEYWORDS:
+        if isinstance(headers, np.ndarray):
+            column = headers[key.lower()].astype(float)
+        else:
+            column = np.array([float(header.get(key, np.nan)) for header in headers])
+        values[key] = column[frame_indices] if frame_indices is not None else np.full(shape, column[0])
+    for key, default in (("CRVAL1", 0.0), ("CRVAL2", 0.0), ("CROTA2", 0.0), ("RSUN_REF", RSUN_METERS)):
+        values[key] = np.where(np.isnan(values[key]), default, values[key])
+    # Ohne DSUN_OBS folgt der Abstand aus dem scheinbaren Sonnenradius
+    dsun_from_rsun = values["RSUN_REF"] / np.sin(np.deg2rad(values["RSUN_OBS"] / 3600))
+    values["DSUN_OBS"] = np.where(np.isnan(values["DSUN_OBS"]), dsun_from_rsun, values["DSUN_OBS"])
+    return values
+
+
+@profiled()
+def cal_lon_and_lat_header(x_pix, y_pix, headers, frame_indices=None):
+    """
+    Konvertiert Pixelkoordinaten analytisch in heliographische Carrington-Koordinaten,
+    nur mit NumPy und den Schlüsselwörtern des FITS-Headers (siehe HEADER_KEYWORDS).
+
+    Die Umrechnung folgt der WCS-Definition (CRPIX, CDELT in arcsec, CROTA2,
+    gnomonische Projektion um CRVAL) und Thompson (2006, A&A 449, 791) von
+    helioprojektiven zu heliozentrischen und heliographischen Koordinaten. Die
+    Carrington-Länge ist die des Beobachters (CRLN_OBS) plus die Länge relativ
+    zum Beobachter, die Breite bezieht sich auf B0 = CRLT_OBS. Es wird keine
+    sunpy.map.Map benötigt; das Ergebnis stimmt mit cal_lon_and_lat auf
+    Bruchteile einer Bogensekunde überein, wenn CRLN_OBS zu sunpys
+    Carrington-Definition passt. Punkte außerhalb der Sonnenscheibe ergeben NaN.
+
+    Args:
+        x_pix (array): X-Pixelpositionen (0-basiert, wie bei pixel_to_world)
+        y_pix (array): Y-Pixelpositionen
+        headers (Header or list): ein FITS-Header (oder dict) für alle Punkte, eine Liste oder
+            ein Header-Index bzw. eine Zeile davon (siehe header_index.build_header_index)
+        frame_indices (array, optional): Index des Headers in `headers` für jeden Punkt
+
+    Returns:
+        tuple: (Breitengrade, Längengrade) in Grad als NumPy-Arrays in der Form von x_pix
+    """
+    x_pix = np.asarray(x_pix, dtype=float)
+    y_pix = np.asarray(y_pix, dtype=float)
+    if isinstance(headers, (np.ndarray, np.void)) and headers.dtype.names:
+        headers = np.atleast_1d(np.asarray(headers))
+    if isinstance(headers, (list, tuple, np.ndarray)):
+        if frame_indices is None and len(headers) != 1:
+            raise ValueError("Bei mehreren Headern muss frame_indices angegeben werden.")
+    else:
+        headers = [headers]
+    if frame_indices is not None:
+        frame_indices = np.broadcast_to(np.asarray(frame_indices), x_pix.shape)
+    h = _header_values(headers, frame_indices, x_pix.shape)
+
+    # Pixel -> Zwischenkoordinaten in Grad (CRPIX ist 1-basiert)
+    dx = x_pix - (h["CRPIX1"] - 1)
+    dy = y_pix - (h["CRPIX2"] - 1)
+    rho = np.deg2rad(h["CROTA2"])
+    cdelt1, cdelt2 = h["CDELT1"], h["CDELT2"]
+    xi = np.deg2rad(cdelt1 * (np.cos(rho) * dx - np.sin(rho) * (cdelt2 / cdelt1) * dy) / 3600)
+    eta = np.deg2rad(cdelt2 * (np.sin(rho) * (cdelt1 / cdelt2) * dx + np.cos(rho) * dy) / 3600)
+
+    # Inverse gnomonische Projektion um (CRVAL1, CRVAL2) -> helioprojektiv (Tx, Ty)
+    lon0 = np.deg2rad(h["CRVAL1"] / 3600)
+    lat0 = np.deg2rad(h["CRVAL2"] / 3600)
+    r = np.hypot(xi, eta)
+    c = np.arctan(r)
+    sin_c_over_r = np.where(r > 0, np.sin(c) / np.where(r > 0, r, 1), 1.0)
+    ty = np.arcsin(np.cos(c) * np.sin(lat0) + eta * sin_c_over_r * np.cos(lat0))
+    tx = lon0 + np.arctan2(xi * np.sin(c), r * np.cos(lat0) * np.cos(c) - eta * np.sin(lat0) * np.sin(c))
+
+    # Helioprojektiv -> heliozentrisch kartesisch (Schnitt der Sichtlinie mit der Sonnenoberfläche)
+    dsun, rsun = h["DSUN_OBS"], h["RSUN_REF"]
+    cos_ty_cos_tx = np.cos(ty) * np.cos(tx)
+    with np.errstate(invalid="ignore"):
+        d = dsun * cos_ty_cos_tx - np.sqrt(dsun**2 * cos_ty_cos_tx**2 - dsun**2 + rsun**2)
+    x = d * np.cos(ty) * np.sin(tx)
+    y = d * np.sin(ty)
+    z = dsun - d * cos_ty_cos_tx
+
+    # Heliozentrisch -> heliographisch (Carrington)
+    b0 = np.deg2rad(h["CRLT_OBS"])
+    lat = np.rad2deg(np.arcsin(np.clip((y * np.cos(b0) + z * np.sin(b0)) / rsun, -1, 1)))
+    lon = np.mod(h["CRLN_OBS"] + np.rad2deg(np.arctan2(x, z * np.cos(b0) - y * np.sin(b0))), 360)
+    off_disk = np.isnan(d)
+    return np.where(off_disk, np.nan, lat), np.where(off_disk, np.nan, lon)
+
+@profiled()
 def cal_omega_p(lon1, lon2, delta_t):
     """
     Berechnet die Rotationsgeschwindigkeit und Periode basierend auf zwei Längengradmessungen.
@@ -38,3 +189,75 @@ def cal_omega_p(lon1, lon2, delta_t):
     period = (360 * u.deg) / omega
 
     return omega, period
+
+@profiled()
+def trajectory_lon_and_lat(positions, headers):
+    """
+    Konvertiert Trajektorien (siehe tracking.Trajectory) in Carrington-Koordinaten.
+
+    Args:
+        positions (np.ndarray): (Bilder, Spots, 2)-Array der Pixelpositionen, NaN wo verloren
+        headers (list): FITS-Header der Bilder in der Reihenfolge der Serie oder der Header-Index
+
+    Returns:
+        tuple: (Breitengrade, Längengrade) in Grad als (Spots, Bilder)-Arrays
+    """
+    positions = np.asarray(positions, dtype=float)
+    frame_indices = np.broadcast_to(np.arange(positions.shape[0])[:, None], positions.shape[:2])
+    if not isinstance(headers, np.ndarray):
+        headers = list(headers)
+    lat, lon = cal_lon_and_lat_header(positions[..., 0], positions[..., 1], headers, frame_indices)
+    return lat.T, lon.T
+
+
+def _unwrap_lon(lon):
+    """Entfernt Sprünge um 360° entlang der Zeitachse, NaN bleiben erhalten."""
+    valid = ~np.isnan(lon)
+    # Lücken mit dem letzten (am Anfang: dem ersten) gültigen Wert füllen
+    index = np.where(valid, np.arange(lon.shape[-1]), 0)
+    np.maximum.accumulate(index, axis=-1, out=index)
+    filled = np.take_along_axis(lon, index, axis=-1)
+    first = np.take_along_axis(lon, np.argmax(valid, axis=-1)[..., None], axis=-1)
+    filled = np.where(np.isnan(filled), first, filled)
+    return np.where(valid, np.unwrap(filled, period=360, axis=-1), np.nan)
+
+
+@profiled()
+def fit_rotation_rates(t, lon):
+    """
+    Passt für alle Spots gleichzeitig eine Gerade lon = a + omega * t an
+    (kleinste Quadrate, NaN-Werte werden ignoriert).
+
+    Statt nur Anfangs- und Endposition (cal_omega_p) gehen alle Bilder einer
+    Trajektorie in die Rotationsgeschwindigkeit ein. Die Unsicherheit folgt aus
+    der Streuung der Residuen. Die Steigung der Carrington-Länge ist die Rate
+    relativ zum Carrington-System; zurückgegeben wird wie bei cal_omega_p die
+    siderische Rotationsgeschwindigkeit (plus CARRINGTON_RATE), die perform_fitting erwartet.
+
+    Args:
+        t (array): Zeitpunkte der Bilder in Stunden, (Bilder,) oder (Spots, Bilder)
+        lon (array): Carrington-Längengrade in Grad, (Spots, Bilder), NaN wo der Spot fehlt
+
+    Returns:
+        tuple: (siderisches omega in °/Tag, Unsicherheit von omega in °/Tag) als Arrays pro Spot;
+        NaN bei weniger als zwei (für die Unsicherheit drei) gültigen Punkten
+    """
+    lon = _unwrap_lon(np.atleast_2d(np.asarray(lon, dtype=float)))
+    t = np.broadcast_to(np.asarray(t, dtype=float), lon.shape)
+    valid = ~np.isnan(lon)
+    w = valid.astype(float)
+    lon = np.where(valid, lon, 0.0)
+
+    n = w.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Zentrierte Summen sind numerisch stabiler als die Normalgleichungen
+        t_mean = (w * t).sum(axis=1) / n
+        lon_mean = (w * lon).sum(axis=1) / n
+        dt = np.where(valid, t - t_mean[:, None], 0.0)
+        s_tt = (dt**2).sum(axis=1)
+        slope = (dt * (lon - lon_mean[:, None])).sum(axis=1) / s_tt
+        residuals = np.where(valid, lon - lon_mean[:, None] - slope[:, None] * dt, 0.0)
+        sigma = np.sqrt((residuals**2).sum(axis=1) / (n - 2) / s_tt)
+    slope = np.where(n >= 2, slope, np.nan)
+    sigma = np.where(n >= 3, sigma, np.nan)
+    return slope * 24.0 + CARRINGTON_RATE, sigma * 24.0
@@ -2,6 +2,9 @@ from astropy.io import fits
 import cv2
 import numpy as np
 
+from solar_tracking.profiling import profiled
+
+@profiled()
 def sun_infos(fits_path:str, data_layer: int = 1):
     """
     Extract all need inforamtion from the header of the fits file. and also 
@@ -36,13 +39,80 @@ def sun_infos(fits_path:str, data_layer: int = 1):
 
 
 
+# Parameter der Vorverarbeitung in find_spots_and_boxes
+BLUR_SIZE = 13
+THRESHOLD_BLOCK_SIZE = 301
+THRESHOLD_C = 30
+
+
+def _adaptive_threshold(image: np.ndarray, block_size: int, c: int, downsample: int = 1) -> np.ndarray:
+    """
+    Adaptive Schwelle wie cv2.adaptiveThreshold (ADAPTIVE_THRESH_GAUSSIAN_C,
+    THRESH_BINARY_INV): Ein Pixel wird 255, wenn es mindestens c unter dem
+    gaußgewichteten lokalen Mittelwert liegt.
+
+    Bei downsample > 1 wird der lokale Mittelwert auf einem um diesen Faktor
+    verkleinerten Bild mit entsprechend kleinerem Kernel berechnet und wieder
+    hochskaliert. Der Mittelwert über 301x301 Pixel ist sehr glatt, daher ändert
+    sich die Schwelle kaum, der Aufwand sinkt aber etwa mit downsample**3.
+    """
+    if downsample <= 1:
+        return cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                     cv2.THRESH_BINARY_INV, block_size, c)
+
+    # Sigma, das OpenCV für einen Kernel der Größe block_size verwendet
+    sigma = 0.3 * ((block_size - 1) * 0.5 - 1) + 0.8
+    small = cv2.resize(image, (max(1, image.shape[1] // downsample), max(1, image.shape[0] // downsample)),
+                       interpolation=cv2.INTER_AREA)
+    small_size = (block_size // downsample) | 1
+    small_mean = cv2.GaussianBlur(small.astype(np.float32), (small_size, small_size), sigma / downsample,
+                                  borderType=cv2.BORDER_REPLICATE)
+    mean = cv2.resize(small_mean, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_LINEAR)
+    # Wie in OpenCV wird der Mittelwert auf ganze Grauwerte gerundet
+    mean = np.rint(mean)
+    return np.where(image.astype(np.float32) - mean <= -c, 255, 0).astype(np.uint8)
+
+
+def _crop_to_disk(image: np.ndarray, sun_radius: int, sun_center: tuple,
+                  max_distance_ratio: float, max_area: int, block_size: int = THRESHOLD_BLOCK_SIZE,
+                  blur_size: int = BLUR_SIZE):
+    """
+    Schneidet das Bild auf das Quadrat zu, das für die Spot-Suche relevant ist.
+
+    Spots werden nur bis max_distance_ratio * sun_radius berücksichtigt, kompakte
+    Spots reichen höchstens sqrt(max_area) Pixel über ihren Zentroiden hinaus.
+    Dazu kommt die Reichweite der Filter (Blur, adaptive Schwelle, Dilation und
+    Erosion), damit jedes relevante Pixel dieselbe Nachbarschaft wie im ganzen
+    Bild sieht.
+
+    Returns:
+        tuple: (Zuschnitt, (x0, y0) Versatz im ganzen Bild, Maske des relevanten Kreises)
+    """
+    reach = max_distance_ratio * sun_radius + np.sqrt(max_area)
+    margin = blur_size // 2 + block_size // 2 + 2
+    half = int(np.ceil(reach + margin))
+    height, width = image.shape[:2]
+    x0, y0 = max(0, int(sun_center[0]) - half), max(0, int(sun_center[1]) - half)
+    x1, y1 = min(width, int(sun_center[0]) + half + 1), min(height, int(sun_center[1]) + half + 1)
+    crop = image[y0:y1, x0:x1]
+
+    # Komponenten außerhalb des relevanten Kreises (Rand und Bereich außerhalb der Scheibe) entfernen
+    disk_mask = np.zeros(crop.shape[:2], dtype=np.uint8)
+    cv2.circle(disk_mask, (int(sun_center[0]) - x0, int(sun_center[1]) - y0), int(np.ceil(reach)), 255, -1)
+    return crop, (x0, y0), disk_mask
+
+
+@profiled()
 def find_spots_and_boxes(image: np.ndarray,
                          sun_radius: int,
                          sun_center: tuple,
                          max_area: int = 5000,
                          min_area: int = 1000,
                          max_distance_ratio: float = 0.9,
-                         min_distance_between_clusters: int = 20):
+                         min_distance_between_clusters: int = 20,
+                         crop_to_disk: bool = False,
+                         threshold_downsample: int = 1,
+                         pyramid_levels: int = 0):
     """
     Findet die Position von Sonnenflecken im vorverarbeiteten Bild und gruppiert benachbarte Spots.
     
@@ -68,6 +138,21 @@ def find_spots_and_boxes(image: np.ndarray,
         Maximaler Abstand (als Anteil des Sonnenradius) vom Sonnenmittelpunkt, bis zu dem Spots berücksichtigt werden (Standard: 0.9).
     min_distance_between_clusters : int, optional
         Minimaler Abstand in Pixeln zwischen Spots, damit diese nicht in verschiedene Cluster eingeordnet werden (Standard: 100).
+    crop_to_disk : bool, optional
+        Wenn True, laufen die Filter nur auf dem Quadrat um den Bereich, in dem Spots
+        berücksichtigt werden (plus Filterreichweite), und Komponenten außerhalb dieses
+        Bereichs werden vor dem Labeling maskiert (siehe _crop_to_disk). Für kompakte
+        Spots (Ausdehnung unter sqrt(max_area)) ist das Ergebnis identisch.
+    threshold_downsample : int, optional
+        Faktor, um den das Bild für den lokalen Mittelwert der adaptiven Schwelle
+        verkleinert wird (siehe _adaptive_threshold). 1 entspricht exakt
+        cv2.adaptiveThreshold; 4 ist auf 4k-Bildern um ein Vielfaches schneller und
+        verschiebt Boxen höchstens um wenige Pixel (Standard: 1).
+    pyramid_levels : int, optional
+        Anzahl der Pyramidenstufen (Halbierungen der Auflösung), auf denen die Spots
+        zunächst gesucht werden; Boxen und Zentroiden werden anschließend in kleinen
+        Fenstern in voller Auflösung bestimmt (siehe solar_tracking.pyramid). 0 sucht
+        direkt in voller Auflösung (Standard: 0).
     
     Returns
     -------
@@ -77,75 +162,254 @@ def find_spots_and_boxes(image: np.ndarray,
         Liste der Zentroiden der gruppierten Spots als (x, y)-Werte.
     """
     
-    # Vorverarbeitung des Bildes
-    image_blur = cv2.GaussianBlur(image, (13, 13), 0)
-    binary_img = cv2.adaptiveThreshold(image_blur, 255,
-                                       cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                       cv2.THRESH_BINARY_INV,
-                                       301, 30)
+    grouped_boxes, grouped_centroids, _ = _detect_spots(
+        image, sun_radius, sun_center, max_area, min_area, max_distance_ratio,
+        min_distance_between_clusters, crop_to_disk, threshold_downsample, pyramid_levels)
+    return [tuple(box) for box in grouped_boxes], list(grouped_centroids)
+
+
+def _segment(image: np.ndarray, threshold_downsample: int = 1, block_size: int = THRESHOLD_BLOCK_SIZE,
+             blur_size: int = BLUR_SIZE) -> np.ndarray:
+    """Vorverarbeitung der Spot-Detektion: Blur, adaptive Schwelle, Dilation und Erosion (Binärbild)."""
+    image_blur = cv2.GaussianBlur(image, (blur_size, blur_size), 0)
+    binary_img = _adaptive_threshold(image_blur, block_size, THRESHOLD_C, threshold_downsample)
     binary_img = cv2.dilate(binary_img, None, iterations=1)
-    binary_img = cv2.erode(binary_img, None, iterations=1)
+    return cv2.erode(binary_img, None, iterations=1)
+
+
+def _detect_spots(image, sun_radius, sun_center, max_area=5000, min_area=1000, max_distance_ratio=0.9,
+                  min_distance_between_clusters=20, crop_to_disk=False, threshold_downsample=1,
+                  pyramid_levels=0, block_size=THRESHOLD_BLOCK_SIZE, blur_size=BLUR_SIZE):
+    """
+    Kern von find_spots_and_boxes; gibt die gruppierten Spots als Arrays zurück.
+
+    Returns:
+        tuple: (Boxen (k, 4), Zentroiden (k, 2), Gesamtfläche der Komponenten pro Gruppe (k,))
+    """
+    if pyramid_levels > 0:
+        from solar_tracking.pyramid import detect_spots_pyramid
+        return detect_spots_pyramid(image, sun_radius, sun_center, pyramid_levels, max_area, min_area,
+                                    max_distance_ratio, min_distance_between_clusters, crop_to_disk,
+                                    threshold_downsample)
+
+    # Optional: Zuschnitt auf die Sonnenscheibe
+    x0, y0, disk_mask = 0, 0, None
+    if crop_to_disk:
+        image, (x0, y0), disk_mask = _crop_to_disk(image, sun_radius, sun_center,
+                                                   max_distance_ratio, max_area, block_size, blur_size)
+
+    # Vorverarbeitung des Bildes
+    binary_img = _segment(image, threshold_downsample, block_size, blur_size)
+    if disk_mask is not None:
+        binary_img = cv2.bitwise_and(binary_img, disk_mask)
     
     # Verbundene Komponenten (Connected Components) ermitteln
     num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary_img)
+    # Koordinaten des Zuschnitts auf das ganze Bild zurückrechnen
+    stats[:, cv2.CC_STAT_LEFT] += x0
+    stats[:, cv2.CC_STAT_TOP] += y0
+    centroids += (x0, y0)
     
     # Spots nach Fläche und Entfernung filtern
-    filtered_boxes = []
-    filtered_centroids = []
-    
-    for label in range(1, num_labels):  # Hintergrund (Label 0) überspringen
-        area = stats[label, cv2.CC_STAT_AREA]
-        if not (min_area < area < max_area):
-            continue
-        
-        centroid = centroids[label]
-        # Abstand vom Spot-Zentroid zum Sonnenmittelpunkt
-        distance = np.linalg.norm(np.array(centroid) - np.array(sun_center))
-        if distance > max_distance_ratio * sun_radius:
-            continue
-        
-        x = stats[label, cv2.CC_STAT_LEFT]
-        y = stats[label, cv2.CC_STAT_TOP]
-        w = stats[label, cv2.CC_STAT_WIDTH]
-        h = stats[label, cv2.CC_STAT_HEIGHT]
-        filtered_boxes.append((x, y, w, h))
-        filtered_centroids.append(centroid)
+    filtered_boxes, filtered_centroids, filtered_areas = _filter_components(
+        stats, centroids, sun_radius, sun_center, min_area, max_area, max_distance_ratio)
     
-    # Falls keine Spots gefunden wurden, leere Listen zurückgeben
-    if not filtered_boxes:
-        return [], []
+    # Falls keine Spots gefunden wurden, leere Arrays zurückgeben
+    if len(filtered_boxes) == 0:
+        return filtered_boxes, filtered_centroids, filtered_areas
     
     # Gruppierung der Spots mittels Clustering (DBSCAN)
     try:
         from sklearn.cluster import DBSCAN
-        filtered_centroids_array = np.array(filtered_centroids)
-        clustering = DBSCAN(eps=min_distance_between_clusters, min_samples=1).fit(filtered_centroids_array)
+        clustering = DBSCAN(eps=min_distance_between_clusters, min_samples=1).fit(filtered_centroids)
         cluster_labels = clustering.labels_
     except ImportError:
         # Fallback: Jeder Spot ist ein eigener Cluster
         cluster_labels = np.arange(len(filtered_centroids))
     
-    unique_labels = np.unique(cluster_labels)
-    grouped_boxes = []
-    grouped_centroids = []
-    
-    # Für jeden Cluster: Bestimme die umschließende Bounding-Box und den Mittelwert der Zentroiden
-    for cluster in unique_labels:
-        indices = np.where(cluster_labels == cluster)[0]
-        
-        # Sammle alle Bounding-Boxen und Zentroiden des Clusters
-        cluster_boxes = [filtered_boxes[i] for i in indices]
-        cluster_centroids = [filtered_centroids[i] for i in indices]
-        
-        # Berechne die minimale und maximale Koordinate für die Bounding-Box
-        x_min = min(box[0] for box in cluster_boxes)
-        y_min = min(box[1] for box in cluster_boxes)
-        x_max = max(box[0] + box[2] for box in cluster_boxes)
-        y_max = max(box[1] + box[3] for box in cluster_boxes)
-        grouped_boxes.append((x_min, y_min, x_max - x_min, y_max - y_min))
-        
-        # Berechne den Mittelwert der Zentroiden
-        avg_centroid = np.mean(cluster_centroids, axis=0)
-        grouped_centroids.append(avg_centroid)
-    
-    return grouped_boxes, grouped_centroids
+    return _group_clusters(filtered_boxes, filtered_centroids, cluster_labels, filtered_areas)
+
+
+def _filter_components(stats: np.ndarray, centroids: np.ndarray, sun_radius: int, sun_center: tuple,
+                       min_area: int, max_area: int, max_distance_ratio: float):
+    """
+    Filtert die Komponenten von cv2.connectedComponentsWithStats nach Fläche und
+    Entfernung vom Sonnenmittelpunkt, vektorisiert über alle Labels.
+
+    Returns:
+        tuple: (Boxen als (n, 4)-Array (x, y, w, h), Zentroiden als (n, 2)-Array, Flächen (n,))
+    """
+    # Hintergrund (Label 0) überspringen
+    stats = stats[1:]
+    centroids = centroids[1:]
+    area = stats[:, cv2.CC_STAT_AREA]
+    # Abstand vom Spot-Zentroid zum Sonnenmittelpunkt
+    offset = centroids - np.asarray(sun_center, dtype=float)
+    distance = np.sqrt(np.einsum("ij,ij->i", offset, offset))
+    keep = (min_area < area) & (area < max_area) & (distance <= max_distance_ratio * sun_radius)
+    boxes = stats[keep][:, [cv2.CC_STAT_LEFT, cv2.CC_STAT_TOP, cv2.CC_STAT_WIDTH, cv2.CC_STAT_HEIGHT]]
+    return boxes, centroids[keep], area[keep]
+
+
+def _group_clusters(boxes: np.ndarray, centroids: np.ndarray, cluster_labels: np.ndarray,
+                    areas: np.ndarray):
+    """
+    Fasst die Spots eines Clusters zusammen: umschließende Bounding-Box,
+    Mittelwert der Zentroiden und Summe der Flächen. Die Reduktionen laufen gruppiert über die nach
+    Cluster sortierten Spots (np.minimum/np.maximum/np.add.reduceat), die
+    Cluster sind wie bei np.unique aufsteigend sortiert.
+
+    Returns:
+        tuple: (Boxen als (k, 4)-Array (x, y, w, h), Zentroiden als (k, 2)-Array, Flächen (k,))
+    """
+    order = np.argsort(cluster_labels, kind="stable")
+    sorted_labels = cluster_labels[order]
+    starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+    boxes = boxes[order]
+
+    # Berechne die minimale und maximale Koordinate für die Bounding-Box
+    x_min = np.minimum.reduceat(boxes[:, 0], starts)
+    y_min = np.minimum.reduceat(boxes[:, 1], starts)
+    x_max = np.maximum.reduceat(boxes[:, 0] + boxes[:, 2], starts)
+    y_max = np.maximum.reduceat(boxes[:, 1] + boxes[:, 3], starts)
+    grouped_boxes = np.stack([x_min, y_min, x_max - x_min, y_max - y_min], axis=1)
+
+    # Berechne den Mittelwert der Zentroiden
+    counts = np.diff(np.r_[starts, len(order)])
+    grouped_centroids = np.add.reduceat(centroids[order], starts, axis=0) / counts[:, None]
+    grouped_areas = np.add.reduceat(areas[order], starts)
+    return grouped_boxes, grouped_centroids, grouped_areas
+
+
+# Spalten des Spot-Katalogs von detect_spots_batch: Bildindex, Box (x, y, w, h),
+# Zentroid (cx, cy) und Gesamtfläche der Komponenten des Spots in Pixeln
+SPOT_CATALOG_DTYPE = np.dtype([("frame", np.int32),
+                               ("x", np.int32), ("y", np.int32),
+                               ("w", np.int32), ("h", np.int32),
+                               ("cx", np.float32), ("cy", np.float32),
+                               ("area", np.int32)])
+
+
+def _spot_catalog(frame_index: int, boxes: np.ndarray, centroids: np.ndarray, areas: np.ndarray) -> np.ndarray:
+    """Packt die Spots eines Bildes in ein strukturiertes Array mit SPOT_CATALOG_DTYPE."""
+    catalog = np.empty(len(boxes), dtype=SPOT_CATALOG_DTYPE)
+    catalog["frame"] = frame_index
+    if len(boxes):
+        catalog["x"], catalog["y"], catalog["w"], catalog["h"] = np.asarray(boxes).T
+        catalog["cx"], catalog["cy"] = np.asarray(centroids).T
+        catalog["area"] = areas
+    return catalog
+
+
+@profiled()
+def detect_spots_batch(frames, sun_radius: int, sun_center: tuple, every: int = 1,
+                       workers: int = 1, frame_indices=None, **detection_kwargs) -> np.ndarray:
+    """
+    Führt die Spot-Erkennung über eine Bildserie aus und liefert einen Spot-Katalog.
+
+    Die Erkennung läuft auf `workers` Threads (OpenCV gibt während der Filter den
+    GIL frei), es werden höchstens 2 * workers Bilder gleichzeitig gehalten. Das
+    Ergebnis ist ein einziges strukturiertes Array (SPOT_CATALOG_DTYPE), nach
+    Bildindex sortiert, so dass spätere Schritte die Spots eines Bildes mit
+    catalog_frame nachschlagen können, ohne die Erkennung erneut auszuführen.
+
+    Args:
+        frames (iterable): normalisierte Bilder der Serie
+        sun_radius (int): Sonnenradius in Pixeln
+        sun_center (tuple): (x, y)-Koordinate des Sonnenmittelpunkts
+        every (int): nur jedes every-te Bild auswerten
+        workers (int): Anzahl der Threads
+        frame_indices (iterable, optional): Bildindizes der Bilder in `frames`, z. B.
+            wenn nur jedes n-te Bild geladen wurde (Standard: 0, 1, 2, ...)
+        **detection_kwargs: weitere Parameter von find_spots_and_boxes
+
+    Returns:
+        np.ndarray: Spot-Katalog mit SPOT_CATALOG_DTYPE
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import collections
+    import itertools
+
+    if every < 1:
+        raise ValueError(f"every muss mindestens 1 sein, nicht {every}.")
+
+    def detect(frame_index, image):
+        return _spot_catalog(frame_index, *_detect_spots(image, sun_radius, sun_center, **detection_kwargs))
+
+    if frame_indices is None:
+        frame_indices = itertools.count()
+    selected = itertools.islice(zip(frame_indices, frames), 0, None, every)
+
+    catalogs = []
+    if workers <= 1:
+        catalogs = [detect(frame_index, image) for frame_index, image in selected]
+    else:
+        in_flight = collections.deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for frame_index, image in selected:
+                in_flight.append(pool.submit(detect, frame_index, image))
+                if len(in_flight) >= 2 * workers:
+                    catalogs.append(in_flight.popleft().result())
+            while in_flight:
+                catalogs.append(in_flight.popleft().result())
+
+    if not catalogs:
+        return np.empty(0, dtype=SPOT_CATALOG_DTYPE)
+    return np.concatenate(catalogs)
+
+
+def catalog_frame(catalog: np.ndarray, frame_index: int) -> np.ndarray:
+    """Gibt die Spots eines Bildes aus einem (nach Bildindex sortierten) Spot-Katalog zurück."""
+    start, stop = np.searchsorted(catalog["frame"], [frame_index, frame_index + 1])
+    return catalog[start:stop]
+
+
+def detect_trace_spots(trace: int, every: int = 1, workers: int = 1, decode_workers: int = 1,
+                       save: bool = True, memmap: bool = False, cache=None, **detection_kwargs) -> np.ndarray:
+    """
+    Erstellt den Spot-Katalog einer Trace-Serie ('data/TR_XX').
+
+    Bei every > 1 werden nur die ausgewerteten Bilder geladen; die Bildindizes im
+    Katalog beziehen sich trotzdem auf die ganze Serie. Die Geometrie der Sonne
+    wird wie in run_tracking aus dem Header-Index gelesen (erstes Bild). Mit save=True wird der
+    Katalog als 'spot_catalog.npy' im Ordner der Serie gespeichert (siehe
+    load_spot_catalog).
+
+    Args:
+        trace (int): Nummer der Trace-Serie
+        every (int): nur jedes every-te Bild auswerten
+        workers (int): Threads für die Erkennung
+        decode_workers (int): Prozesse zum Dekodieren der FITS-Dateien
+        save (bool): Katalog im Ordner der Serie speichern
+        memmap (bool): speichersparender Loader, siehe image_processing_fits
+        cache (FrameCache): optionaler Cache normalisierter Bilder
+        **detection_kwargs: weitere Parameter von find_spots_and_boxes
+
+    Returns:
+        np.ndarray: Spot-Katalog mit SPOT_CATALOG_DTYPE
+    """
+    from solar_tracking.image_processing import iter_frames
+    from solar_tracking.header_index import index_sun_infos, trace_header_index
+    from solar_tracking.traces import trace_dir, trace_files
+
+    if every < 1:
+        raise ValueError(f"every muss mindestens 1 sein, nicht {every}.")
+    fit_paths = trace_files(trace)
+    sun_radius, sun_center, _ = index_sun_infos(trace_header_index(trace))
+    frames = iter_frames(fit_paths[::every], prefetch=max(2, 2 * decode_workers), memmap=memmap,
+                         cache=cache, workers=decode_workers)
+    catalog = detect_spots_batch(frames, sun_radius, sun_center, workers=workers,
+                                 frame_indices=range(0, len(fit_paths), every), **detection_kwargs)
+    if save:
+        np.save(trace_dir(trace) / "spot_catalog.npy", catalog)
+    return catalog
+
+
+def load_spot_catalog(trace: int) -> np.ndarray:
+    """Lädt den mit detect_trace_spots gespeicherten Spot-Katalog einer Trace-Serie."""
+    from solar_tracking.traces import trace_dir
+
+    catalog_file = trace_dir(trace) / "spot_catalog.npy"
+    if not catalog_file.exists():
+        raise FileNotFoundError(f"Die Datei {catalog_file} wurde nicht gefunden.")
+    return np.load(catalog_file)
@@ -0,0 +1,296 @@
+"""
+Synthetic HMI-like FITS frames with spots that rotate at a known differential rate.
+
+The frames mimic SDO/HMI continuum intensity (hmi.Ic_45s): a limb-darkened
+disk with NaN outside, the image rotated by CROTA2 = 180 degrees, the data in
+the second HDU (Rice-compressed by default) and a header with the keywords
+used by sun_infos, cal_lon_and_lat and cal_lon_and_lat_header. The observer
+is the Earth at DATE-OBS, so the headers agree with sunpy.
+
+Spots are given in Carrington coordinates at the start of a series (see
+SPOT_DTYPE). Their Carrington longitude drifts with the sidereal rate
+fit_func(lat, *rotation) minus CARRINGTON_RATE, so the rotation fitted from
+the tracked positions can be compared with the parameters the frames were
+rendered with.
+
+Used by the benchmarks and the tests; sunpy is only imported for the headers.
+"""
+from pathlib import Path
+
+import numpy as np
+from astropy.io import fits
+
+from solar_tracking.fitting import fit_func
+from solar_tracking.rotation_analysis import CARRINGTON_RATE, RSUN_METERS
+
+# Sidereal rotation rate a + b * sin^2(lat) in degrees per day used for the spots
+DIFFERENTIAL_ROTATION = (14.713, -2.396)
+# Plate scale of a full 4096 x 4096 HMI image in arcsec per pixel
+HMI_CDELT = 0.504
+
+# One row per spot: Carrington position at t = 0 and radius (all in degrees)
+SPOT_DTYPE = np.dtype([("lon", np.float64), ("lat", np.float64), ("radius", np.float64)])
+
+
+def random_spots(n: int = 5, crln_obs: float = 0.0, seed: int = 0, max_lat: float = 35.0,
+                 max_lon_offset: float = 40.0, radius: float = 3.0) -> np.ndarray:
+    """
+    Random spots near the disk center, so they stay visible for several days.
+
+    Args:
+        n (int): number of spots
+        crln_obs (float): Carrington longitude of the disk center in degrees
+        seed (int): seed of the random generator
+        max_lat (float): maximum absolute latitude in degrees
+        max_lon_offset (float): maximum longitude offset from the disk center in degrees
+        radius (float): penumbra radius in degrees (3 degrees are about 25 px at 1024 px)
+
+    Returns:
+        np.ndarray: spots with SPOT_DTYPE
+    """
+    rng = np.random.default_rng(seed)
+    spots = np.empty(n, dtype=SPOT_DTYPE)
+    spots["lon"] = np.mod(crln_obs + rng.uniform(-max_lon_offset, max_lon_offset, n), 360)
+    spots["lat"] = rng.uniform(-max_lat, max_lat, n)
+    spots["radius"] = radius
+    return spots
+
+
+def spot_longitudes(spots: np.ndarray, hours, rotation=DIFFERENTIAL_ROTATION) -> np.ndarray:
+    """Carrington longitudes of the spots after `hours`, shape (frames, spots)."""
+    days = np.asarray(hours, dtype=float)[..., None] / 24
+    drift = fit_func(spots["lat"], *rotation) - CARRINGTON_RATE
+    return np.mod(spots["lon"] + drift * days, 360)
+
+
+def synthetic_header(size: int = 1024, date="2023-11-23T00:00:00", crota2: float = 180.0,
+                     center_offset=(0.0, 0.0)) -> fits.Header:
+    """
+    HMI-like header of a frame observed from the Earth at `date`.
+
+    CDELT scales with the image size like a rebinned 4096 px HMI frame. The
+    observer keywords (DSUN_OBS, HGLT_OBS, CRLN_OBS, CRLT_OBS) follow from the
+    Earth's position in sunpy, so the header converts pixels the same way in
+    cal_lon_and_lat (sunpy) and cal_lon_and_lat_header.
+
+    Args:
+        size (int): edge length of the square image in pixels
+        date (str or Time): observation time
+        crota2 (float): rotation of the image in degrees (180 like HMI)
+        center_offset (tuple): offset of the disk center from the image center in pixels
+
+    Returns:
+        astropy.io.fits.Header: header of the image HDU
+    """
+    import astropy.units as u
+    from astropy.time import Time
+    from sunpy.coordinates import frames, get_earth
+
+    time = Time(date)
+    observer = get_earth(time)
+    carrington = observer.transform_to(frames.HeliographicCarrington(observer=observer, obstime=time))
+    dsun = observer.radius.to_value(u.m)
+
+    header = fits.Header()
+    header["NAXIS"] = 2
+    header["NAXIS1"] = size
+    header["NAXIS2"] = size
+    header["TELESCOP"] = "SDO/HMI"
+    header["INSTRUME"] = "HMI_SIDE1"
+    header["CONTENT"] = "CONTINUUM INTENSITY"
+    header["BUNIT"] = "DN/s"
+    header["DATE-OBS"] = time.isot
+    header["CTYPE1"] = "HPLN-TAN"
+    header["CTYPE2"] = "HPLT-TAN"
+    header["CUNIT1"] = "arcsec"
+    header["CUNIT2"] = "arcsec"
+    header["CDELT1"] = HMI_CDELT * 4096 / size
+    header["CDELT2"] = HMI_CDELT * 4096 / size
+    # CRPIX is 1-based, the reference pixel is the disk center
+    header["CRPIX1"] = (size + 1) / 2 + center_offset[0]
+    header["CRPIX2"] = (size + 1) / 2 + center_offset[1]
+    header["CRVAL1"] = 0.0
+    header["CRVAL2"] = 0.0
+    header["CROTA2"] = crota2
+    header["DSUN_OBS"] = dsun
+    header["RSUN_REF"] = RSUN_METERS
+    header["RSUN_OBS"] = np.rad2deg(np.arcsin(RSUN_METERS / dsun)) * 3600
+    header["HGLN_OBS"] = 0.0
+    header["HGLT_OBS"] = observer.lat.deg
+    header["CRLN_OBS"] = carrington.lon.deg
+    header["CRLT_OBS"] = carrington.lat.deg
+    return header
+
+
+def carrington_to_pixel(lon, lat, header):
+    """
+    Projects Carrington coordinates to pixel positions, the inverse of cal_lon_and_lat_header.
+
+    Args:
+        lon (array): Carrington longitudes in degrees
+        lat (array): latitudes in degrees
+        header (Header or dict): image header (see synthetic_header)
+
+    Returns:
+        tuple: (x, y, visible) with 0-based pixel positions and a mask of the
+        points on the visible hemisphere
+    """
+    lon = np.deg2rad(np.asarray(lon, dtype=float) - header["CRLN_OBS"])
+    lat = np.deg2rad(np.asarray(lat, dtype=float))
+    b0 = np.deg2rad(header["CRLT_OBS"])
+    rsun = header.get("RSUN_REF", RSUN_METERS)
+    dsun = header["DSUN_OBS"]
+
+    # Heliographic -> heliocentric cartesian (z towards the observer)
+    x = rsun * np.cos(lat) * np.sin(lon)
+    y = rsun * (np.sin(lat) * np.cos(b0) - np.cos(lat) * np.cos(lon) * np.sin(b0))
+    z = rsun * (np.sin(lat) * np.sin(b0) + np.cos(lat) * np.cos(lon) * np.cos(b0))
+
+    # Heliocentric -> helioprojective
+    tx = np.arctan2(x, dsun - z)
+    ty = np.arcsin(y / np.sqrt(x**2 + y**2 + (dsun - z)**2))
+
+    # Gnomonic projection around (CRVAL1, CRVAL2)
+    lon0 = np.deg2rad(header.get("CRVAL1", 0.0) / 3600)
+    lat0 = np.deg2rad(header.get("CRVAL2", 0.0) / 3600)
+    cos_c = np.sin(lat0) * np.sin(ty) + np.cos(lat0) * np.cos(ty) * np.cos(tx - lon0)
+    xi = np.rad2deg(np.cos(ty) * np.sin(tx - lon0) / cos_c) * 3600
+    eta = np.rad2deg((np.cos(lat0) * np.sin(ty) - np.sin(lat0) * np.cos(ty) * np.cos(tx - lon0)) / cos_c) * 3600
+
+    # Undo CROTA2 and CDELT (the rotation matrix has determinant 1)
+    rho = np.deg2rad(header.get("CROTA2", 0.0))
+    cdelt1, cdelt2 = header["CDELT1"], header["CDELT2"]
+    u, v = xi / cdelt1, eta / cdelt2
+    dx = np.cos(rho) * u + np.sin(rho) * (cdelt2 / cdelt1) * v
+    dy = -np.sin(rho) * (cdelt1 / cdelt2) * u + np.cos(rho) * v
+    return dx + header["CRPIX1"] - 1, dy + header["CRPIX2"] - 1, z > 0
+
+
+def render_disk(header, spots=None, lon=None, limb_darkening: float = 0.6, intensity: float = 5e4,
+                noise: float = 0.005, rng=None) -> np.ndarray:
+    """
+    Renders a limb-darkened disk with spots (umbra and penumbra) as float32.
+
+    Spots are drawn with soft edges at sub-pixel positions and foreshortened
+    towards the limb. Pixels outside the disk are NaN like in HMI Ic.
+
+    Args:
+        header (Header): image header (see synthetic_header)
+        spots (np.ndarray, optional): spots with SPOT_DTYPE
+        lon (array, optional): current Carrington longitudes of the spots (default: spots["lon"])
+        limb_darkening (float): linear limb-darkening coefficient
+        intensity (float): intensity at the disk center
+        noise (float): relative standard deviation of the Gaussian noise
+        rng (np.random.Generator, optional): random generator for the noise
+
+    Returns:
+        np.ndarray: image of shape (NAXIS2, NAXIS1)
+    """
+    height, width = header["NAXIS2"], header["NAXIS1"]
+    cx, cy = header["CRPIX1"] - 1, header["CRPIX2"] - 1
+    radius = header["RSUN_OBS"] / header["CDELT1"]
+    yy, xx = np.ogrid[:height, :width]
+    rho2 = (((xx - cx) / radius)**2 + ((yy - cy) / radius)**2).astype(np.float32)
+    mu = np.sqrt(np.clip(1 - rho2, 0, 1))
+    image = intensity * (1 - limb_darkening * (1 - mu))
+    if noise:
+        rng = np.random.default_rng() if rng is None else rng
+        image *= 1 + noise * rng.standard_normal(image.shape, dtype=np.float32)
+
+    if spots is not None and len(spots):
+        lon = spots["lon"] if lon is None else lon
+        xs, ys, visible = carrington_to_pixel(lon, spots["lat"], header)
+        for x, y, r_deg, on_disk in zip(xs, ys, spots["radius"], visible):
+            if on_disk:
+                _draw_spot(image, x - cx, y - cy, x, y, np.deg2rad(r_deg) * radius, radius)
+    image[rho2 >= 1] = np.nan
+    return image.astype(np.float32)
+
+
+def _draw_spot(image, dx, dy, x, y, penumbra, sun_radius, umbra_fraction=0.45, edge=0.5):
+    """Darkens a foreshortened spot in place (umbra 0.3, penumbra 0.65 of the local intensity)."""
+    distance = np.hypot(dx, dy)
+    spot_mu = np.sqrt(max(1 - (distance / sun_radius)**2, 0.0))
+    if spot_mu < 0.05:
+        return
+    radial = np.array([dx, dy]) / distance if distance > 0 else np.array([1.0, 0.0])
+    half = int(np.ceil(penumbra + 4 * edge)) + 1
+    x0, x1 = max(int(x) - half, 0), min(int(x) + half + 1, image.shape[1])
+    y0, y1 = max(int(y) - half, 0), min(int(y) + half + 1, image.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+    py, px = np.mgrid[y0:y1, x0:x1]
+    ox, oy = px - x, py - y
+    along = (ox * radial[0] + oy * radial[1]) / spot_mu
+    across = -ox * radial[1] + oy * radial[0]
+    r = np.hypot(along, across)
+    penumbra_mask = 1 / (1 + np.exp((r - penumbra) / edge))
+    umbra_mask = 1 / (1 + np.exp((r - umbra_fraction * penumbra) / edge))
+    image[y0:y1, x0:x1] *= (1 - 0.35 * penumbra_mask - 0.35 * umbra_mask).astype(np.float32)
+
+
+def write_synthetic_fits(path, header, image, compress: bool = True) -> Path:
+    """
+    Writes an image like the HMI files: empty primary HDU, data in the second HDU.
+
+    Args:
+        path (str or Path): output file
+        header (Header): image header
+        image (np.ndarray): image data
+        compress (bool): Rice-compress the image (RICE_1), like the JSOC files
+
+    Returns:
+        Path: the written file
+    """
+    if compress:
+        hdu = fits.CompImageHDU(image, header=header, compression_type="RICE_1")
+    else:
+        hdu = fits.ImageHDU(image, header=header)
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(path, overwrite=True)
+    return Path(path)
+
+
+def write_synthetic_trace(directory, n_frames: int = 10, size: int = 1024, cadence: float = 1.0,
+                          start="2023-11-23T00:00:00", spots=None, rotation=DIFFERENTIAL_ROTATION,
+                          compress: bool = True, seed: int = 0):
+    """
+    Writes a trace series like download_fits (FITS files plus names.txt).
+
+    Args:
+        directory (str or Path): trace folder, e.g. 'data/TR_01' (created if missing)
+        n_frames (int): number of frames
+        size (int): edge length of the frames in pixels
+        cadence (float): hours between two frames
+        start (str or Time): time of the first frame
+        spots (np.ndarray, optional): spots with SPOT_DTYPE (default: random_spots near the disk center)
+        rotation (tuple): sidereal rotation parameters (a, b) of fit_func in degrees per day
+        compress (bool): Rice-compress the frames
+        seed (int): seed for the spots and the noise
+
+    Returns:
+        tuple: (paths, headers, spots, positions) with the true pixel positions
+        of the spots as (frames, spots, 2) array (NaN behind the limb)
+    """
+    from astropy.time import Time, TimeDelta
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    start = Time(start)
+    hours = np.arange(n_frames) * cadence
+    headers = [synthetic_header(size, start + TimeDelta(h * 3600, format="sec")) for h in hours]
+    if spots is None:
+        spots = random_spots(crln_obs=headers[0]["CRLN_OBS"], seed=seed)
+    longitudes = spot_longitudes(spots, hours, rotation)
+
+    paths = []
+    positions = np.full((n_frames, len(spots), 2), np.nan)
+    for k, header in enumerate(headers):
+        x, y, visible = carrington_to_pixel(longitudes[k], spots["lat"], header)
+        positions[k, visible] = np.column_stack([x, y])[visible]
+        image = render_disk(header, spots, longitudes[k], rng=rng)
+        stamp = header["DATE-OBS"][:19].replace("-", "_").replace("T", "_").replace(":", "_")
+        paths.append(write_synthetic_fits(directory / f"hmi_ic_45s_{stamp}_tai_continuum.fits",
+                                          header, image, compress))
+    (directory / "names.txt").write_text("\n".join(path.name for path in paths) + "\n")
+    return paths, headers, spots, positions
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import numpy as np
+
+
+def trace_dir(trace: int) -> Path:
+    """
+    Gibt den Ordner einer Trace-Serie zurück ('data/TR_XX' relativ zum Arbeitsverzeichnis).
+
+    Das Format entspricht den Ordnern, die download_fits anlegt (TR_01, TR_02, ...).
+    """
+    return Path("data") / f"TR_{trace:02d}"
+
+
+def trace_files(trace: int) -> list:
+    """
+    Liest die Dateinamen einer Trace-Serie aus 'data/TR_XX/names.txt'.
+
+    Args:
+        trace (int): Nummer der Trace-Serie
+
+    Returns:
+        list of Path: Pfade der FITS-Dateien in der Reihenfolge der Serie
+    """
+    names_file = trace_dir(trace) / "names.txt"
+    if not names_file.exists():
+        raise FileNotFoundError(f"Die Datei {names_file} wurde nicht gefunden.")
+    file_names = np.atleast_1d(np.genfromtxt(str(names_file), dtype=str))
+    if file_names.size == 0:
+        raise ValueError("Keine Bilder konnten geladen werden.")
+    return [trace_dir(trace) / name for name in file_names]
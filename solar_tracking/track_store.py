@@ -0,0 +1,252 @@
+"""
+Spaltenbasierter, nur anhängender Speicher für die Ergebnisse des Trackings.
+
+Jeder Aufruf von TrackStore.append schreibt einen neuen Block (Chunk) als
+.npz-Datei, bestehende Dateien werden nie verändert. Ein Block enthält die
+Zeilen der übernommenen Spots (ROW_DTYPE) und deren Trajektorien. Der Block
+wird zuerst in eine temporäre Datei geschrieben und dann per os.link unter
+seinem endgültigen Namen veröffentlicht, so dass mehrere Prozesse gleichzeitig
+anhängen können und Leser nie halb geschriebene Blöcke sehen.
+
+Der Name eines Blocks enthält die Nummer seiner Trace-Serie ('-t0001.npz'), so
+dass read(trace) und trajectories(trace) nur die Blöcke dieser Serie öffnen.
+Blöcke ohne Trace im Namen (ältere Versionen) werden immer gelesen und gefiltert.
+"""
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+# Eine Zeile pro übernommenem Spot
+ROW_DTYPE = np.dtype([("trace", np.int32), ("spot", np.int32),
+                      ("x1", np.float64), ("y1", np.float64),
+                      ("x2", np.float64), ("y2", np.float64),
+                      ("delta_time", np.float64)])
+# Kopfzeile und Format von data_points.csv
+CSV_HEADER = "xcoor[pix],ycorr[pix],x2[pix],y2[pix],delta_time [h]"
+CSV_COLUMNS = ("x1", "y1", "x2", "y2", "delta_time")
+# Trace-Serie im Namen eines Blocks
+_CHUNK_TRACE = re.compile(r"-t(\d+)\.npz$")
+
+
+def _chunk_trace(chunk: Path):
+    """Trace-Serie eines Blocks laut Namen, None bei Blöcken ohne Trace im Namen."""
+    match = _CHUNK_TRACE.search(chunk.name)
+    return int(match.group(1)) if match else None
+
+
+class TrackStore:
+    """
+    Nur anhängender Speicher der Tracking-Ergebnisse aller Trace-Serien.
+
+    Args:
+        directory (str): Ordner der Blöcke (Standard: 'data/tracks'), wird bei Bedarf angelegt
+    """
+
+    def __init__(self, directory="data/tracks"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._index = {}  # Blockname -> Zeilen, Blöcke ändern sich nie
+
+    @staticmethod
+    def new_chunk_name(trace: int) -> str:
+        """Name eines neuen Blocks, sortiert nach Zeitpunkt und mit der Trace-Serie im Namen."""
+        return f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}-t{trace:04d}.npz"
+
+    def append(self, trace: int, tracks, delta_time: float, time_hours=None, name: str = None) -> Path:
+        """
+        Hängt die übernommenen Spots eines Laufs als neuen Block an.
+
+        Args:
+            trace (int): Nummer der Trace-Serie
+            tracks (list of dict): übernommene Spots, siehe track_spots
+            delta_time (float or array): Zeitdifferenz zwischen erstem und letztem Bild in
+                Stunden, für alle Spots oder pro Spot
+            time_hours (array, optional): Zeitpunkte der Bilder der Trajektorien in Stunden
+                (Standard: eine Stunde pro Bild)
+            name (str, optional): vorab vergebener Name des Blocks (new_chunk_name); so
+                kann ein Block nach einem Abbruch erneut angehängt werden, ohne doppelt
+                gespeichert zu werden
+
+        Returns:
+            Path: Datei des neuen Blocks, oder None ohne Spots
+
+        Raises:
+            FileExistsError: wenn ein Block mit dem Namen `name` schon existiert
+        """
+        if not tracks:
+            return None
+        rows = np.empty(len(tracks), dtype=ROW_DTYPE)
+        rows["trace"] = trace
+        rows["delta_time"] = delta_time
+        for key in ("spot", "x1", "y1", "x2", "y2"):
+            rows[key] = [track[key] for track in tracks]
+        arrays = {"rows": rows}
+        if all("trajectory" in track for track in tracks):
+            positions = np.stack([track["trajectory"] for track in tracks], axis=1)
+            arrays["positions"] = positions
+            arrays["time"] = (np.arange(len(positions), dtype=float) if time_hours is None
+                              else np.asarray(time_hours, dtype=float))
+        return self._write_chunk(trace, arrays, name)
+
+    def _write_chunk(self, trace: int, arrays, name: str = None) -> Path:
+        name = name or self.new_chunk_name(trace)
+        tmp_path = self.directory / f".{name}.{uuid.uuid4().hex}.tmp"
+        path = self.directory / name
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        try:
+            os.link(tmp_path, path)  # schlägt fehl, statt einen bestehenden Block zu überschreiben
+        finally:
+            os.remove(tmp_path)
+        return path
+
+    def chunks(self, trace=None) -> list:
+        """
+        Alle Blöcke in der Reihenfolge, in der sie angehängt wurden.
+
+        Args:
+            trace (int or list, optional): nur die Blöcke dieser Trace-Serie(n), nach
+                dem Namen ausgewählt (Blöcke ohne Trace im Namen sind immer dabei)
+        """
+        chunks = sorted(self.directory.glob("*.npz"))
+        if trace is None:
+            return chunks
+        traces = set(np.atleast_1d(trace).tolist())
+        return [chunk for chunk in chunks if _chunk_trace(chunk) in traces or _chunk_trace(chunk) is None]
+
+    def _rows(self, chunk: Path) -> np.ndarray:
+        if chunk.name not in self._index:
+            with np.load(chunk) as data:
+                self._index[chunk.name] = data["rows"]
+        return self._index[chunk.name]
+
+    def read(self, trace=None, spots=None) -> np.ndarray:
+        """
+        Liest alle Zeilen auf einmal, optional nur bestimmter Traces und Spot-IDs.
+
+        Args:
+            trace (int or list, optional): Nummer(n) der Trace-Serie(n)
+            spots (list, optional): Spot-IDs
+
+        Returns:
+            np.ndarray: Zeilen mit ROW_DTYPE in der Reihenfolge des Anhängens
+        """
+        chunks = self.chunks(trace)
+        if not chunks:
+            return np.empty(0, dtype=ROW_DTYPE)
+        rows = np.concatenate([self._rows(chunk) for chunk in chunks])
+        if trace is not None:
+            rows = rows[np.isin(rows["trace"], np.atleast_1d(trace))]
+        if spots is not None:
+            rows = rows[np.isin(rows["spot"], spots)]
+        return rows
+
+    def trajectories(self, trace=None):
+        """
+        Liefert die Trajektorien pro Block.
+
+        Yields:
+            tuple: (Zeilen des Blocks, Positionen (Bilder, Spots, 2), Zeitpunkte in Stunden)
+            für Blöcke mit Trajektorien, optional nur einer Trace-Serie
+        """
+        for chunk in self.chunks(trace):
+            rows = self._rows(chunk)
+            if trace is not None and not np.isin(rows["trace"], np.atleast_1d(trace)).any():
+                continue
+            with np.load(chunk) as data:
+                if "positions" in data:
+                    yield rows, data["positions"], data["time"]
+
+    def import_csv(self, trace: int, csv_path, name: str = None):
+        """
+        Übernimmt eine bestehende data_points.csv als Block (ohne Trajektorien).
+
+        Raises:
+            FileExistsError: wenn ein Block mit dem Namen `name` schon existiert
+        """
+        data = np.genfromtxt(str(csv_path), delimiter=',', skip_header=True, dtype=float).reshape(-1, 5)
+        if len(data) == 0:
+            return None
+        rows = np.empty(len(data), dtype=ROW_DTYPE)
+        rows["trace"] = trace
+        rows["spot"] = -1  # unbekannt
+        for column, key in enumerate(CSV_COLUMNS):
+            rows[key] = data[:, column]
+        return self._write_chunk(trace, {"rows": rows}, name)
+
+    def import_legacy_csv(self, trace: int, csv_path):
+        """
+        Übernimmt eine data_points.csv aus der Zeit vor dem TrackStore, einmal pro Trace-Serie.
+
+        Der Block erhält einen festen Namen, der vor allen anderen Blöcken der Serie
+        einsortiert wird; da os.link keinen bestehenden Block überschreibt, übernehmen
+        gleichzeitige Schreiber die Datei nie doppelt. Hat der Speicher schon Zeilen der
+        Serie, wurde die Datei bereits aus ihm exportiert und wird nicht übernommen.
+        Erst danach wird die Markierungsdatei 'trace_XXXX.legacy' angelegt, mit der
+        spätere Aufrufe die Prüfung überspringen; bricht ein Prozess vorher ab, holt
+        der nächste Aufruf die Übernahme nach.
+
+        Returns:
+            Path: Datei des übernommenen Blocks, oder None
+        """
+        marker = self.directory / f"trace_{trace:04d}.legacy"
+        if marker.exists():
+            return None
+        chunk = None
+        if Path(csv_path).exists() and not len(self.read(trace)):
+            try:
+                chunk = self.import_csv(trace, csv_path, name=f"{0:020d}-legacy-t{trace:04d}.npz")
+            except FileExistsError:
+                pass  # von einem gleichzeitigen Schreiber übernommen
+        os.close(os.open(marker, os.O_CREAT | os.O_WRONLY))
+        return chunk
+
+    def export_csv(self, trace: int, csv_path):
+        """
+        Schreibt alle Zeilen einer Trace-Serie in eine neue Datei im Format von data_points.csv.
+
+        Die Datei wird vollständig geschrieben und erst dann per os.link unter ihrem
+        Namen veröffentlicht; eine bestehende Datei wird nie ersetzt, damit keine Zeilen
+        verloren gehen, die andere Prozesse gerade mit append_csv anhängen.
+
+        Raises:
+            FileExistsError: wenn die Datei schon existiert
+        """
+        rows = self.read(trace)
+        csv_path = Path(csv_path)
+        tmp_path = csv_path.with_name(f".{csv_path.name}.{uuid.uuid4().hex}.tmp")
+        table = np.column_stack([rows[key] for key in CSV_COLUMNS])
+        np.savetxt(str(tmp_path), table, delimiter=',', header=CSV_HEADER, comments="", fmt="%.8f")
+        try:
+            os.link(tmp_path, csv_path)
+        finally:
+            os.remove(tmp_path)
+
+    def append_csv(self, trace: int, chunk, csv_path):
+        """
+        Hängt die Zeilen eines Blocks an data_points.csv an, ohne die Datei neu zu schreiben.
+
+        Die Zeilen gehen in einem einzigen write mit O_APPEND in die Datei, gleichzeitige
+        Schreiber vermischen sich also nicht. Fehlt die Datei, wird sie mit allen Zeilen
+        der Trace-Serie exportiert (export_csv); legt ein anderer Prozess sie gleichzeitig
+        an, werden die Zeilen des Blocks stattdessen angehängt.
+        """
+        csv_path = Path(csv_path)
+        if not csv_path.exists():
+            try:
+                self.export_csv(trace, csv_path)
+                return
+            except FileExistsError:
+                pass
+        rows = self._rows(Path(chunk))
+        table = np.column_stack([rows[key] for key in CSV_COLUMNS])
+        text = "".join(",".join(f"{value:.8f}" for value in row) + "\n" for row in table)
+        fd = os.open(csv_path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, text.encode())
+        finally:
+            os.close(fd)
@@ -1,194 +1,572 @@
-from pathlib import Path
-import os
+import functools
 import cv2
 import numpy as np
 
 # Importiere deine bereits existierenden Funktionen aus dem Paket
-from solar_tracking.image_processing import image_processing_fits
-from solar_tracking.sunspot_detection import sun_infos, find_spots_and_boxes
+from solar_tracking import profiling
+from solar_tracking.checkpoint import checkpoint_path, load_checkpoint, save_checkpoint
+from solar_tracking.defaults import FAST_DETECTION, TRACKERS
+from solar_tracking.image_processing import image_processing_fits, iter_frames
+from solar_tracking.header_index import frame_hours, index_sun_infos, trace_header_index
+from solar_tracking.sunspot_detection import find_spots_and_boxes
+from solar_tracking.traces import trace_dir, trace_files
 
-def run_tracking(trace: int = 1, interactive: bool = True):
+# Erweitert die Bounding-Box beim Initialisieren der Tracker und beim Zeichnen
+OVERSIZE = 20
+# Konfiguration: Linienbreite für Zeichnungen
+LINE_THICKNESS = 3
+
+
+class TrackingSession:
+    """
+    Verfolgt alle Spots einer Bildserie gleichzeitig in einem einzigen Durchlauf.
+
+    Für jeden Spot wird ein eigener OpenCV-MIL-Tracker angelegt. Jedes neue Bild
+    wird nur einmal vorverarbeitet (Konvertierung nach BGR) und anschließend
+    an alle Tracker übergeben. Die Tracker sind voneinander unabhängig, daher
+    entsprechen die Ergebnisse denen eines separaten Durchlaufs pro Spot.
+
+    Parameter
+    ----------
+    first_image : np.ndarray
+        Das erste (normalisierte) Bild der Serie, auf dem die Spots detektiert wurden.
+    bbox : list of tuples
+        Bounding-Boxen der Spots als (x, y, w, h), siehe find_spots_and_boxes.
+    centroids : list of np.ndarray
+        Zentroiden der Spots als (x, y)-Werte.
+    spot_ids : list of int, optional
+        IDs der Spots (Standard: 0, 1, 2, ...), z. B. wenn nur ein Teil der Spots verfolgt wird.
+    """
+
+    def __init__(self, first_image: np.ndarray, bbox, centroids, spot_ids=None):
+        if spot_ids is None:
+            spot_ids = range(len(bbox))
+        self.tracks = []
+        self._trackers = []
+        self.add_spots(first_image, bbox, centroids, spot_ids)
+        self.n_frames = 1
+
+    def add_spots(self, image: np.ndarray, bbox, centroids, spot_ids):
+        """Nimmt weitere Spots, die im Bild `image` detektiert wurden, in die Verfolgung auf."""
+        for idx, spot_id, spot in zip(range(len(bbox)), spot_ids, bbox):
+            # Tracker erstellen – hier wird ein MIL-Tracker verwendet (alternativ z.B. CSRT)
+            tracker = cv2.TrackerMIL_create()
+            tracker.init(image, (spot[0]-OVERSIZE, spot[1]-OVERSIZE, spot[2]+OVERSIZE, spot[3]+OVERSIZE))
+            self._trackers.append(tracker)
+            # Startkoordinaten (x,y) aus den Zentroiden
+            self.tracks.append({"spot": int(spot_id),
+                                "x1": int(centroids[idx][0]), "y1": int(centroids[idx][1]),
+                                "x2": None, "y2": None,
+                                "success": True, "box": None})
+
+    def drop_lost(self):
+        """Entfernt die verlorenen Spots, damit sie bei den nächsten Bildern keine Arbeit mehr kosten."""
+        keep = [track["success"] for track in self.tracks]
+        self.tracks = [track for track, k in zip(self.tracks, keep) if k]
+        self._trackers = [tracker for tracker, k in zip(self._trackers, keep) if k]
+
+    def __getstate__(self):
+        # Die OpenCV-Tracker lassen sich nicht speichern, siehe resume
+        state = self.__dict__.copy()
+        state["_trackers"] = None
+        return state
+
+    def resume(self, image: np.ndarray):
+        """
+        Legt die Tracker nach dem Laden eines Checkpoints auf dessen Bild an der
+        letzten Box jedes Spots neu an. Im Checkpoint-Bild verlorene Spots bleiben verloren.
+        """
+        self._trackers = []
+        for track in self.tracks:
+            tracker = None
+            if track["success"]:
+                tracker = cv2.TrackerMIL_create()
+                tracker.init(image, tuple(int(v) for v in track["box"]))
+            self._trackers.append(tracker)
+
+    def update(self, image: np.ndarray) -> np.ndarray:
+        """
+        Führt alle Tracker um ein Bild weiter.
+
+        Die Endkoordinaten (x2, y2) eines Spots entsprechen immer dem Mittelpunkt
+        der Box im zuletzt verarbeiteten Bild; schlägt das Tracking in diesem Bild
+        fehl, werden sie auf None gesetzt.
+
+        Args:
+            image (np.ndarray): nächstes normalisiertes Bild der Serie
+
+        Returns:
+            np.ndarray: das Bild in BGR, wie es an die Tracker übergeben wurde
+        """
+        # Konvertiere das Bild einmal für alle Tracker in BGR
+        frame_bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        for track, tracker in zip(self.tracks, self._trackers):
+            if tracker is None:
+                continue
+            success, new_box = tracker.update(frame_bgr)
+            track["success"] = success
+            if success:
+                # Mittelpunkt der aktuellen Bounding-Box
+                track["box"] = tuple(new_box)
+                track["x2"] = int(new_box[0] + new_box[2] / 2)
+                track["y2"] = int(new_box[1] + new_box[3] / 2)
+            else:
+                track["box"], track["x2"], track["y2"] = None, None, None
+        self.n_frames += 1
+        return frame_bgr
+
+
+class Trajectory:
+    """
+    Positionen aller Spots in jedem Bild als kompaktes Array der Form
+    (Bilder, Spots, 2) mit (x, y); NaN, wo ein Spot nicht (mehr) verfolgt wird.
+
+    Im ersten Bild stehen die Startkoordinaten (x1, y1), danach (x2, y2). Das
+    Array wächst beim Anhängen in Blöcken, damit nicht jedes Bild kopiert wird.
+    """
+
+    def __init__(self, n_spots: int, capacity: int = 64):
+        self._data = np.full((capacity, n_spots, 2), np.nan)
+        self.n_frames = 0
+
+    def append(self, tracks):
+        """Hängt die Positionen der Spots (sortiert nach Spot-ID) im nächsten Bild an."""
+        if self.n_frames == len(self._data):
+            grown = np.full((2 * len(self._data),) + self._data.shape[1:], np.nan)
+            grown[:self.n_frames] = self._data
+            self._data = grown
+        row = self._data[self.n_frames]
+        for i, track in enumerate(tracks):
+            if self.n_frames == 0:
+                row[i] = track["x1"], track["y1"]
+            elif track["success"]:
+                row[i] = track["x2"], track["y2"]
+        self.n_frames += 1
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._data[:self.n_frames]
+
+
+def _create_session(tracker: str, first_image: np.ndarray, bbox, centroids, spot_ids=None, pyramid_levels: int = 0,
+                    **options):
+    """
+    Erzeugt die Tracking-Session des gewählten Trackers, siehe TRACKERS.
+
+    Mit pyramid_levels > 0 läuft der Tracker auf der verkleinerten Pyramidenstufe
+    und die Positionen werden in voller Auflösung verfeinert (siehe solar_tracking.pyramid).
+    """
+    if pyramid_levels > 0:
+        from solar_tracking.pyramid import PyramidTrackingSession
+        return PyramidTrackingSession(tracker, first_image, bbox, centroids, spot_ids, levels=pyramid_levels,
+                                      **options)
+    if tracker == "mil":
+        return TrackingSession(first_image, bbox, centroids, spot_ids)
+    if tracker == "link":
+        from solar_tracking.linking import LinkTrackingSession
+        return LinkTrackingSession(first_image, bbox, centroids, spot_ids, **options)
+    if tracker == "roi":
+        from solar_tracking.roi_tracking import RoiTrackingSession
+        return RoiTrackingSession(first_image, bbox, centroids, spot_ids, **options)
+    raise ValueError(f"Unbekannter Tracker: {tracker}. Verfügbare Optionen: {list(TRACKERS)}")
+
+
+def track_spots(first_image: np.ndarray, frames, bbox, centroids, on_frame=None, workers: int = 1,
+                tracker: str = "mil", tracker_options=None, checkpoint=None, checkpoint_every: int = 100,
+                resume=None):
+    """
+    Verfolgt alle Spots über die Bildserie und gibt die Ergebnisse pro Spot zurück.
+
+    Args:
+        first_image (np.ndarray): erstes Bild der Serie (Initialisierung der Tracker)
+        frames (iterable): die weiteren Bilder der Serie, z. B. von iter_frames
+        bbox (list): Bounding-Boxen der Spots im ersten Bild
+        centroids (list): Zentroiden der Spots im ersten Bild
+        on_frame (callable, optional): wird nach jedem Bild mit (Bildindex, Spots,
+            Bild in BGR) aufgerufen; gibt der Aufruf False zurück, wird das Tracking abgebrochen
+        workers (int): Anzahl der Prozesse, auf die die Spots verteilt werden
+            (siehe solar_tracking.parallel); 1 verfolgt alle Spots im aktuellen Prozess.
+            Gilt nur für den MIL-Tracker ohne tracker_options (also nicht im Pyramidenmodus),
+            der Link-Tracker detektiert pro Bild einmal für alle Spots.
+        tracker (str): "mil" (TrackingSession), "link" (siehe solar_tracking.linking)
+            oder "roi" (subpixelgenau, siehe solar_tracking.roi_tracking)
+        tracker_options (dict, optional): weitere Argumente der Tracking-Session, für
+            "link" mindestens sun_radius und sun_center; mit pyramid_levels > 0 läuft
+            der Tracker auf der Pyramidenstufe (siehe _create_session)
+        checkpoint (callable, optional): wird alle checkpoint_every Bilder mit frame
+            (Index des letzten verfolgten Bildes), session und trajectory als
+            Schlüsselwortargumente aufgerufen, z. B. partial(save_checkpoint, Pfad)
+        checkpoint_every (int): Abstand der Checkpoints in Bildern
+        resume (dict, optional): geladener Checkpoint (siehe load_checkpoint); die
+            Session und die Trajectory werden übernommen, first_image ist dann das
+            Bild des Checkpoints (nur für den MIL-Tracker nötig) und frames die
+            Bilder danach; bbox und centroids werden nicht verwendet
+
+    Returns:
+        list of dict: pro Spot 'spot', 'x1', 'y1', 'x2', 'y2', 'success', 'box' und
+        'trajectory' (Positionen in jedem Bild als (Bilder, 2)-Array, Ansicht auf eine
+        gemeinsame Trajectory), sortiert nach Spot-ID, oder None, falls das Tracking
+        abgebrochen wurde
+    """
+    if resume is None and tracker == "mil" and not tracker_options and workers > 1 and len(bbox) > 1:
+        if checkpoint is not None:
+            raise ValueError("Checkpoints werden nur ohne Aufteilung der Spots auf Prozesse (workers=1) unterstützt.")
+        from solar_tracking.parallel import track_spots_parallel
+        trajectory = Trajectory(len(bbox))
+        with profiling.stage("track_spots_parallel"):
+            tracks = track_spots_parallel(first_image, frames, bbox, centroids, on_frame, workers,
+                                          trajectory=trajectory)
+    else:
+        if resume is not None:
+            session, trajectory = resume["session"], resume["trajectory"]
+            if tracker == "mil":
+                session.resume(first_image)
+        else:
+            session = _create_session(tracker, first_image, bbox, centroids, **(tracker_options or {}))
+            trajectory = Trajectory(len(bbox))
+            trajectory.append(session.tracks)
+        tracks = session.tracks
+        # Das Warten auf das nächste Bild (Dekodieren) wird getrennt vom Tracker gemessen
+        for image in profiling.timed_iter("frame_wait", frames):
+            with profiling.stage("tracker_update"):
+                frame_bgr = session.update(image)
+            trajectory.append(session.tracks)
+            if checkpoint is not None and checkpoint_every > 0 and session.n_frames % checkpoint_every == 0:
+                with profiling.stage("checkpoint"):
+                    checkpoint(frame=session.n_frames - 1, session=session, trajectory=trajectory)
+            if on_frame is not None:
+                if frame_bgr is None:
+                    frame_bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+                with profiling.stage("on_frame"):
+                    stop = on_frame(session.n_frames - 1, session.tracks, frame_bgr) is False
+                if stop:
+                    return None
+    if tracks is None:
+        return None
+    positions = trajectory.positions
+    for i, track in enumerate(tracks):
+        track["trajectory"] = positions[:, i]
+    return tracks
+
+
+def track_traces(traces, workers: int = 1, **kwargs):
+    """
+    Verfolgt mehrere Trace-Serien ohne Interaktion, verteilt auf einen Prozesspool.
+
+    Jede Trace-Serie wird vollständig in einem eigenen Prozess mit run_tracking
+    bearbeitet. Die Ergebnisse werden in der Reihenfolge von traces zurückgegeben.
+
+    Args:
+        traces (list of int): Nummern der Trace-Serien
+        workers (int): Anzahl der Prozesse
+        **kwargs: weitere Argumente für run_tracking (z. B. memmap oder cache)
+
+    Returns:
+        dict: Trace-Nummer -> gespeicherte Spots (siehe run_tracking)
+    """
+    traces = list(traces)
+    run_trace = functools.partial(_run_trace_headless, **kwargs)
+    if workers <= 1 or len(traces) <= 1:
+        return {trace: run_trace(trace) for trace in traces}
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(traces)), mp_context=context) as pool:
+        results = pool.map(run_trace, traces)
+        return dict(zip(traces, results))
+
+
+def _run_trace_headless(trace: int, **kwargs):
+    """Hilfsfunktion für track_traces (muss für den Prozesspool importierbar sein)."""
+    return run_tracking(trace, interactive=False, **kwargs)
+
+
+def _draw_sun(disp, sun_r, sun_c, image_resolution):
+    """Zeichnet den Sonnenkreis und die Horizontale durch den Sonnenmittelpunkt."""
+    cv2.line(disp, (0, sun_c[1]), (image_resolution, sun_c[1]), (0, 0, 255), LINE_THICKNESS)
+    cv2.circle(disp, sun_c, sun_r, (255, 0, 0), LINE_THICKNESS)
+    cv2.circle(disp, sun_c, int(sun_r*0.9), (200, 200, 0), LINE_THICKNESS)
+
+
+def _draw_track(disp, track, image_resolution, label_pos=None):
+    """
+    Zeichnet Startpunkt, aktuelle Box und Hilfslinien eines Spots in das Bild.
+
+    Ist label_pos gesetzt, wird die Spot-ID dort beschriftet, sonst an der Box.
+    """
+    # Der ROI-Tracker liefert subpixelgenaue Koordinaten, gezeichnet wird auf ganze Pixel
+    x1, y1 = int(track["x1"]), int(track["y1"])
+    # Zeichne den ursprünglichen Spot als kleinen Kreis (Startpunkt)
+    cv2.circle(disp, (x1, y1), radius=2, color=(150, 255, 0), thickness=-1)
+    if not track["success"]:
+        cv2.putText(disp, f"Spot {track['spot']}: Tracking fehlgeschlagen", label_pos or (x1, y1),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
+        return
+
+    box = track["box"]
+    center_x, center_y = int(track["x2"]), int(track["y2"])
+    # Zeichne die Bounding-Box (inklusive Oversize)
+    p1 = (int(box[0]-OVERSIZE), int(box[1]-OVERSIZE))
+    p2 = (int(box[0]+box[2]+OVERSIZE), int(box[1]+box[3]+OVERSIZE))
+    cv2.rectangle(disp, p1, p2, (0, 0, 255), 2)
+    # Vertikale und horizontale Linien durch den Startpunkt (x1, y1)
+    cv2.line(disp, (x1, 0), (x1, image_resolution), (255, 0, 0), LINE_THICKNESS)
+    cv2.line(disp, (0, y1), (image_resolution, y1), (255, 0, 0), LINE_THICKNESS)
+    # Vertikale und horizontale Linien durch den Mittelpunkt der aktuellen Box
+    cv2.line(disp, (center_x, 0), (center_x, image_resolution), (0, 0, 255), LINE_THICKNESS)
+    cv2.line(disp, (0, center_y), (image_resolution, center_y), (0, 0, 255), LINE_THICKNESS)
+    # Beschrifte den Spot
+    cv2.putText(disp, f"Spot ID: {track['spot']}", label_pos or p1, cv2.FONT_HERSHEY_SIMPLEX,
+                1, (0, 255, 0), 2, cv2.LINE_AA)
+
+
+def _draw_zoom(disp, frame_bgr, box):
+    """Blendet das vergrößerte ROI eines Spots oben links in das Bild ein."""
+    try:
+        zoom_oversize = 20
+        pos = 50  # Position, wo der Zoom in das Bild eingeblendet wird
+        roi = frame_bgr[
+            int(box[1]-zoom_oversize):int(box[1]+box[3]+zoom_oversize),
+            int(box[0]-zoom_oversize):int(box[0]+box[2]+zoom_oversize)
+        ]
+        zoomed_roi = cv2.resize(roi, (0, 0), fx=10, fy=10)
+        h_roi, w_roi, _ = zoomed_roi.shape
+        # Zeichne Kreuzlinien im vergrößerten ROI
+        cv2.line(zoomed_roi, (int(w_roi/2), 0), (int(w_roi/2), h_roi), (0, 0, 255), LINE_THICKNESS)
+        cv2.line(zoomed_roi, (0, int(h_roi/2)), (w_roi, int(h_roi/2)), (0, 0, 255), LINE_THICKNESS)
+        # Stelle sicher, dass das Zoom-Bild in disp passt
+        if pos + h_roi <= disp.shape[0] and pos + w_roi <= disp.shape[1]:
+            disp[pos:pos+h_roi, pos:pos+w_roi] = zoomed_roi
+    except Exception as e:
+        print("Zoom error:", e)
+
+
+def run_tracking(trace: int = 1, interactive: bool = True, workers: int = 1, memmap: bool = False,
+                 cache=None, decode_workers: int = 1, fast_detection: bool = False, tracker: str = "mil",
+                 checkpoint_every: int = 0, resume: bool = False, pyramid_levels: int = 0):
     """
     Führt das Tracking von Sonnenflecken in einer gegebenen Trace-Serie aus.
-    
+
     Dabei werden folgende Schritte durchgeführt:
-      1. Einlesen der Dateinamen aus 'data/TR_0X/names.txt'
-      2. Auslesen der Headerinformationen (z. B. Sonnenmittelpunkt, Bildauflösung)
-      3. Vorverarbeitung der FITS-Dateien zu Bildern
+      1. Einlesen der Dateinamen aus 'data/TR_XX/names.txt'
+      2. Auslesen der Header aller Bilder in den Header-Index (Sonnenmittelpunkt,
+         Bildauflösung, Beobachtungszeiten, siehe trace_header_index)
+      3. Vorverarbeitung der FITS-Dateien zu Bildern (gestreamt, siehe iter_frames)
       4. Initiale Spot-Detektion im ersten Bild
-      5. Verfolgen der Spots in der Bildserie mittels eines OpenCV-Trackers
-      6. (Optional) Interaktive Anzeige zur Auswahl, ob der Trace gespeichert wird.
-    
+      5. Verfolgen aller Spots in einem Durchlauf über die Bildserie (siehe TrackingSession)
+         Mit checkpoint_every > 0 wird der Zustand regelmäßig gespeichert und kann
+         mit resume=True nach einem Abbruch fortgesetzt werden.
+      6. Speichern der Ergebnisse; interaktiv wird pro Spot abgefragt, ob er gespeichert wird.
+         Die Zeitdifferenz und die Zeitpunkte der Trajektorien stammen aus DATE-OBS
+         (ohne DATE-OBS: eine Stunde pro Bild).
+
     Zusätzlich werden im Tracking:
-      - Das aktuelle ROI (Region of Interest) wird vergrößert (Zoom) und eingeblendet.
-      - Verschiedene Hilfslinien (z. B. Sonnenmittelpunkt, Startkoordinaten, Bounding-Box-Mittelpunkt) werden gezeichnet.
-    
+      - Verschiedene Hilfslinien (z. B. Sonnenmittelpunkt, Startkoordinaten, Bounding-Box-Mittelpunkt) werden gezeichnet.
+      - Bei der Abfrage am Ende wird das ROI (Region of Interest) des Spots vergrößert (Zoom) eingeblendet.
+
     Parameter
     ----------
     trace : int, optional
-        Nummer der Trace-Serie (entspricht dem Ordner 'data/TR_0X'); Standard ist 1.
+        Nummer der Trace-Serie (entspricht dem Ordner 'data/TR_XX'); Standard ist 1.
     interactive : bool, optional
         Wenn True, werden Fenster zur Visualisierung und Tastatureingaben genutzt.
+        Wenn False, läuft das Tracking ohne Anzeige, Zeichnen und cv2.waitKey, und
+        alle bis zum letzten Bild erfolgreich verfolgten Spots werden gespeichert.
+    workers : int, optional
+        Anzahl der Prozesse, auf die die Spots verteilt werden; Standard ist 1.
+    memmap : bool, optional
+        Lädt die FITS-Dateien speicherschonend (siehe image_processing_fits).
+    cache : FrameCache, optional
+        Cache der normalisierten Bilder; bei erneuten Läufen entfällt das Dekodieren.
+    decode_workers : int, optional
+        Anzahl der Prozesse, die die FITS-Dateien parallel dekodieren; Standard ist 1.
+    fast_detection : bool, optional
+        Spot-Detektion nur auf der Sonnenscheibe und mit verkleinerter adaptiver
+        Schwelle (siehe find_spots_and_boxes, FAST_DETECTION); gilt beim
+        Link-Tracker auch für die Detektion in jedem Bild.
+    tracker : str, optional
+        "mil" (Standard), "link" oder "roi", siehe track_spots. Beim ROI-Tracker
+        werden die Koordinaten subpixelgenau gespeichert.
+    checkpoint_every : int, optional
+        Alle so vielen Bilder einen Checkpoint schreiben (siehe solar_tracking.checkpoint);
+        0 (Standard) schreibt keine Checkpoints.
+    resume : bool, optional
+        Nach dem Bild des letzten Checkpoints weitermachen, ohne die bereits
+        verfolgten Bilder erneut zu dekodieren; ohne Checkpoint beginnt der Lauf von vorn.
+    pyramid_levels : int, optional
+        Detektion und Tracking auf der um 2**pyramid_levels verkleinerten Bildstufe,
+        verfeinert in voller Auflösung nur in Fenstern um die Spots (siehe
+        solar_tracking.pyramid); 0 (Standard) arbeitet durchgehend in voller Auflösung.
+
+    Returns
+    -------
+    list of dict or None
+        Die gespeicherten Spots (siehe track_spots), oder None bei Abbruch mit 'q'.
+
+    Raises
+    ------
+    ValueError
+        Bei Checkpoints mit dem MIL-Tracker und workers > 1 (ohne Bildpyramide), noch
+        bevor Header gelesen oder Bilder dekodiert werden.
     """
-    
+    # Die Aufteilung der MIL-Spots auf Prozesse (siehe track_spots) kann keine Checkpoints schreiben
+    if checkpoint_every > 0 and tracker == "mil" and workers > 1 and pyramid_levels == 0:
+        raise ValueError("Checkpoints werden nur ohne Aufteilung der Spots auf Prozesse (workers=1) unterstützt.")
+
     # --- Schritt 1: Dateinamen einlesen ---
-    names_file = Path(f"data/TR_0{trace}/names.txt")
-    if not names_file.exists():
-        raise FileNotFoundError(f"Die Datei {names_file} wurde nicht gefunden.")
-    file_paths = np.genfromtxt(str(names_file), dtype=str)
-    
-    # --- Schritt 2: Headerinformationen aus der ersten Datei auslesen ---
-    first_file = Path(f"data/TR_0{trace}") / file_paths[0]
-    sun_r, sun_c, image_resolution = sun_infos(first_file)
-    
-    # --- Schritt 3: Alle FITS-Dateien verarbeiten ---
-    images = []
-    for fname in file_paths:
-        fit_path = Path(f"data/TR_0{trace}") / fname
-        processed_fit = image_processing_fits(fit_path)
-        images.append(processed_fit)
-    
-    if not images:
-        raise ValueError("Keine Bilder konnten geladen werden.")
-    
+    fit_paths = trace_files(trace)
+
+    # --- Schritt 2: Header aller Dateien in einem Durchlauf auslesen ---
+    header_index = trace_header_index(trace)
+    sun_r, sun_c, image_resolution = index_sun_infos(header_index)
+    hours = frame_hours(header_index)
+
+    # --- Schritt 3: Die FITS-Dateien werden erst beim Tracking gestreamt ---
+    # Nur das erste Bild bleibt dauerhaft im Speicher, alle weiteren Bilder
+    # werden von iter_frames mit einem begrenzten Vorlauf dekodiert.
+
+    # Checkpoint laden; er muss zur Bildserie und zum Tracker passen
+    checkpoint_file = checkpoint_path(trace)
+    names = [path.name for path in fit_paths]
+    state = load_checkpoint(checkpoint_file) if resume else None
+    if state is not None and (state["names"] != names or state["tracker"] != tracker
+                              or state.get("pyramid_levels", 0) != pyramid_levels):
+        raise ValueError(f"Der Checkpoint {checkpoint_file} passt nicht zur Trace-Serie oder zum Tracker {tracker}.")
+    start = 0 if state is None else state["frame"]
+    checkpoint = None
+    if checkpoint_every > 0:
+        checkpoint = functools.partial(save_checkpoint, checkpoint_file, names=names, tracker=tracker,
+                                       pyramid_levels=pyramid_levels)
+
     # --- Schritt 4: Initiale Spot-Detektion im ersten Bild ---
-    prev_image = images[0]
-    bbox, centroids = find_spots_and_boxes(prev_image, sun_r, sun_c)
-    print('Number of detected spots:', len(bbox))
-    
-    # Konfiguration: Linienbreite für Zeichnungen
-    line_thickness = 3
-    
-    # Erstelle ein einziges Fenster für die Anzeige, falls interaktiv
+    detection_kwargs = dict(FAST_DETECTION) if fast_detection else {}
+    if pyramid_levels > 0:
+        detection_kwargs["pyramid_levels"] = pyramid_levels
+    if state is None:
+        prev_image = image_processing_fits(fit_paths[0], memmap=memmap, cache=cache)
+        bbox, centroids = find_spots_and_boxes(prev_image, sun_r, sun_c, **detection_kwargs)
+        print('Number of detected spots:', len(bbox))
+    else:
+        # Nur das Bild des Checkpoints wird benötigt (MIL-Tracker und Anzeige)
+        prev_image = None
+        if tracker == "mil" or interactive:
+            prev_image = image_processing_fits(fit_paths[start], memmap=memmap, cache=cache)
+        bbox, centroids = [], []
+        print(f"Setze das Tracking nach Bild {start + 1} von {len(fit_paths)} fort.")
+
+    tracker_options = None
+    if tracker in ("link", "roi"):
+        from solar_tracking.linking import drift_direction
+        tracker_options = {"sun_radius": sun_r, "sun_center": sun_c, "frame_hours": hours,
+                           "direction": drift_direction(crota2=header_index["crota2"][0])}
+        if tracker == "link":
+            tracker_options["detection_kwargs"] = detection_kwargs
+    if pyramid_levels > 0 and tracker != "link":
+        # Der Link-Tracker verkleinert schon in seiner Detektion (detection_kwargs)
+        tracker_options = dict(tracker_options or {}, sun_radius=sun_r, sun_center=sun_c,
+                               pyramid_levels=pyramid_levels, detection_kwargs=detection_kwargs)
+
+    # --- Schritt 5: Tracking aller Spots über die Bildserie ---
+    frames = iter_frames(fit_paths[start + 1:], prefetch=max(2, 2 * decode_workers), memmap=memmap,
+                         cache=cache, workers=decode_workers)
+    if not interactive:
+        # Headless: keine Fenster, kein Zeichnen und kein cv2.waitKey-Takt
+        tracks = track_spots(prev_image, frames, bbox, centroids,
+                             workers=workers, tracker=tracker, tracker_options=tracker_options,
+                             checkpoint=checkpoint, checkpoint_every=checkpoint_every, resume=state)
+        accepted = [track for track in tracks if track["success"]]
+        _save_tracks(trace, accepted, hours[-1], time_hours=hours)
+        checkpoint_file.unlink(missing_ok=True)
+        print(f"{len(accepted)} von {len(tracks)} Spots erfolgreich verfolgt und gespeichert.")
+        return accepted
+
+    # Erstelle ein einziges Fenster für die Anzeige
     window_name = "Tracking"
-    if interactive:
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-    
-    # --- Schritt 5: Tracking der Spots über die Bildserie ---
-    for idx, spot in enumerate(bbox):
-        # Startkoordinaten (x,y) aus den Zentroiden
-        x1 = int(centroids[idx][0])
-        y1 = int(centroids[idx][1])
-        
-        # Tracker erstellen – hier wird ein MIL-Tracker verwendet (alternativ z.B. CSRT)
-        tracker = cv2.TrackerMIL_create()
-        oversize = 20  # Erweitert die Bounding-Box für eine bessere Visualisierung
-        tracker.init(prev_image, (spot[0]-oversize, spot[1]-oversize, spot[2]+oversize, spot[3]+oversize))
-        
-        # Variable zur Speicherung der Endkoordinaten initialisieren
-        x2, y2 = None, None
-        
-        # Tracking über die restlichen Bilder der Serie
-        for i in range(1, len(images)):
-            current_image = images[i]
-            # Konvertiere das Bild in BGR, um farbige Zeichnungen zu ermöglichen
-            current_disp = cv2.cvtColor(current_image, cv2.COLOR_GRAY2BGR)
-            
-            # Update des Trackers
-            success, new_box = tracker.update(current_disp)
-            
-            # Zeichne den ursprünglichen Spot als kleinen Kreis (Startpunkt)
-            cv2.circle(current_disp, (x1, y1), radius=2, color=(150, 255, 0), thickness=-1)
-            
-            if success:
-                # Berechne den Mittelpunkt der aktuellen Bounding-Box
-                center_x = int(new_box[0] + new_box[2] / 2)
-                center_y = int(new_box[1] + new_box[3] / 2)
-                if i == len(images)-1:
-                    x2, y2 = center_x, center_y
-                
-                # Zeichne die Bounding-Box (inklusive Oversize)
-                p1 = (int(new_box[0]-oversize), int(new_box[1]-oversize))
-                p2 = (int(new_box[0]+new_box[2]+oversize), int(new_box[1]+new_box[3]+oversize))
-                cv2.rectangle(current_disp, p1, p2, (0, 0, 255), 2)
-                
-                # --- Zoom in das aktuelle Spot-ROI ---
-                try:
-                    zoom_oversize = 20
-                    pos = 50  # Position, wo der Zoom in das Bild eingeblendet wird
-                    roi = current_disp[
-                        int(new_box[1]-zoom_oversize):int(new_box[1]+new_box[3]+zoom_oversize),
-                        int(new_box[0]-zoom_oversize):int(new_box[0]+new_box[2]+zoom_oversize)
-                    ]
-                    zoomed_roi = cv2.resize(roi, (0,0), fx=10, fy=10)
-                    h_roi, w_roi, _ = zoomed_roi.shape
-                    # Zeichne Kreuzlinien im vergrößerten ROI
-                    cv2.line(zoomed_roi, (int(w_roi/2), 0), (int(w_roi/2), h_roi), (0, 0, 255), line_thickness)
-                    cv2.line(zoomed_roi, (0, int(h_roi/2)), (w_roi, int(h_roi/2)), (0, 0, 255), line_thickness)
-                    # Stelle sicher, dass das Zoom-Bild in current_disp passt
-                    if pos + h_roi <= current_disp.shape[0] and pos + w_roi <= current_disp.shape[1]:
-                        current_disp[pos:pos+h_roi, pos:pos+w_roi] = zoomed_roi
-                except Exception as e:
-                    print("Zoom error:", e)
-                
-                # --- Zeichne weitere Hilfslinien ---
-                # Horizontale Linie durch den Sonnenmittelpunkt
-                cv2.line(current_disp, (0, sun_c[1]), (image_resolution, sun_c[1]), (0, 0, 255), line_thickness)
-                # Vertikale und horizontale Linien durch den Startpunkt (x1, y1)
-                cv2.line(current_disp, (x1, 0), (x1, image_resolution), (255, 0, 0), line_thickness)
-                cv2.line(current_disp, (0, y1), (image_resolution, y1), (255, 0, 0), line_thickness)
-                # Vertikale und horizontale Linien durch den Mittelpunkt der aktuellen Box
-                cv2.line(current_disp, (center_x, 0), (center_x, image_resolution), (0, 0, 255), line_thickness)
-                cv2.line(current_disp, (0, center_y), (image_resolution, center_y), (0, 0, 255), line_thickness)
-                # Zeichne den Sonnenkreis (Mittelpunkt und Radius)
-                cv2.circle(current_disp, sun_c, sun_r, (255, 0, 0), line_thickness)
-                cv2.circle(current_disp, sun_c, int(sun_r*0.9), (200, 200, 0), line_thickness)
-                # Beschrifte den Spot
-                cv2.putText(current_disp, f"Spot ID: {idx}", (50, 80), cv2.FONT_HERSHEY_SIMPLEX,
-                            1, (0, 255, 0), 2, cv2.LINE_AA)
-            else:
-                # Falls das Tracking fehlschlägt, wird eine Meldung angezeigt
-                cv2.putText(current_disp, "Tracking fehlgeschlagen", (50, 80), cv2.FONT_HERSHEY_SIMPLEX,
-                            1, (0, 0, 255), 2, cv2.LINE_AA)
-            
-            # Anzeige des aktuellen Frames
-            if interactive:
-                cv2.imshow(window_name, current_disp)
-                key = cv2.waitKey(30) & 0xFF
-                if key == ord('q'):  # Mit 'q' kann der gesamte Vorgang abgebrochen werden
-                    print("Tracking abgebrochen.")
-                    cv2.destroyWindow(window_name)
-                    return
-                elif key == ord('p'):  # Mit 'p' pausiert die Anzeige
-                    print("Pausiert. Drücke eine Taste zum Fortfahren.")
-                    cv2.waitKey(0)
-            else:
-                cv2.waitKey(30)
-        
-        # --- Schritt 6: Optionales Speichern der Ergebnisse ---
-        if interactive:
-            # Blende am Ende des Trackings für diesen Spot eine Eingabeaufforderung ein
-            prompt_img = current_disp.copy()
-            cv2.putText(prompt_img, "Druecke y zum Speichern, n zum Ueberspringen", 
-                        (150, image_resolution - 50), cv2.FONT_HERSHEY_SIMPLEX,
-                        0.8, (255, 255, 0), 2, cv2.LINE_AA)
-            cv2.imshow(window_name, prompt_img)
-            
-            # Warte auf die Benutzereingabe ('y' oder 'n')
-            while True:
-                key = cv2.waitKey(0) & 0xFF
-                if key == ord('y'):
-                    include_trace = True
-                    break
-                elif key == ord('n'):
-                    include_trace = False
-                    break
-        else:
-            include_trace = False
-        
-        if include_trace and x2 is not None and y2 is not None:
-            data_file = Path(f"data/TR_0{trace}/data_points.csv")
-            try:
-                existing_data = np.genfromtxt(str(data_file), delimiter=',', skip_header=True, dtype=float)
-            except IOError:
-                existing_data = np.empty((0, 5))
-            new_row = np.array([x1, y1, x2, y2, len(images)-1])
-            updated_data = np.vstack([existing_data, new_row])
-            np.savetxt(str(data_file), updated_data, delimiter=',',
-                       header="xcoor[pix],ycorr[pix],x2[pix],y2[pix],delta_time [h]",
-                       comments="", fmt="%.8f")
-    
+    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+    last_frame = {"bgr": cv2.cvtColor(prev_image, cv2.COLOR_GRAY2BGR)}
+
+    def show_frame(frame_index, tracks, frame_bgr):
+        # Anzeige des aktuellen Frames mit allen Spots
+        last_frame["bgr"] = frame_bgr
+        current_disp = frame_bgr.copy()
+        _draw_sun(current_disp, sun_r, sun_c, image_resolution)
+        for track in tracks:
+            _draw_track(current_disp, track, image_resolution)
+        cv2.imshow(window_name, current_disp)
+        key = cv2.waitKey(30) & 0xFF
+        if key == ord('q'):  # Mit 'q' kann der gesamte Vorgang abgebrochen werden
+            print("Tracking abgebrochen.")
+            return False
+        elif key == ord('p'):  # Mit 'p' pausiert die Anzeige
+            print("Pausiert. Drücke eine Taste zum Fortfahren.")
+            cv2.waitKey(0)
+        return True
+
+    tracks = track_spots(prev_image, frames, bbox, centroids,
+                         on_frame=show_frame, workers=workers, tracker=tracker,
+                         tracker_options=tracker_options, checkpoint=checkpoint,
+                         checkpoint_every=checkpoint_every, resume=state)
+    if tracks is None:
+        cv2.destroyWindow(window_name)
+        return None
+
+    # --- Schritt 6: Auswahl der zu speichernden Ergebnisse ---
+    accepted = []
+    for track in tracks:
+        if not track["success"]:
+            continue
+        # Blende am Ende des Trackings für diesen Spot eine Eingabeaufforderung ein
+        prompt_img = last_frame["bgr"].copy()
+        _draw_zoom(prompt_img, last_frame["bgr"], track["box"])
+        _draw_sun(prompt_img, sun_r, sun_c, image_resolution)
+        _draw_track(prompt_img, track, image_resolution, label_pos=(50, 80))
+        cv2.putText(prompt_img, "Druecke y zum Speichern, n zum Ueberspringen",
+                    (150, image_resolution - 50), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.8, (255, 255, 0), 2, cv2.LINE_AA)
+        cv2.imshow(window_name, prompt_img)
+
+        # Warte auf die Benutzereingabe ('y' oder 'n')
+        while True:
+            key = cv2.waitKey(0) & 0xFF
+            if key == ord('y'):
+                accepted.append(track)
+                break
+            elif key == ord('n'):
+                break
+
+    _save_tracks(trace, accepted, hours[-1], time_hours=hours)
+    checkpoint_file.unlink(missing_ok=True)
     cv2.destroyAllWindows()
+    return accepted
+
+
+@profiling.profiled("save_tracks")
+def _save_tracks(trace: int, tracks, delta_time, time_hours=None):
+    """
+    Hängt die übernommenen Spots (mit Trajektorien) an den TrackStore an und ihre
+    Start- und Endkoordinaten an 'data/TR_XX/data_points.csv' (siehe TrackStore.append_csv).
+
+    Eine data_points.csv aus der Zeit vor dem TrackStore wird beim ersten Mal übernommen
+    (TrackStore.import_legacy_csv).
+
+    Args:
+        trace (int): Nummer der Trace-Serie
+        tracks (list of dict): übernommene Spots, siehe track_spots
+        delta_time (float or array): Zeitdifferenz zwischen erstem und letztem Bild in Stunden
+            (für alle Spots oder pro Spot)
+        time_hours (array, optional): Zeitpunkte aller Bilder in Stunden, siehe TrackStore.append
+    """
+    from solar_tracking.track_store import TrackStore
+
+    if not tracks:
+        return
+    data_file = trace_dir(trace) / "data_points.csv"
+    store = TrackStore()
+    store.import_legacy_csv(trace, data_file)
+    chunk = store.append(trace, tracks, delta_time, time_hours=time_hours)
+    store.append_csv(trace, chunk, data_file)
 
 if __name__ == '__main__':
     run_tracking(trace=1, interactive=True)
@@ -0,0 +1,552 @@
+"""
+Inkrementelles Tracking einer Trace-Serie, während neue FITS-Dateien eintreffen.
+
+TraceWatcher hält die Tracking-Session, den Header-Index und die laufenden
+Rotationsraten zwischen zwei Abfragen im Speicher. Jede Abfrage (poll)
+verarbeitet nur die neu im Ordner 'data/TR_XX' eingetroffenen Dateien; der
+Aufwand hängt von der Zahl der neuen Bilder und der aktiven Spots ab, nicht von
+der Länge der Serie:
+  - Neue Dateien werden nach Namen sortiert (HMI-Dateinamen enthalten die
+    Beobachtungszeit) und an names.txt angehängt; neu ist jede Datei, deren Name
+    nach dem zuletzt verarbeiteten kommt. Der Ordner wird nur neu gelesen, wenn
+    sich seine Änderungszeit geändert hat. Dateien, deren Größe kein Vielfaches
+    eines FITS-Blocks ist oder deren Header sich nicht lesen lässt, werden bis
+    zur nächsten Abfrage zurückgestellt (noch im Schreiben).
+  - In jedem Bild werden neu erschienene Spots detektiert und in die laufende
+    Session aufgenommen (add_spots), verlorene Spots werden abgeschlossen und
+    aus der Session entfernt (drop_lost).
+  - Abgeschlossene Spots mit mindestens min_frames Positionen werden mit ihrer
+    Trajektorie als ein Block an den TrackStore angehängt, ihre Zeilen an
+    data_points.csv (TrackStore.append_csv); bestehende Blöcke werden dabei
+    nicht gelesen.
+  - Die Rotationsrate jedes Spots wird aus laufenden Summen derselben
+    Geradenanpassung wie in fit_rotation_rates fortgeschrieben und nach jeder
+    Abfrage in 'data/TR_XX/watch_omega.csv' geschrieben.
+  - Nach jeder Abfrage mit neuen Bildern wird der Zustand (zuletzt verarbeitete
+    Datei, Session, aktive Spots, noch zu speichernde Spots und die Zeitpunkte
+    der Bilder, die diese noch brauchen) in 'data/TR_XX/watch_checkpoint.pkl'
+    gespeichert (siehe solar_tracking.checkpoint). Abgeschlossene Spots fallen
+    heraus, ihre Rotationsraten werden beim Neustart aus watch_omega.csv gelesen;
+    der Checkpoint wächst also nicht mit der Länge der Beobachtung. Ein neu
+    gestarteter Watcher setzt dort fort, bereits verarbeitete Dateien und
+    gespeicherte Spots werden nicht erneut verarbeitet bzw. gespeichert. Die
+    abgeschlossenen Spots einer Abfrage erhalten ihren Blocknamen vor dem
+    Checkpoint, ein nach einem Abbruch wiederholtes Speichern erkennt den schon
+    vorhandenen Block.
+
+Beispiel:
+    watch_trace(1, interval=60, tracker="roi")
+"""
+import bisect
+import os
+import time
+import uuid
+
+import numpy as np
+
+from solar_tracking import profiling
+from solar_tracking.checkpoint import checkpoint_path, load_checkpoint, save_checkpoint
+from solar_tracking.defaults import FAST_DETECTION, TRACKERS
+from solar_tracking.header_index import FITS_BLOCK, index_sun_infos, read_header_row, save_header_index
+from solar_tracking.rotation_analysis import CARRINGTON_RATE
+from solar_tracking.traces import trace_dir
+
+# Kopfzeile von watch_omega.csv
+OMEGA_HEADER = "spot,lat[deg],omega[deg/day],omega_err[deg/day],frames,active"
+# Zustand des TraceWatcher, der im Checkpoint gespeichert wird (dazu die Rotationsraten der aktiven Spots)
+STATE_KEYS = ("session", "sun_radius", "sun_center", "_n_frames", "_last_name", "_date0", "_hours", "_spots",
+              "_finished", "_batch", "_next_id")
+# Eine Zeile pro Spot in TraceWatcher.omegas
+OMEGA_DTYPE = np.dtype([("spot", np.int32), ("lat", np.float64), ("omega", np.float64),
+                        ("omega_err", np.float64), ("frames", np.int32), ("active", bool)])
+
+
+def _is_complete(path) -> bool:
+    """Eine FITS-Datei besteht immer aus ganzen 2880-Byte-Blöcken; sonst wird sie noch geschrieben."""
+    size = os.path.getsize(path)
+    return size > 0 and size % FITS_BLOCK == 0
+
+
+def _rate(sums: np.ndarray):
+    """
+    Siderische Rotationsrate und Unsicherheit der Geraden lon = a + omega * t aus den
+    Summen (n, Σt, Σlon, Σt², Σt·lon, Σlon²), wie fit_rotation_rates, in °/Tag.
+    """
+    n, st, sl, stt, stl, sll = sums
+    if n < 2:
+        return np.nan, np.nan
+    s_tt = stt - st * st / n
+    s_tl = stl - st * sl / n
+    s_ll = sll - sl * sl / n
+    if s_tt <= 0:
+        return np.nan, np.nan
+    slope = s_tl / s_tt
+    sigma = np.sqrt(max(s_ll - slope * s_tl, 0.0) / (n - 2) / s_tt) if n >= 3 else np.nan
+    return slope * 24.0 + CARRINGTON_RATE, sigma * 24.0
+
+
+class _FrameHours:
+    """
+    Zeitpunkte der Bilder in Stunden seit dem ersten Bild, indiziert mit der Bildnummer.
+
+    Gehalten werden nur die Zeitpunkte ab dem Bild `start`; trim verwirft ältere,
+    sobald kein aktiver Spot sie mehr braucht.
+    """
+
+    def __init__(self):
+        self.start = 0
+        self._hours = []
+
+    def __len__(self) -> int:
+        return self.start + len(self._hours)
+
+    def __getitem__(self, frame):
+        if isinstance(frame, slice):
+            return self._hours[frame.start - self.start:frame.stop - self.start]
+        if frame < self.start:
+            raise IndexError(f"Der Zeitpunkt von Bild {frame} wurde schon verworfen.")
+        return self._hours[frame - self.start]
+
+    def append(self, hours: float):
+        self._hours.append(hours)
+
+    def trim(self, frame: int):
+        """Verwirft die Zeitpunkte vor dem Bild `frame`."""
+        if frame > self.start:
+            del self._hours[:frame - self.start]
+            self.start = frame
+
+
+class _SessionHours:
+    """
+    Zeitpunkte der Bilder ab dem ersten Bild einer Session, für step_hours.
+
+    Sessions zählen ihre Bilder ab ihrem Start (n_frames beginnt nach close oder
+    einem Neustart wieder bei 1), die Zeitpunkte des Watchers ab dem ersten
+    verarbeiteten Bild; Index 0 ist hier das Bild `first`. Die Sicht wächst mit
+    der Liste des Watchers mit.
+    """
+
+    def __init__(self, hours, first: int):
+        self.hours = hours
+        self.first = first
+
+    def __len__(self) -> int:
+        return len(self.hours) - self.first
+
+    def __getitem__(self, frame: int) -> float:
+        return self.hours[self.first + frame]
+
+
+class TraceWatcher:
+    """
+    Verfolgt die Spots einer Trace-Serie inkrementell, siehe Modulbeschreibung.
+
+    Parameter
+    ----------
+    trace : int
+        Nummer der Trace-Serie (Ordner 'data/TR_XX').
+    tracker : str, optional
+        "roi" (Standard), "link" oder "mil", siehe track_spots.
+    memmap : bool, optional
+        Speicherschonendes Laden der FITS-Dateien (siehe image_processing_fits).
+    cache : FrameCache, optional
+        Cache der normalisierten Bilder.
+    fast_detection : bool, optional
+        Schnelle Spot-Detektion, siehe FAST_DETECTION.
+    detect_every : int, optional
+        Neue Spots nur in jedem n-ten Bild suchen (Standard: 1); beim Link-Tracker
+        werden die Detektionen des Trackers verwendet.
+    min_frames : int, optional
+        Mindestzahl der Positionen, damit ein abgeschlossener Spot gespeichert wird (Standard: 3).
+    resume : bool, optional
+        Beim Start den gespeicherten Zustand laden und dort fortsetzen (Standard: True);
+        False beginnt von vorn und überschreibt den Checkpoint bei der ersten Abfrage.
+    """
+
+    def __init__(self, trace: int, tracker: str = "roi", memmap: bool = False, cache=None,
+                 fast_detection: bool = False, detect_every: int = 1, min_frames: int = 3,
+                 resume: bool = True):
+        if tracker not in TRACKERS:
+            raise ValueError(f"Unbekannter Tracker: {tracker}. Verfügbare Optionen: {list(TRACKERS)}")
+        if detect_every < 1:
+            raise ValueError(f"detect_every muss mindestens 1 sein, nicht {detect_every}.")
+        self.trace = trace
+        self.directory = trace_dir(trace)
+        if not self.directory.is_dir():
+            raise FileNotFoundError(f"Der Ordner {self.directory} wurde nicht gefunden.")
+        self.tracker = tracker
+        self.memmap = memmap
+        self.cache = cache
+        self.detection_kwargs = FAST_DETECTION if fast_detection else {}
+        self.detect_every = detect_every
+        self.min_frames = min_frames
+        self.session = None
+        self.sun_radius, self.sun_center = None, None
+        self._n_frames = 0
+        self._last_name = ""   # zuletzt verarbeitete Datei
+        self._date0 = None     # DATE-OBS des ersten Bildes
+        self._hours = _FrameHours()
+        self._spots = {}       # aktive Spots: ID -> Zustand
+        self._omegas = {}      # alle Spots: ID -> Zeile mit OMEGA_DTYPE
+        self._finished = []    # abgeschlossene, noch nicht gespeicherte Spots
+        self._batch = None     # Blockname der abgeschlossenen Spots, siehe _commit
+        self._next_id = 0
+        self._rows = {}        # Header-Zeilen der in diesem Prozess verarbeiteten Bilder, für close
+        # Inhalt des Ordners (sortiert) und seine Änderungszeit bei der letzten Durchsicht
+        self._listing, self._listing_mtime = None, None
+        # Bereits in names.txt eingetragene Dateien (z. B. von download_fits) nicht doppelt eintragen
+        names_file = self.directory / "names.txt"
+        self._listed = set(names_file.read_text().split()) if names_file.exists() else set()
+        self._store = None
+        self._checkpoint_file = checkpoint_path(trace, "watch")
+        if resume:
+            self._restore()
+
+    def _restore(self):
+        """Lädt den Zustand des letzten Laufs und speichert noch offene Spots."""
+        state = load_checkpoint(self._checkpoint_file)
+        if state is None:
+            return
+        if state["tracker"] != self.tracker:
+            raise ValueError(f"Der Checkpoint {self._checkpoint_file} passt nicht zum Tracker {self.tracker}.")
+        for key in STATE_KEYS:
+            setattr(self, key, state[key])
+        self._omegas = self._read_finished_omegas()
+        self._omegas.update(state["_omegas"])
+        if self.tracker == "mil" and self.session is not None:
+            # Die MIL-Tracker werden auf dem zuletzt verarbeiteten Bild neu angelegt
+            from solar_tracking.image_processing import image_processing_fits
+
+            self.session.resume(image_processing_fits(self.directory / self._last_name, memmap=self.memmap,
+                                                      cache=self.cache))
+        self._save_finished()
+        print(f"Setze die Beobachtung nach {self.n_frames} Bildern fort.")
+
+    def _read_finished_omegas(self) -> dict:
+        """
+        Rotationsraten der abgeschlossenen Spots aus watch_omega.csv. Die Datei wird vor
+        dem Checkpoint geschrieben; Spots, die erst nach ihm entstanden sind, fallen weg.
+        """
+        path = self.directory / "watch_omega.csv"
+        if not path.exists():
+            return {}
+        omegas = {}
+        for line in path.read_text().splitlines()[1:]:
+            spot, lat, omega, omega_err, frames, _ = line.split(",")
+            if int(spot) < self._next_id:
+                omegas[int(spot)] = (int(spot), float(lat), float(omega), float(omega_err), int(frames), False)
+        return omegas
+
+    @property
+    def n_frames(self) -> int:
+        return self._n_frames
+
+    def pending(self) -> list:
+        """
+        Neue, vollständig geschriebene FITS-Dateien, nach Namen sortiert.
+
+        Der Ordner wird nur gelesen, wenn sich seine Änderungszeit seit der letzten
+        Durchsicht geändert hat (neue, umbenannte oder gelöschte Dateien). Verspätete
+        Dateien, die vor der zuletzt verarbeiteten einsortiert werden, werden einmal gemeldet.
+        """
+        mtime = self.directory.stat().st_mtime_ns
+        if self._listing is None or mtime != self._listing_mtime:
+            listing = sorted(entry.name for entry in os.scandir(self.directory) if entry.name.endswith(".fits"))
+            known = self._listed if self._listing is None else set(self._listing)
+            for name in listing:
+                if name < self._last_name and name not in known:
+                    print(f"Warnung: {name} ist älter als das zuletzt verarbeitete Bild und wird übersprungen.")
+            self._listing = listing
+            # Eine Änderung in derselben Zeitscheibe wie mtime wäre nicht zu erkennen, daher
+            # wird eine Änderungszeit aus der letzten Sekunde nicht als Stand übernommen
+            self._listing_mtime = mtime if time.time_ns() - mtime > 1_000_000_000 else None
+        paths = []
+        for name in self._listing[bisect.bisect_right(self._listing, self._last_name):]:
+            path = self.directory / name
+            if not _is_complete(path):
+                break
+            paths.append(path)
+        return paths
+
+    def poll(self) -> int:
+        """
+        Verarbeitet alle neuen Dateien, speichert abgeschlossene Spots und die Rotationsraten.
+
+        Returns:
+            int: Anzahl der verarbeiteten Bilder
+        """
+        from solar_tracking.image_processing import image_processing_fits
+
+        processed = []
+        for path in self.pending():
+            try:
+                row = read_header_row(path)
+            except (OSError, ValueError):
+                break  # noch nicht vollständig geschrieben, nächste Abfrage
+            image = image_processing_fits(path, memmap=self.memmap, cache=self.cache)
+            self._process(path.name, row, image)
+            processed.append(path.name)
+        if processed:
+            with open(self.directory / "names.txt", "a") as f:
+                f.write("".join(f"{name}\n" for name in processed if name not in self._listed))
+            self._listed.update(processed)
+            self._commit()
+        return len(processed)
+
+    def close(self):
+        """
+        Schließt alle aktiven Spots ab, speichert sie und den Header-Index.
+
+        Ein danach neu gestarteter Watcher setzt nach dem letzten Bild mit einer
+        neuen Detektion fort.
+        """
+        for spot_id in list(self._spots):
+            self._finish(spot_id)
+        self.session = None
+        self._commit()
+        if self._rows:
+            self._save_header_index()
+
+    def _save_header_index(self):
+        """Ergänzt 'header_index.npz' um die Header der in diesem Prozess verarbeiteten Bilder."""
+        index_file = self.directory / "header_index.npz"
+        rows = {}
+        if index_file.exists():
+            with np.load(index_file) as data:
+                if data["rows"].dtype == self._rows[self._last_name].dtype:
+                    rows = dict(zip(data["names"].tolist(), data["rows"]))
+        rows.update(self._rows)
+        names = sorted(rows)
+        save_header_index(index_file, names, np.stack([rows[name] for name in names]))
+
+    @property
+    def omegas(self) -> np.ndarray:
+        """Aktuelle Rotationsraten aller Spots (OMEGA_DTYPE), nach Spot-ID sortiert."""
+        rows = np.zeros(len(self._omegas), dtype=OMEGA_DTYPE)
+        for i, spot_id in enumerate(sorted(self._omegas)):
+            rows[i] = self._omegas[spot_id]
+        return rows
+
+    def _process(self, name: str, row: np.ndarray, image: np.ndarray):
+        """Führt Tracking und Detektion um ein Bild weiter."""
+        from solar_tracking.sunspot_detection import _detect_spots
+
+        frame = self._n_frames
+        self._n_frames += 1
+        self._last_name = name
+        self._rows[name] = row
+        if frame == 0:
+            self._date0 = row["date_obs"]
+        if frame == 0 or np.isnat(row["date_obs"]) or np.isnat(self._date0):
+            self._hours.append(float(frame))  # ohne DATE-OBS eine Stunde pro Bild
+        else:
+            self._hours.append((row["date_obs"] - self._date0) / np.timedelta64(1, "h"))
+
+        if self.session is None:
+            self._start_session(row, image)
+            added = [track["spot"] for track in self.session.tracks]
+        else:
+            with profiling.stage("tracker_update"):
+                self.session.update(image)
+            added = []
+            if frame % self.detect_every == 0:
+                if self.tracker == "link":
+                    boxes, centroids = self.session.detections
+                else:
+                    boxes, centroids, _ = _detect_spots(image, self.sun_radius, self.sun_center,
+                                                        **self.detection_kwargs)
+                added = self._add_new_spots(image, boxes, centroids)
+        self._record(frame, row, set(added))
+        for track in self.session.tracks:
+            if not track["success"]:
+                self._finish(track["spot"])
+        self.session.drop_lost()
+
+    def _commit(self):
+        """
+        Schreibt die Rotationsraten, speichert den Zustand (Checkpoint) und danach die
+        abgeschlossenen Spots; zuletzt werden die nicht mehr gebrauchten Zeitpunkte verworfen.
+        """
+        from solar_tracking.track_store import TrackStore
+
+        if self._finished and self._batch is None:
+            self._batch = TrackStore.new_chunk_name(self.trace)
+        self._write_omegas()
+        # Die Raten abgeschlossener Spots stehen schon in watch_omega.csv
+        active = {spot_id: row for spot_id, row in self._omegas.items() if spot_id in self._spots}
+        save_checkpoint(self._checkpoint_file, tracker=self.tracker, _omegas=active,
+                        **{key: getattr(self, key) for key in STATE_KEYS})
+        self._save_finished()
+        # Die Sessions lesen nur das aktuelle und das nächste Bild, die Spots ab ihrem Start
+        self._hours.trim(min((spot["start"] for spot in self._spots.values()), default=self._n_frames - 1))
+
+    def _start_session(self, row: np.ndarray, image: np.ndarray):
+        from solar_tracking.linking import drift_direction
+        from solar_tracking.sunspot_detection import find_spots_and_boxes
+        from solar_tracking.tracking import _create_session
+
+        self.sun_radius, self.sun_center, _ = index_sun_infos(row[None])
+        bbox, centroids = find_spots_and_boxes(image, self.sun_radius, self.sun_center, **self.detection_kwargs)
+        # Nach close und erneutem Start beginnt die Session nicht beim ersten Bild
+        frame = self._n_frames - 1
+        options = {}
+        if self.tracker in ("link", "roi"):
+            # frame_hours wächst mit jedem Bild, die Session liest nur bereits bekannte Zeitpunkte
+            options = {"sun_radius": self.sun_radius, "sun_center": self.sun_center,
+                       "frame_hours": _SessionHours(self._hours, frame),
+                       "direction": drift_direction(crota2=row["crota2"])}
+            if self.tracker == "link":
+                options["detection_kwargs"] = self.detection_kwargs
+        spot_ids = range(self._next_id, self._next_id + len(bbox))
+        self._next_id += len(bbox)
+        self.session = _create_session(self.tracker, image, bbox, centroids, spot_ids, **options)
+        for spot_id in spot_ids:
+            self._spots[spot_id] = {"start": frame, "positions": [], "last_lon": None, "lat_sum": 0.0,
+                                    "sums": np.zeros(6), "t0": self._hours[frame]}
+
+    def _add_new_spots(self, image: np.ndarray, boxes, centroids) -> list:
+        """Nimmt Detektionen auf, in deren Box keiner der aktiven Spots liegt."""
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        centroids = np.asarray(centroids, dtype=float).reshape(-1, 2)
+        active = np.array([(track["x2"], track["y2"]) for track in self.session.tracks
+                           if track["success"]], dtype=float).reshape(-1, 2)
+        inside = ((active[None, :, 0] >= boxes[:, None, 0]) & (active[None, :, 0] <= boxes[:, None, 0] + boxes[:, None, 2])
+                  & (active[None, :, 1] >= boxes[:, None, 1]) & (active[None, :, 1] <= boxes[:, None, 1] + boxes[:, None, 3]))
+        new = ~inside.any(axis=1)
+        if not new.any():
+            return []
+        spot_ids = list(range(self._next_id, self._next_id + int(new.sum())))
+        self._next_id += len(spot_ids)
+        self.session.add_spots(image, boxes[new].astype(int), centroids[new], spot_ids)
+        frame = self._n_frames - 1
+        for spot_id in spot_ids:
+            self._spots[spot_id] = {"start": frame, "positions": [], "last_lon": None, "lat_sum": 0.0,
+                                    "sums": np.zeros(6), "t0": self._hours[frame]}
+        return spot_ids
+
+    def _record(self, frame: int, row: np.ndarray, added: set):
+        """Hängt die Positionen der aktiven Spots an und schreibt ihre Summen für omega fort."""
+        from solar_tracking.rotation_analysis import cal_lon_and_lat_header
+
+        points = []
+        for track in self.session.tracks:
+            spot = self._spots[track["spot"]]
+            if track["spot"] in added:
+                points.append((track["spot"], track["x1"], track["y1"]))
+            elif track["success"]:
+                points.append((track["spot"], track["x2"], track["y2"]))
+            else:
+                spot["positions"].append((np.nan, np.nan))
+        if not points:
+            return
+        spot_ids, x, y = zip(*points)
+        lat, lon = cal_lon_and_lat_header(np.array(x, dtype=float), np.array(y, dtype=float), row)
+        t = self._hours[frame]
+        for spot_id, xi, yi, b, l in zip(spot_ids, x, y, lat, lon):
+            spot = self._spots[spot_id]
+            spot["positions"].append((xi, yi))
+            if np.isnan(l):
+                continue
+            if spot["last_lon"] is None:
+                spot["lon0"] = spot["last_lon"] = l
+            else:
+                # Entfaltung um 360° relativ zur letzten gültigen Länge
+                spot["last_lon"] += (l - spot["last_lon"] + 180) % 360 - 180
+            dt, dl = t - spot["t0"], spot["last_lon"] - spot["lon0"]
+            spot["sums"] += (1.0, dt, dl, dt * dt, dt * dl, dl * dl)
+            spot["lat_sum"] += b
+            self._update_omega(spot_id, active=True)
+
+    def _update_omega(self, spot_id: int, active: bool):
+        spot = self._spots[spot_id]
+        n = int(spot["sums"][0])
+        omega, omega_err = _rate(spot["sums"])
+        lat = spot["lat_sum"] / n if n else np.nan
+        self._omegas[spot_id] = (spot_id, lat, omega, omega_err, n, active)
+
+    def _finish(self, spot_id: int):
+        """Schließt einen Spot ab; gespeichert wird er mit der nächsten Abfrage."""
+        spot = self._spots.pop(spot_id)
+        positions = np.array(spot["positions"], dtype=float).reshape(-1, 2)
+        valid = np.flatnonzero(~np.isnan(positions[:, 0]))
+        if spot_id in self._omegas:
+            self._omegas[spot_id] = self._omegas[spot_id][:-1] + (False,)
+        if len(valid) < self.min_frames:
+            return
+        # Nachlaufende Bilder ohne Position gehören nicht mehr zur Trajektorie
+        positions = positions[:valid[-1] + 1]
+        self._finished.append({"spot": spot_id, "start": spot["start"],
+                               "x1": positions[0, 0], "y1": positions[0, 1],
+                               "x2": positions[-1, 0], "y2": positions[-1, 1],
+                               "delta_time": self._hours[spot["start"] + valid[-1]] - self._hours[spot["start"]],
+                               "positions": positions})
+
+    def _save_finished(self):
+        """Hängt die abgeschlossenen Spots als ein Block an den TrackStore und an data_points.csv an."""
+        from solar_tracking.track_store import TrackStore
+
+        if not self._finished:
+            return
+        data_file = self.directory / "data_points.csv"
+        if self._store is None:
+            self._store = TrackStore()
+            self._store.import_legacy_csv(self.trace, data_file)
+        start = min(spot["start"] for spot in self._finished)
+        end = max(spot["start"] + len(spot["positions"]) for spot in self._finished)
+        tracks = []
+        for spot in self._finished:
+            trajectory = np.full((end - start, 2), np.nan)
+            offset = spot["start"] - start
+            trajectory[offset:offset + len(spot["positions"])] = spot["positions"]
+            tracks.append({key: spot[key] for key in ("spot", "x1", "y1", "x2", "y2")}
+                          | {"trajectory": trajectory})
+        delta_time = np.array([spot["delta_time"] for spot in self._finished])
+        try:
+            chunk = self._store.append(self.trace, tracks, delta_time, time_hours=self._hours[start:end],
+                                       name=self._batch)
+            self._store.append_csv(self.trace, chunk, data_file)
+        except FileExistsError:
+            pass  # schon vor einem Abbruch gespeichert
+        self._finished = []
+        self._batch = None
+
+    def _write_omegas(self):
+        """Schreibt die Rotationsraten aller Spots atomar nach 'watch_omega.csv'."""
+        rows = self.omegas
+        path = self.directory / "watch_omega.csv"
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        np.savetxt(str(tmp_path), np.column_stack([rows[key] for key in OMEGA_DTYPE.names]).reshape(-1, 6),
+                   delimiter=",", header=OMEGA_HEADER, comments="", fmt=["%d", "%.6f", "%.6f", "%.6f", "%d", "%d"])
+        os.replace(tmp_path, path)
+
+
+def watch_trace(trace: int, interval: float = 60.0, polls: int = None, **kwargs) -> TraceWatcher:
+    """
+    Beobachtet den Ordner einer Trace-Serie und verfolgt neue Bilder, bis zum Abbruch mit Strg+C.
+
+    Args:
+        trace (int): Nummer der Trace-Serie
+        interval (float): Sekunden zwischen zwei Abfragen
+        polls (int, optional): nach so vielen Abfragen beenden (Standard: unbegrenzt)
+        **kwargs: weitere Argumente von TraceWatcher
+
+    Returns:
+        TraceWatcher: der abgeschlossene Watcher (z. B. für omegas)
+    """
+    watcher = TraceWatcher(trace, **kwargs)
+    count = 0
+    try:
+        while polls is None or count < polls:
+            n_new = watcher.poll()
+            if n_new:
+                print(f"Trace {trace}: {n_new} neue Bilder, {watcher.n_frames} insgesamt, "
+                      f"{len(watcher.session.tracks)} aktive Spots.")
+            count += 1
+            if polls is None or count < polls:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Beobachtung beendet.")
+    finally:
+        watcher.close()
+    return watcher
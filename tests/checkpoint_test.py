@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from solar_tracking import image_processing, tracking
+from solar_tracking.checkpoint import checkpoint_path, load_checkpoint
+from solar_tracking.roi_tracking import RoiTrackingSession
+from solar_tracking.synthetic import write_synthetic_trace
+from solar_tracking.track_store import TrackStore
+
+
+@pytest.fixture
+def trace(tmp_path, monkeypatch):
+    """Synthetische Serie 'data/TR_01' mit 8 Bildern im Arbeitsverzeichnis tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    paths, _, _, _ = write_synthetic_trace(tmp_path / "data" / "TR_01", n_frames=8, size=1024, cadence=6)
+    return paths
+
+
+def _count_decodes(monkeypatch):
+    decoded = []
+    original = image_processing.image_processing_fits
+
+    def counting(fits_path, *args, **kwargs):
+        decoded.append(fits_path.name)
+        return original(fits_path, *args, **kwargs)
+
+    monkeypatch.setattr(image_processing, "image_processing_fits", counting)
+    monkeypatch.setattr(tracking, "image_processing_fits", counting)
+    return decoded
+
+
+def test_resume_continues_after_checkpoint(trace, monkeypatch):
+    """
+    Testet, ob ein abgebrochener Lauf nach dem letzten Checkpoint fortgesetzt wird,
+    ohne die verfolgten Bilder erneut zu dekodieren, und dasselbe Ergebnis liefert.
+    """
+    expected = tracking.run_tracking(1, interactive=False, tracker="roi")
+    for chunk in TrackStore().chunks():
+        chunk.unlink()
+    (trace[0].parent / "data_points.csv").unlink()
+
+    update = RoiTrackingSession.update
+
+    def killed_at_frame_6(self, image):
+        if self.n_frames == 6:
+            raise KeyboardInterrupt
+        return update(self, image)
+
+    monkeypatch.setattr(RoiTrackingSession, "update", killed_at_frame_6)
+    with pytest.raises(KeyboardInterrupt):
+        tracking.run_tracking(1, interactive=False, tracker="roi", checkpoint_every=2)
+    state = load_checkpoint(checkpoint_path(1))
+    assert state["frame"] == 5 and state["trajectory"].n_frames == 6
+    assert len(TrackStore().read(trace=1)) == 0
+
+    monkeypatch.setattr(RoiTrackingSession, "update", update)
+    decoded = _count_decodes(monkeypatch)
+    resumed = tracking.run_tracking(1, interactive=False, tracker="roi", checkpoint_every=2, resume=True)
+    assert decoded == [path.name for path in trace[6:]]
+    assert not checkpoint_path(1).exists()
+
+    assert [track["spot"] for track in resumed] == [track["spot"] for track in expected]
+    for a, b in zip(resumed, expected):
+        assert (a["x2"], a["y2"]) == (b["x2"], b["y2"])
+        np.testing.assert_array_equal(a["trajectory"], b["trajectory"])
+    rows, positions, time = next(TrackStore().trajectories(trace=1))
+    assert positions.shape[0] == 8 and np.all(rows["delta_time"] == 42)
+
+
+def test_resume_mil_and_mismatch(trace, monkeypatch):
+    """Testet das Fortsetzen mit neu angelegten MIL-Trackern und die Prüfung des Checkpoints."""
+    update = tracking.TrackingSession.update
+
+    def killed_at_frame_4(self, image):
+        if self.n_frames == 4:
+            raise KeyboardInterrupt
+        return update(self, image)
+
+    monkeypatch.setattr(tracking.TrackingSession, "update", killed_at_frame_4)
+    with pytest.raises(KeyboardInterrupt):
+        tracking.run_tracking(1, interactive=False, tracker="mil", checkpoint_every=2)
+    monkeypatch.setattr(tracking.TrackingSession, "update", update)
+
+    with pytest.raises(ValueError):
+        tracking.run_tracking(1, interactive=False, tracker="roi", resume=True)
+
+    decoded = _count_decodes(monkeypatch)
+    accepted = tracking.run_tracking(1, interactive=False, tracker="mil", resume=True)
+    assert decoded == [path.name for path in trace[3:]]  # Bild des Checkpoints und die folgenden
+    assert accepted and all(len(track["trajectory"]) == 8 for track in accepted)
+    assert not checkpoint_path(1).exists()
+
+
+def test_checkpoint_with_mil_workers_rejected_before_decoding(trace, monkeypatch):
+    """Testet, ob Checkpoints mit MIL und mehreren Prozessen abgelehnt werden, bevor Header oder Bilder gelesen werden."""
+    decoded = _count_decodes(monkeypatch)
+    monkeypatch.setattr(tracking, "trace_header_index", lambda *args, **kwargs: 1 / 0)
+    with pytest.raises(ValueError):
+        tracking.run_tracking(1, interactive=False, tracker="mil", workers=2, checkpoint_every=2)
+    assert decoded == []
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("cv2", "sunpy", "matplotlib", "astropy", "scipy")
+
+# Führt die CLI in einem frischen Interpreter aus und gibt die geladenen schweren Module aus
+_SCRIPT = """
+import sys
+from solar_tracking import cli
+{setup}
+sys.argv = ["solar-tracking"] + {argv!r}
+try:
+    cli.main()
+except SystemExit:
+    pass
+print("LOADED", sorted(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def _loaded_modules(argv, setup="", modules=HEAVY_MODULES):
+    script = _SCRIPT.format(setup=setup, argv=argv, heavy=modules)
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    return output.rsplit("LOADED", 1)[1].strip()
+
+
+@pytest.mark.parametrize("argv", [["--help"], ["run_tracking", "--help"], ["detect_spots", "--help"],
+                                  ["downloader", "--help"], ["view_fits", "--help"], ["watch", "--help"]])
+def test_help_imports_no_heavy_modules(argv):
+    """Testet, ob die Hilfe ohne OpenCV, astropy, sunpy, matplotlib und scipy auskommt."""
+    assert _loaded_modules(argv) == "[]"
+
+
+def test_downloader_imports_only_what_it_needs():
+    """Testet, ob der Downloader-Befehl weder OpenCV noch matplotlib oder sunpy.map lädt."""
+    setup = ("import solar_tracking.downloader as downloader\n"
+             "downloader.download_fits = lambda *args, **kwargs: []")
+    loaded = _loaded_modules(["downloader", "--start", "2023-11-23 00:00:00", "--end", "2023-11-23 01:00:00"],
+                             setup, modules=("cv2", "matplotlib", "sunpy.map"))
+    assert loaded == "[]"
@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def synthetic_test_fits(tmp_path_factory):
+    """
+    Ordner mit einer synthetischen 'test.fits' (100x100 Pixel, Sonnenmittelpunkt (50, 50)),
+    wie sie test_process_fit und test_sun_infos erwarten.
+    """
+    from solar_tracking.synthetic import synthetic_header, render_disk, write_synthetic_fits
+
+    directory = tmp_path_factory.mktemp("fits")
+    header = synthetic_header(size=100)
+    write_synthetic_fits(directory / "test.fits", header, render_disk(header, noise=0))
+    return directory
+
+
+@pytest.fixture(autouse=True)
+def _test_fits_cwd(request, monkeypatch):
+    """Führt die Tests in einem Ordner mit 'test.fits' aus, falls keine echte Datei vorhanden ist."""
+    from pathlib import Path
+
+    if not Path("test.fits").exists():
+        monkeypatch.chdir(request.getfixturevalue("synthetic_test_fits"))
@@ -1,10 +1,11 @@
 import os
+import numpy as np
 import pytest
 from sunpy.net import Fido, attrs as a
 from astropy import units as u
 
 # Importiere hier deine Funktion. Passe den Modulpfad an:
-from solar_tracking.downloader import download_fits
+from solar_tracking.downloader import FitsIndex, download_fits
 
 
 # --- Fake-Funktionen für Fido.search und Fido.fetch ---
@@ -85,3 +86,123 @@ def test_download_fits_invalid_instrument():
         download_fits(start_time, end_time, invalid_instrument, sample_seperation=1)
         
     assert "Ungültiges Instrument" in str(excinfo.value)
+
+
+# --- Stand-in für Fido mit echten Suchergebnissen ---
+
+class FakeFido:
+    """
+    Ersetzt Fido.search und Fido.fetch: Die Suche liefert eine UnifiedResponse mit
+    einem Datensatz pro Stunde, fetch schreibt pro Datensatz eine Datei.
+    """
+    def __init__(self, failures=()):
+        self.fetched = []
+        self.failures = list(failures)  # fileids, deren erster Versuch fehlschlägt
+
+    def search(self, time_range, *args, **kwargs):
+        from astropy.time import Time
+        from sunpy.net.base_client import QueryResponseTable
+        from sunpy.net.fido_factory import UnifiedResponse
+
+        times = Time(np.arange(time_range.start.jd, time_range.end.jd, 1 / 24), format="jd")
+        table = QueryResponseTable({"Start Time": times,
+                                    "Instrument": ["HMI"] * len(times),
+                                    "Physobs": ["intensity"] * len(times),
+                                    "fileid": [f"hmi_{t.strftime('%Y%m%d_%H%M')}" for t in times]})
+        return UnifiedResponse(table)
+
+    def fetch(self, record, path, **kwargs):
+        fileid = record[0]["fileid"]
+        if fileid in self.failures:
+            self.failures.remove(fileid)
+            raise ConnectionError("Verbindung abgebrochen")
+        self.fetched.append(fileid)
+        file_path = path.format(file=f"{fileid}.fits")
+        with open(file_path, "w") as f:
+            f.write(fileid)
+        return [file_path]
+
+
+def test_download_fits_reuses_index(monkeypatch, tmp_path):
+    """
+    Testet, ob sich überschneidende Zeiträume nur die fehlenden Datensätze laden und
+    die vorhandenen per Hardlink übernommen werden; ein fehlgeschlagener Versuch wird wiederholt.
+    """
+    fake = FakeFido(failures=["hmi_20231025_0200"])
+    monkeypatch.setattr(Fido, "search", fake.search)
+    monkeypatch.setattr(Fido, "fetch", fake.fetch)
+    monkeypatch.setattr(os, "getcwd", lambda: str(tmp_path))
+
+    first = download_fits("2023-10-25 00:00:00", "2023-10-25 04:00:00", "hmi", 1, max_conn=3)
+    assert sorted(fake.fetched) == [f"hmi_20231025_{h:02d}00" for h in range(4)]
+
+    fake.fetched.clear()
+    second = download_fits("2023-10-25 02:00:00", "2023-10-25 06:00:00", "hmi", 1, max_conn=3)
+    assert sorted(fake.fetched) == ["hmi_20231025_0400", "hmi_20231025_0500"]
+
+    assert [os.path.basename(p) for p in second] == [f"hmi_20231025_{h:02d}00.fits" for h in range(2, 6)]
+    assert os.path.dirname(first[0]).endswith("TR_01") and os.path.dirname(second[0]).endswith("TR_02")
+    assert os.path.samefile(first[2], second[0])
+    names = (tmp_path / "data" / "TR_02" / "names.txt").read_text().split()
+    assert names == [os.path.basename(p) for p in second]
+
+
+def test_download_fits_resumes_after_failure(monkeypatch, tmp_path):
+    """Testet, ob nach einem abgebrochenen Download nur die fehlenden Datensätze geladen werden."""
+    fake = FakeFido(failures=["hmi_20231025_0100"] * 2)
+    monkeypatch.setattr(Fido, "search", fake.search)
+    monkeypatch.setattr(Fido, "fetch", fake.fetch)
+    monkeypatch.setattr(os, "getcwd", lambda: str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        download_fits("2023-10-25 00:00:00", "2023-10-25 03:00:00", "hmi", 1, retries=1)
+    assert sorted(fake.fetched) == ["hmi_20231025_0000", "hmi_20231025_0200"]
+
+    fake.fetched.clear()
+    files = download_fits("2023-10-25 00:00:00", "2023-10-25 03:00:00", "hmi", 1, retries=1)
+    assert fake.fetched == ["hmi_20231025_0100"]
+    assert len(files) == 3 and all(os.path.exists(p) for p in files)
+
+
+def test_download_fits_no_trace_folder_after_failure(monkeypatch, tmp_path):
+    """Testet, ob ein fehlgeschlagener Download keinen Trace-Ordner anlegt und der erneute Aufruf TR_01 verwendet."""
+    fake = FakeFido(failures=["hmi_20231025_0100"] * 2)
+    monkeypatch.setattr(Fido, "search", fake.search)
+    monkeypatch.setattr(Fido, "fetch", fake.fetch)
+    monkeypatch.setattr(os, "getcwd", lambda: str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        download_fits("2023-10-25 00:00:00", "2023-10-25 03:00:00", "hmi", 1, retries=1)
+    assert not list((tmp_path / "data").glob("TR_*"))
+
+    files = download_fits("2023-10-25 00:00:00", "2023-10-25 03:00:00", "hmi", 1, retries=1)
+    assert [p.name for p in (tmp_path / "data").glob("TR_*")] == ["TR_01"]
+    assert all(os.path.dirname(p).endswith("TR_01") for p in files)
+
+
+def test_fits_index_concurrent_calls(monkeypatch, tmp_path):
+    """
+    Testet, ob zwei Indexe auf demselben Ordner ihre Datensätze nicht gegenseitig
+    überschreiben, der Index einmal pro Aufruf gespeichert wird und laufende
+    Downloads anderer Aufrufe in '.partial' erhalten bleiben.
+    """
+    store = tmp_path / "data" / ".fits_store"
+    first, second = FitsIndex(str(store)), FitsIndex(str(store))
+    for index, name in ((first, "a.fits"), (second, "b.fits")):
+        (tmp_path / name).write_text(name)
+        index.add(name, str(tmp_path / name))
+        index.save()
+    merged = FitsIndex(str(store))
+    assert os.path.exists(merged.get("a.fits")) and os.path.exists(merged.get("b.fits"))
+
+    foreign = store / ".partial" / "anderer_aufruf"
+    foreign.mkdir(parents=True)
+    (foreign / "laufend.fits").write_text("")
+    fake = FakeFido()
+    monkeypatch.setattr(Fido, "search", fake.search)
+    monkeypatch.setattr(Fido, "fetch", fake.fetch)
+    monkeypatch.setattr(os, "getcwd", lambda: str(tmp_path))
+    download_fits("2023-10-25 00:00:00", "2023-10-25 04:00:00", "hmi", 1, max_conn=2)
+    assert (foreign / "laufend.fits").exists()
+    assert len(list(store.glob("index-*.json"))) == 3
+    assert len(fake.fetched) == 4
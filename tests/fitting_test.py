@@ -0,0 +1,64 @@
+
+import numpy as np
+import pytest
+from scipy.optimize import curve_fit
+
+from solar_tracking.fitting import fit_func, fit_linear, perform_bootstrap_fitting, perform_fitting
+
+
+def _rotation_data(n=200, seed=0, outliers=0):
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(-35, 35, n)
+    omega = fit_func(lat, 14.5, -2.8) + rng.normal(0, 0.3, n)
+    omega[:outliers] += 8
+    return lat, omega
+
+
+def test_perform_fitting_matches_curve_fit():
+    """Testet, ob der lineare Löser ohne Gewichte dieselben Parameter liefert wie curve_fit."""
+    lat, omega = _rotation_data()
+
+    popt, r_squared = perform_fitting(lat, omega)
+    reference, _ = curve_fit(fit_func, lat, omega)
+
+    np.testing.assert_allclose(popt, reference, rtol=1e-6)
+    assert 0 < r_squared <= 1
+
+
+def test_fit_linear_weights_and_batches():
+    """Testet Gewichte (wie curve_fit mit sigma) und das gleichzeitige Lösen mehrerer Datensätze."""
+    lat, omega = _rotation_data()
+    sigma = np.linspace(0.1, 1.0, len(lat))
+
+    reference, _ = curve_fit(fit_func, lat, omega, sigma=sigma)
+    np.testing.assert_allclose(fit_linear(lat, omega, weights=1 / sigma**2), reference, rtol=1e-6)
+
+    batch = fit_linear(np.stack([lat, lat[::-1]]), np.stack([omega, omega[::-1] + 1]))
+    np.testing.assert_allclose(batch[1] - batch[0], [1, 0], atol=1e-9)
+
+
+def test_huber_fit_is_robust():
+    """Testet, ob die Huber-Verlustfunktion Ausreißer unterdrückt."""
+    lat, omega = _rotation_data(outliers=20)
+
+    plain = fit_linear(lat, omega)
+    robust = fit_linear(lat, omega, loss="huber")
+
+    assert abs(plain[0] - 14.5) > 0.5
+    assert abs(robust[0] - 14.5) < 0.15 and abs(robust[1] + 2.8) < 0.5
+    with pytest.raises(ValueError):
+        fit_linear(lat, omega, loss="cauchy")
+
+
+def test_perform_bootstrap_fitting():
+    """Testet die Bootstrap-Unsicherheit gegen die Kovarianz von curve_fit und die Reproduzierbarkeit."""
+    lat, omega = _rotation_data(n=500)
+
+    popt, perr, samples = perform_bootstrap_fitting(lat, omega, n_bootstrap=2000, seed=1, chunk_size=300)
+    _, pcov = curve_fit(fit_func, lat, omega)
+
+    assert samples.shape == (2000, 2)
+    np.testing.assert_allclose(popt, perform_fitting(lat, omega)[0])
+    np.testing.assert_allclose(perr, np.sqrt(np.diag(pcov)), rtol=0.15)
+    _, perr_again, _ = perform_bootstrap_fitting(lat, omega, n_bootstrap=2000, seed=1)
+    np.testing.assert_allclose(perr_again, perr)
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+from astropy.io import fits
+
+from solar_tracking import image_processing
+from solar_tracking.frame_cache import FrameCache
+from solar_tracking.image_processing import image_processing_fits
+
+
+def _write_fits(path, value=1.0, shape=(32, 32)):
+    data = np.zeros(shape, dtype=np.float32)
+    data[0, 0] = value
+    data[-1, -1] = 2 * value
+    fits.HDUList([fits.PrimaryHDU(), fits.CompImageHDU(data, compression_type="RICE_1")]).writeto(path, overwrite=True)
+
+
+def test_cache_skips_decoding_on_second_run(monkeypatch, tmp_path):
+    """Testet, ob ein zweiter Aufruf das Bild aus dem Cache liest, ohne die FITS-Datei zu öffnen."""
+    path = tmp_path / "frame.fits"
+    _write_fits(path)
+    cache = FrameCache(tmp_path / "cache")
+
+    first = image_processing_fits(path, cache=cache)
+
+    def no_open(*args, **kwargs):
+        raise AssertionError("Die FITS-Datei darf bei einem Cache-Treffer nicht geöffnet werden.")
+
+    monkeypatch.setattr(image_processing.fits, "open", no_open)
+    second = image_processing_fits(path, cache=cache)
+
+    assert isinstance(second, np.memmap)
+    assert np.array_equal(first, second)
+
+
+def test_cache_key_changes_with_file(tmp_path):
+    """Testet, ob eine geänderte Datei und ein anderer Data-Layer eigene Schlüssel bekommen."""
+    path = tmp_path / "frame.fits"
+    _write_fits(path)
+    cache = FrameCache(tmp_path / "cache")
+    key = cache.key(path)
+
+    assert cache.key(path, data_layer=0) != key
+    _write_fits(path, value=3.0, shape=(40, 40))
+    os.utime(path, ns=(0, 10**9))
+    assert cache.key(path) != key
+
+    hashed = FrameCache(tmp_path / "cache", hash_content=True)
+    assert hashed.key(path) != cache.key(path)
+    assert hashed.get(path) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Testet die LRU-Verdrängung, wenn der Cache zu groß wird."""
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"frame_{i}.fits"
+        _write_fits(path, value=i + 1.0)
+        paths.append(path)
+    image = np.zeros((32, 32), dtype=np.uint8)
+    entry_size = 32 * 32 + 128  # Daten plus .npy-Header
+    cache = FrameCache(tmp_path / "cache", max_bytes=2 * entry_size)
+
+    cache.put(paths[0], image)
+    cache.put(paths[1], image)
+    # frame_0 wird benutzt, damit frame_1 der älteste Eintrag ist
+    os.utime(cache._path(cache.key(paths[1])), ns=(0, 0))
+    assert cache.get(paths[0]) is not None
+    cache.put(paths[2], image)
+
+    assert cache.get(paths[0]) is not None
+    assert cache.get(paths[1]) is None
+    assert cache.get(paths[2]) is not None
+    assert cache.size() <= cache.max_bytes
+
+
+def test_cache_put_does_not_rescan(tmp_path, monkeypatch):
+    """Testet, ob put den Cache-Ordner nur beim ersten Mal und beim Überschreiten von max_bytes durchsucht."""
+    image = np.zeros((32, 32), dtype=np.uint8)
+    entry_size = 32 * 32 + 128
+    cache = FrameCache(tmp_path / "cache", max_bytes=3 * entry_size)
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or entries())
+
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"frame_{i}.fits"
+        _write_fits(path, value=i + 1.0)
+        paths.append(path)
+    for path in paths[:3]:
+        cache.put(path, image)
+    assert len(scans) == 1
+    cache.put(paths[0], image)  # Ersetzen ändert die Größe nicht
+    assert len(scans) == 1
+    cache.put(paths[3], image)
+    assert len(scans) == 2 and cache.size() <= cache.max_bytes
+
+
+def test_cache_shared_by_two_processes_respects_max_bytes(tmp_path):
+    """Testet, ob zwei Caches auf demselben Ordner (wie zwei Prozesse) zusammen unter max_bytes bleiben."""
+    image = np.zeros((32, 32), dtype=np.uint8)
+    entry_size = 32 * 32 + 128
+    caches = [FrameCache(tmp_path / "cache", max_bytes=3 * entry_size) for _ in range(2)]
+    for i in range(8):
+        path = tmp_path / f"frame_{i}.fits"
+        _write_fits(path, value=i + 1.0)
+        caches[i % 2].put(path, image)
+        assert caches[0].size() <= 3 * entry_size
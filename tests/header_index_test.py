@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from solar_tracking.header_index import (HEADER_INDEX_DTYPE, build_header_index, frame_hours, index_sun_infos,
+                                         read_header_row, trace_header_index)
+from solar_tracking.rotation_analysis import cal_lon_and_lat_header
+from solar_tracking.sunspot_detection import sun_infos
+from solar_tracking.synthetic import write_synthetic_trace
+from solar_tracking.track_store import TrackStore
+from solar_tracking.tracking import run_tracking
+
+
+@pytest.fixture
+def trace(tmp_path, monkeypatch):
+    """Synthetische Serie 'data/TR_01' mit 6 Stunden Abstand im Arbeitsverzeichnis tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    paths, headers, _, _ = write_synthetic_trace(tmp_path / "data" / "TR_01", n_frames=4, size=1024, cadence=6)
+    return paths, headers
+
+
+def test_read_header_row_matches_astropy(trace):
+    """Testet den Header-Parser gegen astropy (komprimiertes Bild, Zeit, Geometrie)."""
+    paths, headers = trace
+    row = read_header_row(paths[1])
+    header = fits.getheader(paths[1], 1)
+
+    assert row["date_obs"] == np.datetime64(header["DATE-OBS"], "ms")
+    assert row["naxis1"] == row["naxis2"] == header["NAXIS2"] == 1024
+    for key in ("CRPIX1", "CRPIX2", "CDELT1", "CROTA2", "RSUN_OBS", "DSUN_OBS", "CRLN_OBS", "CRLT_OBS"):
+        assert row[key.lower()] == header[key]
+    assert np.isnan(row["hgln_obs"]) == ("HGLN_OBS" not in header)
+    assert index_sun_infos(row[None]) == sun_infos(paths[1])
+
+
+def test_trace_index_cache_and_frame_hours(trace):
+    """Testet den gespeicherten Index, das erneute Lesen geänderter Dateien und die Zeitpunkte."""
+    paths, headers = trace
+    index = trace_header_index(1)
+    index_file = paths[0].parent / "header_index.npz"
+
+    assert index.dtype == HEADER_INDEX_DTYPE and len(index) == 4
+    np.testing.assert_allclose(frame_hours(index), [0, 6, 12, 18])
+    mtime = index_file.stat().st_mtime_ns
+    np.testing.assert_array_equal(trace_header_index(1), index)
+    assert index_file.stat().st_mtime_ns == mtime  # unverändert, nicht neu geschrieben
+
+    with fits.open(paths[2], mode="update") as hdul:
+        hdul[1].header["DATE-OBS"] = "2023-11-23T13:30:00.000"
+    os.utime(paths[2], ns=(mtime + 10**9, mtime + 10**9))
+    np.testing.assert_allclose(frame_hours(trace_header_index(1)), [0, 6, 13.5, 18])
+
+    # Ohne DATE-OBS eine Stunde pro Bild
+    no_dates = index.copy()
+    no_dates["date_obs"][1] = np.datetime64("NaT")
+    np.testing.assert_array_equal(frame_hours(no_dates), [0, 1, 2, 3])
+    assert len(build_header_index([], workers=4)) == 0
+
+
+def test_index_coordinates_and_run_tracking_times(trace):
+    """Testet cal_lon_and_lat_header mit dem Index und die echten Zeiten im TrackStore."""
+    paths, headers = trace
+    index = trace_header_index(1)
+    x, y = np.array([300.0, 700.0, 512.0]), np.array([400.0, 620.0, 512.0])
+    frames = np.array([0, 3, 2])
+
+    expected = cal_lon_and_lat_header(x, y, headers, frames)
+    np.testing.assert_allclose(cal_lon_and_lat_header(x, y, index, frames), expected)
+    np.testing.assert_allclose(cal_lon_and_lat_header(x, y, index[3]), cal_lon_and_lat_header(x, y, headers[3]))
+
+    accepted = run_tracking(trace=1, interactive=False, tracker="roi")
+    assert accepted
+    rows, _, time = next(TrackStore().trajectories(trace=1))
+    assert np.all(rows["delta_time"] == 18)
+    np.testing.assert_allclose(time, [0, 6, 12, 18])
@@ -19,4 +19,125 @@ def test_process_fit():
     assert normalized_image.max() == 255, "Maximum sollte 255 sein"
 
     # Zusätzliche Ausgabe
-    print("Test erfolgreich!")
\ No newline at end of file
+    print("Test erfolgreich!")
+
+def _write_fits(path, data):
+    """Schreibt ein Rice-komprimiertes Bild als zweite HDU, wie bei den HMI-Dateien."""
+    from astropy.io import fits
+    fits.HDUList([fits.PrimaryHDU(), fits.CompImageHDU(data, compression_type="RICE_1")]).writeto(path)
+
+
+def test_iter_frames_keeps_order(tmp_path):
+    """Testet, ob iter_frames die Bilder in der Reihenfolge der Serie liefert."""
+    from solar_tracking.image_processing import iter_frames
+
+    paths = []
+    for i in range(5):
+        data = np.zeros((16, 16), dtype=np.float32)
+        data[i, i] = 1.0  # Markiert das Bild eindeutig
+        path = tmp_path / f"frame_{i}.fits"
+        _write_fits(path, data)
+        paths.append(path)
+
+    frames = list(iter_frames(paths, prefetch=2))
+
+    assert len(frames) == 5
+    for i, frame in enumerate(frames):
+        assert frame.dtype == np.uint8
+        assert frame[i, i] == 255
+
+
+def test_iter_frames_raises_missing_file(tmp_path):
+    """Testet, ob Fehler aus dem Hintergrund-Thread beim Verbraucher ankommen."""
+    from solar_tracking.image_processing import iter_frames
+
+    path = tmp_path / "frame_0.fits"
+    _write_fits(path, np.ones((8, 8), dtype=np.float32))
+
+    frames = iter_frames([path, tmp_path / "missing.fits"], prefetch=1)
+    assert next(frames).shape == (8, 8)
+    with pytest.raises(FileNotFoundError):
+        next(frames)
+
+
+@pytest.mark.parametrize("kind", ["rice_float", "plain_float", "scaled_int"])
+def test_image_processing_fits_memmap_matches(tmp_path, kind):
+    """
+    Testet, ob der speicherschonende Loader (memmap=True) bis auf Rundung
+    dasselbe Bild liefert wie der Standardpfad, auch mit NaN, Big-Endian-Daten
+    und BSCALE/BZERO/BLANK.
+    """
+    from astropy.io import fits
+
+    rng = np.random.default_rng(1)
+    path = tmp_path / f"{kind}.fits"
+    if kind == "scaled_int":
+        raw = rng.integers(-2000, 30000, (300, 120)).astype(np.int32)
+        raw[5, 7] = -99999
+        hdu = fits.CompImageHDU(raw, compression_type="RICE_1")
+        hdu.header["BSCALE"] = 0.5
+        hdu.header["BZERO"] = 1000.0
+        hdu.header["BLANK"] = -99999
+    else:
+        data = (rng.random((300, 120)) * 5e4).astype(np.float32)
+        data[:10, :10] = np.nan
+        if kind == "rice_float":
+            hdu = fits.CompImageHDU(data, compression_type="RICE_1")
+        else:
+            hdu = fits.ImageHDU(data)
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(path)
+
+    reference = image_processing_fits(path)
+    fused = image_processing_fits(path, memmap=True)
+
+    assert fused.dtype == np.uint8
+    assert fused.min() == 0 and fused.max() == 255
+    assert np.abs(fused.astype(int) - reference.astype(int)).max() <= 1
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_load_trace_frames_in_order(monkeypatch, tmp_path, executor):
+    """Testet, ob load_trace_frames parallel dekodiert und trotzdem in Reihenfolge liefert."""
+    from solar_tracking.image_processing import load_trace_frames
+
+    trace_dir = tmp_path / "data" / "TR_03"
+    trace_dir.mkdir(parents=True)
+    names = []
+    for i in range(6):
+        data = np.zeros((16, 16), dtype=np.float32)
+        data[i, i] = 1.0
+        _write_fits(trace_dir / f"frame_{i}.fits", data)
+        names.append(f"frame_{i}.fits")
+    (trace_dir / "names.txt").write_text("\n".join(names))
+    monkeypatch.chdir(tmp_path)
+
+    frames = list(load_trace_frames(3, workers=3, executor=executor))
+
+    assert len(frames) == 6
+    for i, frame in enumerate(frames):
+        assert frame[i, i] == 255
+
+
+def test_load_trace_frames_bounds_in_flight(monkeypatch, tmp_path):
+    """Testet, ob nie mehr als max_in_flight Bilder gleichzeitig unterwegs sind."""
+    from solar_tracking import image_processing
+
+    trace_dir = tmp_path / "data" / "TR_01"
+    trace_dir.mkdir(parents=True)
+    (trace_dir / "names.txt").write_text("\n".join(f"frame_{i}.fits" for i in range(20)))
+    monkeypatch.chdir(tmp_path)
+
+    started = []
+
+    def fake_processing(fits_path, data_layer=1, memmap=False, cache=None):
+        started.append(fits_path)
+        return np.zeros((2, 2), dtype=np.uint8)
+
+    monkeypatch.setattr(image_processing, "image_processing_fits", fake_processing)
+
+    consumed = 0
+    for _ in image_processing.load_trace_frames(1, workers=2, max_in_flight=3, executor="thread"):
+        consumed += 1
+        assert len(started) - consumed <= 3
+    assert consumed == 20
+    assert [p.name for p in started] == [f"frame_{i}.fits" for i in range(20)]
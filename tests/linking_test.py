@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+
+from solar_tracking.linking import LinkTrackingSession, predict_positions
+from solar_tracking.tracking import track_spots
+
+
+def test_predict_positions_differential_rotation():
+    """Testet die Vorhersage: Drift in Rotationsrichtung, am Äquator am schnellsten."""
+    center = (500, 500)
+    positions = np.array([[500, 500], [500, 800], [300, 500]])
+
+    predicted = predict_positions(positions, 400, center, hours=24)
+    shift = predicted - positions
+
+    # Am Zentralmeridian des Äquators: 13.727 °/Tag
+    np.testing.assert_allclose(shift[0], [400 * np.sin(np.deg2rad(13.727)), 0], atol=1e-6)
+    assert np.all(shift[:, 1] == 0)
+    assert 0 < shift[1, 0] < shift[0, 0]
+    assert 0 < shift[2, 0] < shift[0, 0]
+    # Um 180° gedrehte Bilder laufen in die andere Richtung
+    np.testing.assert_allclose(predict_positions(positions, 400, center, 24, direction=-1)[0, 0],
+                               500 - shift[0, 0])
+
+
+def test_link_session_fills_gaps():
+    """Testet, ob fehlende Detektionen überbrückt werden und Spuren nicht vertauscht werden."""
+    center, radius = (500, 500), 400
+    start = np.array([[450.0, 500.0], [480.0, 520.0], [700.0, 300.0]])
+    boxes = np.column_stack([start - 10, np.full((3, 2), 20)])
+    session = LinkTrackingSession(None, boxes, start, sun_radius=radius, sun_center=center, max_gap=1)
+
+    positions = start
+    for k in range(4):
+        positions = predict_positions(positions, radius, center, hours=1)
+        detected = positions[[1, 0, 2]] + 0.5  # andere Reihenfolge als die Spuren
+        if k == 1:
+            detected = detected[1:]   # Spot 1 fehlt in einem Bild
+        if k >= 2:
+            detected = detected[:2]   # Spot 2 verschwindet endgültig
+        session.update_detections(np.column_stack([detected - 10, np.full((len(detected), 2), 20)]), detected)
+        if k == 1:
+            assert session.tracks[1]["gap"] == 1 and session.tracks[1]["success"]
+
+    assert [track["success"] for track in session.tracks] == [True, True, False]
+    assert [track["gap"] for track in session.tracks[:2]] == [0, 0]
+    assert [(track["x2"], track["y2"]) for track in session.tracks[:2]] == \
+        [(int(x + 0.5), int(y + 0.5)) for x, y in positions[:2]]
+    assert session.tracks[2]["x2"] is None
+    assert session.n_frames == 5
+
+
+def test_track_spots_link_tracker():
+    """Testet den Link-Tracker über track_spots auf einer synthetischen Bildserie."""
+    center, radius = (256, 256), 230
+    positions = np.array([[200.0, 220.0], [320.0, 300.0]])
+    frames, truth = [], []
+    for k in range(6):
+        image = np.full((512, 512), 200, dtype=np.uint8)
+        for x, y in positions:
+            cv2.circle(image, (int(round(x)), int(round(y))), 20, 40, thickness=-1)
+        frames.append(image)
+        truth.append(positions)
+        positions = predict_positions(positions, radius, center, hours=6)
+
+    bbox = [(180, 200, 41, 41), (300, 280, 41, 41)]
+    calls = []
+    tracks = track_spots(frames[0], iter(frames[1:]), bbox, truth[0],
+                         on_frame=lambda i, tracks, bgr: calls.append((i, bgr.shape)),
+                         tracker="link",
+                         tracker_options={"sun_radius": radius, "sun_center": center, "cadence": 6})
+
+    assert calls == [(i, (512, 512, 3)) for i in range(1, 6)]
+    assert all(track["success"] for track in tracks)
+    # x2/y2 sind wie beim MIL-Tracker auf ganze Pixel abgeschnitten
+    for track, (x, y) in zip(tracks, truth[-1]):
+        assert abs(track["x2"] - x) <= 1.5 and abs(track["y2"] - y) <= 1.5
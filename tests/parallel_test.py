@@ -0,0 +1,76 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from solar_tracking.parallel import SharedFrameRing, _send
+from solar_tracking.tracking import track_spots
+
+
+def test_shared_frame_ring_roundtrip():
+    """Testet, ob ein zweiter Ring mit demselben Namen dieselben Bilder sieht."""
+    ring = SharedFrameRing((4, 5), slots=2)
+    try:
+        image = np.arange(20, dtype=np.uint8).reshape(4, 5)
+        ring.write(1, image)
+        other = SharedFrameRing((4, 5), slots=2, name=ring.name)
+        assert np.array_equal(other.read(1), image)
+        other.close()
+        with pytest.raises(ValueError):
+            ring.write(0, np.zeros((5, 5), dtype=np.uint8))
+    finally:
+        ring.close()
+
+
+def _textured_spots(n_frames=5, shift=2):
+    """Erzeugt eine Bildserie mit drei texturierten Spots, die sich nach rechts bewegen."""
+    rng = np.random.default_rng(0)
+    textures = [rng.integers(0, 100, (30, 30), dtype=np.uint8) for _ in range(3)]
+    origins = [(40, 40), (150, 60), (80, 180)]
+    frames = []
+    for k in range(n_frames):
+        image = np.full((260, 260), 230, dtype=np.uint8)
+        for texture, (x, y) in zip(textures, origins):
+            image[y:y + 30, x + shift * k:x + shift * k + 30] = texture
+        frames.append(image)
+    bbox = [(x, y, 30, 30) for x, y in origins]
+    centroids = [np.array([x + 15.0, y + 15.0]) for x, y in origins]
+    return frames, bbox, centroids
+
+
+def test_track_spots_parallel():
+    """
+    Testet das Tracking auf mehreren Prozessen: Alle Spots kommen nach Spot-ID
+    sortiert zurück, jeder Callback sieht alle Spots, die Endpunkte liegen nahe
+    an der tatsächlichen Position, und ein zweiter Lauf liefert dasselbe Ergebnis.
+    """
+    frames, bbox, centroids = _textured_spots()
+    seen = []
+
+    def on_frame(frame_index, tracks, frame_bgr):
+        seen.append((frame_index, [track["spot"] for track in tracks], frame_bgr.shape))
+
+    tracks = track_spots(frames[0], iter(frames[1:]), bbox, centroids, on_frame, workers=2)
+
+    assert [track["spot"] for track in tracks] == [0, 1, 2]
+    assert seen == [(i, [0, 1, 2], (260, 260, 3)) for i in range(1, 5)]
+    for track in tracks:
+        # Die Tracker-Box ist um die Oversize nach oben links verschoben
+        assert abs(track["x2"] - (track["x1"] - 10 + 2 * 4)) <= 15
+        assert abs(track["y2"] - (track["y1"] - 10)) <= 15
+        assert track["trajectory"].shape == (5, 2)
+        assert tuple(track["trajectory"][-1]) == (track["x2"], track["y2"])
+
+    again = track_spots(frames[0], iter(frames[1:]), bbox, centroids, workers=2)
+    assert [(t["x2"], t["y2"]) for t in again] == [(t["x2"], t["y2"]) for t in tracks]
+
+
+def test_send_reports_worker_error():
+    """Testet, ob beim Senden an einen beendeten Worker dessen gemeldeter Fehler weitergegeben wird."""
+    parent_conn, child_conn = multiprocessing.Pipe()
+    child_conn.send((None, ValueError("kaputt")))
+    child_conn.close()
+    with pytest.raises(RuntimeError, match="kaputt"):
+        for _ in range(100):  # die Pipe meldet den Abbruch evtl. erst nach einigen Nachrichten
+            _send(parent_conn, 1)
+    parent_conn.close()
@@ -0,0 +1,70 @@
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from solar_tracking import profiling
+
+
+@pytest.fixture(autouse=True)
+def _disable_profiling():
+    yield
+    profiling.disable()
+    profiling.reset()
+
+
+@profiling.profiled()
+def _allocate(n_bytes):
+    return np.ones(n_bytes, dtype=np.uint8).sum()
+
+
+@profiling.profiled("recursive")
+def _recursive(depth):
+    return 0 if depth == 0 else _recursive(depth - 1)
+
+
+def test_stages_calls_and_peaks():
+    """Testet Aufrufzahlen, verschachtelte Speicherspitzen und rekursive Stufen."""
+    _allocate(10)
+    assert profiling.report()["stages"] == {}
+
+    with profiling.profile() as result:
+        with profiling.stage("outer"):
+            _allocate(8 * 2**20)
+            _allocate(1024)
+        _recursive(5)
+        list(profiling.timed_iter("wait", range(3)))
+
+    stages = result["stages"]
+    assert stages["_allocate"]["calls"] == 2
+    assert stages["_allocate"]["peak_bytes"] >= 8 * 2**20
+    assert stages["outer"]["calls"] == 1
+    assert stages["outer"]["peak_bytes"] >= stages["_allocate"]["peak_bytes"]
+    assert stages["outer"]["total_s"] >= stages["_allocate"]["total_s"]
+    assert stages["recursive"]["calls"] == 1
+    assert stages["wait"]["calls"] == 4  # drei Elemente und das Ende des Iterators
+    assert result["peak_bytes"] >= 8 * 2**20
+    assert not profiling.is_enabled()
+
+
+def test_cli_profile_report(monkeypatch, tmp_path):
+    """Testet --profile an einem Lauf ohne Interaktion auf einer synthetischen Serie."""
+    from solar_tracking import cli
+    from solar_tracking.synthetic import write_synthetic_trace
+
+    write_synthetic_trace(tmp_path / "data" / "TR_01", n_frames=3, size=1024, cadence=6)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["solar-tracking", "run_tracking", "--trace", "1", "--no-interactive",
+                                      "--tracker", "roi", "--profile", "profile.json"])
+
+    cli.main()
+
+    report = json.loads((tmp_path / "profile.json").read_text())
+    stages = report["stages"]
+    assert stages["image_processing_fits"]["calls"] == 3
+    assert stages["find_spots_and_boxes"]["calls"] == 1
+    assert stages["tracker_update"]["calls"] == 2
+    assert stages["save_tracks"]["calls"] == 1
+    assert stages["image_processing_fits"]["peak_bytes"] > 1024**2
+    assert report["wall_time_s"] >= stages["find_spots_and_boxes"]["total_s"]
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from solar_tracking import tracking
+from solar_tracking.image_processing import image_processing_fits
+from solar_tracking.pyramid import PyramidTrackingSession, pyramid_down
+from solar_tracking.sunspot_detection import find_spots_and_boxes, sun_infos
+from solar_tracking.synthetic import write_synthetic_trace
+
+
+@pytest.fixture
+def trace(tmp_path, monkeypatch):
+    """Synthetische Serie 'data/TR_01' mit 6 Bildern im Arbeitsverzeichnis tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    paths, _, _, positions = write_synthetic_trace(tmp_path / "data" / "TR_01", n_frames=6, size=1024, cadence=6)
+    return paths, positions
+
+
+@pytest.mark.parametrize("levels", [1, 2])
+def test_pyramid_detection_matches_full_resolution(trace, levels):
+    """Testet, ob die Pyramiden-Detektion (fast) dieselben Boxen und Zentroiden liefert wie in voller Auflösung."""
+    paths, _ = trace
+    image = image_processing_fits(paths[0])
+    sun_radius, sun_center, _ = sun_infos(paths[0])
+    assert pyramid_down(image, levels).shape == (1024 >> levels, 1024 >> levels)
+
+    bbox, centroids = find_spots_and_boxes(image, sun_radius, sun_center)
+    pyramid_bbox, pyramid_centroids = find_spots_and_boxes(image, sun_radius, sun_center, pyramid_levels=levels)
+    assert len(pyramid_bbox) == len(bbox) == 5
+    order, pyramid_order = np.lexsort(np.transpose(centroids)), np.lexsort(np.transpose(pyramid_centroids))
+    np.testing.assert_allclose(np.asarray(pyramid_bbox)[pyramid_order], np.asarray(bbox)[order], atol=1)
+    np.testing.assert_allclose(np.asarray(pyramid_centroids)[pyramid_order], np.asarray(centroids)[order], atol=0.1)
+
+
+@pytest.mark.parametrize("levels", [1, 2])
+@pytest.mark.parametrize("tracker", ["roi", "link", "mil"])
+def test_pyramid_tracking_endpoints(trace, tracker, levels):
+    """Testet, ob die Endpunkte des Pyramidenmodus in voller Auflösung nahe an den wahren Positionen liegen."""
+    _, positions = trace
+    tracks = tracking.run_tracking(1, interactive=False, tracker=tracker, pyramid_levels=levels)
+    assert len(tracks) == 5
+    endpoints = np.array([(track["x2"], track["y2"]) for track in tracks], dtype=float)
+    error = np.linalg.norm(endpoints[:, None] - positions[-1][None], axis=2).min(axis=1)
+    assert np.all(error < 1.5)
+    assert all(track["trajectory"].shape == (6, 2) for track in tracks)
+
+
+def test_pyramid_session_rejects_link(trace):
+    """Testet, ob der Link-Tracker nicht als grobe Session verwendet wird."""
+    paths, _ = trace
+    image = image_processing_fits(paths[0])
+    with pytest.raises(ValueError):
+        PyramidTrackingSession("link", image, [(0, 0, 10, 10)], [(5, 5)], levels=1)
+
+
+@pytest.mark.parametrize("tracker", ["roi", "mil"])
+def test_pyramid_session_marks_unrefined_spots_lost(trace, tracker):
+    """Testet, ob ein Spot verloren ist, wenn die Verfeinerung ihn nicht findet, statt die grobe Position zu behalten."""
+    paths, _ = trace
+    image = image_processing_fits(paths[0])
+    sun_radius, sun_center, _ = sun_infos(paths[0])
+    bbox, centroids = find_spots_and_boxes(image, sun_radius, sun_center)
+    options = {"sun_radius": sun_radius, "sun_center": sun_center} if tracker == "roi" else {}
+    session = PyramidTrackingSession(tracker, image, bbox, centroids, levels=1, **options)
+    session.update(image_processing_fits(paths[1]))
+    assert all(track["success"] for track in session.tracks)
+    for _ in range(2):
+        session.update(np.full_like(image, np.median(image)))
+        assert not any(track["success"] for track in session.tracks)
+        assert all(track["x2"] is None and track["box"] is None for track in session.tracks)
+    if tracker == "mil":
+        # Die MIL-Tracker der verlorenen Spots laufen nicht weiter
+        assert all(tracker is None for tracker in session.session._trackers)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from solar_tracking.roi_tracking import RoiTrackingSession
+from solar_tracking.tracking import track_spots
+
+
+def _gaussian_spot(cx, cy, size=300):
+    """Bild mit einem dunklen Spot (Umbra und Penumbra) an einer Subpixel-Position."""
+    yy, xx = np.mgrid[:size, :size].astype(float)
+    r2 = (xx - cx)**2 + (yy - cy)**2
+    image = 200 - 150 * np.exp(-r2 / (2 * 8**2)) - 60 * np.exp(-r2 / (2 * 20**2))
+    return np.clip(np.rint(image), 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("method", ["ncc", "phase"])
+def test_roi_tracker_subpixel(method):
+    """Testet, ob der ROI-Tracker eine Bewegung um Bruchteile von Pixeln subpixelgenau verfolgt."""
+    frames = [_gaussian_spot(100 + 2.3 * k, 120 + 0.7 * k) for k in range(6)]
+
+    tracks = track_spots(frames[0], iter(frames[1:]), [(80, 100, 40, 40)], [(100.0, 120.0)],
+                         tracker="roi", tracker_options={"method": method})
+
+    assert tracks[0]["success"]
+    assert abs(tracks[0]["x2"] - 111.5) < 0.25
+    assert abs(tracks[0]["y2"] - 123.5) < 0.25
+
+
+def test_roi_tracker_loses_spot():
+    """Testet, ob ein Spot, der verschwindet, als verloren markiert wird."""
+    session = RoiTrackingSession(_gaussian_spot(100, 120), [(80, 100, 40, 40)], [(100.0, 120.0)])
+    session.update(np.full((300, 300), 200, dtype=np.uint8))
+
+    assert not session.tracks[0]["success"]
+    assert session.tracks[0]["x2"] is None
+    assert session.n_frames == 2
+
+
+def test_roi_tracker_unknown_method():
+    with pytest.raises(ValueError):
+        RoiTrackingSession(_gaussian_spot(100, 120), [(80, 100, 40, 40)], [(100.0, 120.0)], method="mil")
@@ -0,0 +1,170 @@
+import numpy as np
+import pytest
+
+sunpy_map = pytest.importorskip("sunpy.map")
+
+from solar_tracking.rotation_analysis import cal_lon_and_lat, cal_lon_and_lat_batch
+
+
+def _hmi_header(size=512, date="2023-11-23T00:00:00", crota2=180.0, crln_obs=120.0, crlt_obs=-2.5):
+    """Header wie bei HMI Ic (um 180° gedreht, Sonnenmittelpunkt nicht genau in der Bildmitte)."""
+    from astropy.io import fits
+
+    header = fits.Header()
+    header["NAXIS"] = 2
+    header["NAXIS1"] = size
+    header["NAXIS2"] = size
+    header["DATE-OBS"] = date
+    header["CTYPE1"] = "HPLN-TAN"
+    header["CTYPE2"] = "HPLT-TAN"
+    header["CUNIT1"] = "arcsec"
+    header["CUNIT2"] = "arcsec"
+    header["CDELT1"] = 0.504 * 4096 / size
+    header["CDELT2"] = 0.504 * 4096 / size
+    header["CRPIX1"] = size / 2 + 0.7
+    header["CRPIX2"] = size / 2 - 1.3
+    header["CRVAL1"] = 0.0
+    header["CRVAL2"] = 0.0
+    header["CROTA2"] = crota2
+    header["DSUN_OBS"] = 1.4766e11
+    header["RSUN_REF"] = 696000000.0
+    header["RSUN_OBS"] = np.rad2deg(np.arcsin(header["RSUN_REF"] / header["DSUN_OBS"])) * 3600
+    header["CRLN_OBS"] = crln_obs
+    header["CRLT_OBS"] = crlt_obs
+    header["HGLN_OBS"] = 0.0
+    header["HGLT_OBS"] = crlt_obs
+    return header
+
+
+def _hmi_map(**kwargs):
+    header = _hmi_header(**kwargs)
+    return sunpy_map.Map(np.zeros((header["NAXIS2"], header["NAXIS1"]), dtype=np.float32), header)
+
+
+def test_cal_lon_and_lat_batch_matches_single_points():
+    """Testet, ob die Batch-Konvertierung dieselben Koordinaten liefert wie cal_lon_and_lat pro Punkt."""
+    maps = [_hmi_map(), _hmi_map(date="2023-11-23T06:00:00", crln_obs=116.7)]
+    rng = np.random.default_rng(0)
+    x = rng.uniform(120, 390, 12)
+    y = rng.uniform(120, 390, 12)
+    frame_indices = np.arange(12) % 2
+
+    lat, lon = cal_lon_and_lat_batch(x, y, maps, frame_indices)
+
+    for k in range(12):
+        coord = cal_lon_and_lat(x[k], y[k], maps[frame_indices[k]])
+        assert lat[k] == pytest.approx(coord.lat.deg, abs=1e-9)
+        assert lon[k] == pytest.approx(coord.lon.deg, abs=1e-9)
+
+
+def test_cal_lon_and_lat_batch_single_map_and_off_disk():
+    """Testet eine einzelne Karte, mehrdimensionale Eingaben und Punkte außerhalb der Sonnenscheibe."""
+    hmi_map = _hmi_map()
+    x = np.array([[256.0, 300.0], [0.0, 200.0]])
+    y = np.array([[256.0, 210.0], [0.0, 330.0]])
+
+    lat, lon = cal_lon_and_lat_batch(x, y, hmi_map)
+
+    assert lat.shape == lon.shape == (2, 2)
+    assert np.isnan(lat[1, 0]) and np.isnan(lon[1, 0])
+    assert np.all(np.isfinite(lat[[0, 0, 1], [0, 1, 1]]))
+    with pytest.raises(ValueError):
+        cal_lon_and_lat_batch(x, y, [hmi_map, hmi_map])
+
+
+def _consistent_header(**kwargs):
+    """HMI-Header, dessen CRLN_OBS der Carrington-Länge des Beobachters in sunpy entspricht."""
+    from sunpy.coordinates import frames
+
+    header = _hmi_header(**kwargs)
+    observer = sunpy_map.Map(np.zeros((header["NAXIS2"], header["NAXIS1"])), header).observer_coordinate
+    header["CRLN_OBS"] = observer.transform_to(
+        frames.HeliographicCarrington(observer=observer, obstime=observer.obstime)).lon.deg
+    return header
+
+
+@pytest.mark.parametrize("crota2", [0.0, 180.0, 179.93])
+def test_cal_lon_and_lat_header_matches_sunpy(crota2):
+    """Testet die analytische Konvertierung aus dem Header gegen sunpy (Abweichung unter 0.1 Bogensekunden)."""
+    from solar_tracking.rotation_analysis import cal_lon_and_lat_header
+
+    header = _consistent_header(crota2=crota2)
+    hmi_map = sunpy_map.Map(np.zeros((header["NAXIS2"], header["NAXIS1"])), header)
+    rng = np.random.default_rng(1)
+    x = np.concatenate([rng.uniform(30, 480, 200), [0.0, 256.0]])
+    y = np.concatenate([rng.uniform(30, 480, 200), [0.0, 256.0]])
+
+    lat, lon = cal_lon_and_lat_header(x, y, header)
+    ref_lat, ref_lon = cal_lon_and_lat_batch(x, y, hmi_map)
+
+    np.testing.assert_array_equal(np.isnan(lat), np.isnan(ref_lat))
+    assert np.isnan(lat[-2]) and not np.isnan(lat[-1])
+    on_disk = ~np.isnan(ref_lat)
+    assert np.abs(lat - ref_lat)[on_disk].max() * 3600 < 0.1
+    dlon = (lon - ref_lon + 180) % 360 - 180
+    assert np.abs(dlon[on_disk] * np.cos(np.deg2rad(ref_lat[on_disk]))).max() * 3600 < 0.1
+
+
+def test_cal_lon_and_lat_header_several_frames():
+    """Testet mehrere Header mit Index pro Punkt und den Abstand aus RSUN_OBS ohne DSUN_OBS."""
+    from solar_tracking.rotation_analysis import cal_lon_and_lat_header
+
+    headers = [_hmi_header(), _hmi_header(crln_obs=116.7)]
+    x = np.array([250.0, 250.0, 300.0])
+    y = np.array([260.0, 260.0, 200.0])
+
+    lat, lon = cal_lon_and_lat_header(x, y, headers, frame_indices=[0, 1, 1])
+    assert lat[0] == lat[1]
+    assert lon[0] - lon[1] == pytest.approx(3.3)
+
+    no_dsun = _hmi_header()
+    del no_dsun["DSUN_OBS"]
+    lat_rsun, lon_rsun = cal_lon_and_lat_header(x, y, no_dsun)
+    lat_dsun, lon_dsun = cal_lon_and_lat_header(x, y, headers[0])
+    np.testing.assert_allclose(lat_rsun, lat_dsun, atol=1e-3)
+    np.testing.assert_allclose(lon_rsun, lon_dsun, atol=1e-3)
+
+
+def test_fit_rotation_rates_matches_polyfit():
+    """Testet den vektorisierten Fit gegen np.polyfit pro Spot, mit Lücken und Sprung über 360°."""
+    from solar_tracking.rotation_analysis import CARRINGTON_RATE, fit_rotation_rates
+
+    rng = np.random.default_rng(2)
+    t = np.arange(30, dtype=float)
+    omega = np.array([14.2, 13.1, 12.0, 10.5])
+    # Carrington-Längen driften mit der Rate relativ zum Carrington-System
+    lon = (np.array([[350.0], [20.0], [180.0], [90.0]]) + (omega[:, None] - CARRINGTON_RATE) / 24 * t
+           + rng.normal(0, 0.05, (4, 30))) % 360
+    lon[1, [3, 4, 17]] = np.nan
+    lon[2, :10] = np.nan
+    lon[3, 2:] = np.nan   # nur zwei Punkte
+
+    fitted, sigma = fit_rotation_rates(t, lon)
+
+    for k in range(3):
+        valid = ~np.isnan(lon[k])
+        (slope, _), cov = np.polyfit(t[valid], np.unwrap(lon[k][valid], period=360), 1, cov="unscaled")
+        residuals = np.unwrap(lon[k][valid], period=360) - np.polyval((slope, _), t[valid])
+        expected_sigma = np.sqrt(cov[0, 0] * (residuals**2).sum() / (valid.sum() - 2))
+        assert fitted[k] == pytest.approx(slope * 24 + CARRINGTON_RATE, rel=1e-9)
+        assert sigma[k] == pytest.approx(expected_sigma * 24, rel=1e-6)
+        assert abs(fitted[k] - omega[k]) < 5 * sigma[k]
+    assert fitted[3] == pytest.approx(omega[3], abs=3)
+    assert np.isnan(sigma[3])
+
+
+def test_trajectory_lon_and_lat():
+    """Testet die Konvertierung einer Trajektorie mit einem Header pro Bild."""
+    from solar_tracking.rotation_analysis import cal_lon_and_lat_header, trajectory_lon_and_lat
+
+    headers = [_hmi_header(crln_obs=120.0 - 0.55 * k) for k in range(3)]
+    positions = np.array([[[250.0, 260.0], [300.0, 200.0]],
+                          [[251.0, 260.0], [np.nan, np.nan]],
+                          [[252.0, 260.0], [302.0, 200.0]]])
+
+    lat, lon = trajectory_lon_and_lat(positions, headers)
+
+    assert lat.shape == lon.shape == (2, 3)
+    assert np.isnan(lon[1, 1])
+    expected = cal_lon_and_lat_header(302.0, 200.0, headers[2])
+    assert (lat[1, 2], lon[1, 2]) == pytest.approx(expected)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from solar_tracking.image_processing import image_processing_fits
+from solar_tracking.rotation_analysis import cal_lon_and_lat_header, fit_rotation_rates, trajectory_lon_and_lat
+from solar_tracking.sunspot_detection import find_spots_and_boxes, sun_infos
+from solar_tracking.synthetic import (DIFFERENTIAL_ROTATION, carrington_to_pixel, synthetic_header,
+                                      write_synthetic_trace)
+from solar_tracking.fitting import perform_fitting
+
+
+@pytest.mark.parametrize("crota2", [0.0, 180.0])
+def test_carrington_to_pixel_inverts_header_conversion(crota2):
+    """Testet, ob die Projektion die Umkehrung von cal_lon_and_lat_header ist und die Rückseite erkennt."""
+    header = synthetic_header(size=512, crota2=crota2, center_offset=(0.7, -1.3))
+    rng = np.random.default_rng(0)
+    lon = header["CRLN_OBS"] + rng.uniform(-80, 80, 100)
+    lat = rng.uniform(-70, 70, 100)
+
+    x, y, visible = carrington_to_pixel(lon, lat, header)
+    back_lat, back_lon = cal_lon_and_lat_header(x, y, header)
+
+    assert visible.all()
+    np.testing.assert_allclose(back_lat, lat, atol=1e-6)
+    np.testing.assert_allclose((back_lon - lon + 180) % 360 - 180, 0, atol=1e-6)
+    assert not carrington_to_pixel(header["CRLN_OBS"] + 120, 0, header)[2]
+
+
+def test_synthetic_trace(tmp_path):
+    """
+    Testet die synthetische Serie: Header passend zu sun_infos, erkennbare Spots an
+    den wahren Positionen und die bekannte differentielle Rotation.
+    """
+    paths, headers, spots, positions = write_synthetic_trace(tmp_path / "TR_01", n_frames=4, size=1024, cadence=6)
+
+    assert (tmp_path / "TR_01" / "names.txt").read_text().split() == [path.name for path in paths]
+    sun_radius, sun_center, resolution = sun_infos(paths[0])
+    assert resolution == 1024 and sun_center == (512, 512)
+    assert sun_radius == pytest.approx(0.47 * 1024, rel=0.02)
+
+    image = image_processing_fits(paths[0])
+    _, centroids = find_spots_and_boxes(image, sun_radius, sun_center)
+    assert len(centroids) >= 3
+    for centroid in centroids:
+        assert np.linalg.norm(positions[0] - centroid, axis=1).min() < 1.5
+
+    # Aus den wahren Positionen folgen wieder die vorgegebenen Rotationsraten
+    lat, lon = trajectory_lon_and_lat(positions, headers)
+    omega, _ = fit_rotation_rates(np.arange(4) * 6.0, lon)
+    popt, _ = perform_fitting(lat[:, 0], omega)
+    np.testing.assert_allclose(popt, DIFFERENTIAL_ROTATION, atol=1e-6)
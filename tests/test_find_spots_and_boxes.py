@@ -81,3 +81,88 @@ def test_find_spots_and_boxes_merged_spots():
     expected_centroid = np.array([105, 105])
     d = np.linalg.norm(np.array(grouped_centroids[0]) - expected_centroid)
     assert d < 10, f"Der gruppierte Zentroid weicht zu stark vom erwarteten Wert ab: Abstand = {d}"
+
+
+def _disk_with_spots(res=1024, seed=0):
+    """Erzeugt eine Sonnenscheibe mit Randverdunkelung, Rauschen und einigen Spots."""
+    rng = np.random.default_rng(seed)
+    sun_radius, center = int(res * 0.46), res // 2
+    yy, xx = np.mgrid[:res, :res]
+    rho = np.hypot(xx - center, yy - center) / sun_radius
+    image = np.where(rho < 1, 1 - 0.6 * (1 - np.sqrt(np.clip(1 - rho**2, 0, 1))), 0) * 230
+    for x, y in [(300, 420), (600, 380), (520, 700), (700, 560), (380, 620)]:
+        cv2.circle(image, (x, y), 25, float(image[y, x]) * 0.4, thickness=-1)
+    image = np.clip(image + rng.normal(0, 2, image.shape), 0, 255).astype(np.uint8)
+    return image, sun_radius, (center, center)
+
+
+def test_find_spots_and_boxes_crop_to_disk_is_equivalent():
+    """Testet, ob der Zuschnitt auf die Sonnenscheibe dieselben Boxen und Zentroiden liefert."""
+    image, sun_radius, sun_center = _disk_with_spots()
+
+    boxes, centroids = find_spots_and_boxes(image, sun_radius, sun_center)
+    crop_boxes, crop_centroids = find_spots_and_boxes(image, sun_radius, sun_center, crop_to_disk=True)
+
+    assert len(boxes) == 5
+    assert [tuple(int(v) for v in box) for box in crop_boxes] == [tuple(int(v) for v in box) for box in boxes]
+    np.testing.assert_allclose(crop_centroids, centroids, atol=1e-9)
+
+
+def test_find_spots_and_boxes_downsampled_threshold():
+    """Testet, ob die adaptive Schwelle auf dem verkleinerten Bild fast dieselben Spots findet."""
+    image, sun_radius, sun_center = _disk_with_spots()
+
+    boxes, centroids = find_spots_and_boxes(image, sun_radius, sun_center)
+    fast_boxes, fast_centroids = find_spots_and_boxes(image, sun_radius, sun_center,
+                                                      crop_to_disk=True, threshold_downsample=4)
+
+    assert len(fast_boxes) == len(boxes)
+    assert np.abs(np.subtract(fast_boxes, boxes)).max() <= 2
+    np.testing.assert_allclose(fast_centroids, centroids, atol=0.5)
+
+
+def test_filter_and_group_components():
+    """Testet Flächen- und Abstandsfilter sowie das Zusammenfassen der Cluster an einem Beispiel."""
+    from solar_tracking.sunspot_detection import _filter_components, _group_clusters
+
+    # Label 0 ist der Hintergrund; Spalten: left, top, width, height, area
+    stats = np.array([[0, 0, 300, 300, 90000],
+                      [10, 10, 40, 40, 1200],    # zu weit vom Mittelpunkt entfernt
+                      [100, 100, 40, 40, 1500],
+                      [150, 140, 30, 40, 1100],
+                      [120, 180, 20, 20, 400],   # zu klein
+                      [160, 100, 50, 50, 2000]], dtype=np.int32)
+    centroids = np.array([[150, 150], [30, 30], [120, 120], [165, 160], [130, 190], [185, 125]], dtype=float)
+
+    boxes, cents, areas = _filter_components(stats, centroids, 150, (150, 150), 1000, 5000, 0.9)
+    assert boxes.tolist() == [[100, 100, 40, 40], [150, 140, 30, 40], [160, 100, 50, 50]]
+
+    grouped_boxes, grouped_centroids, grouped_areas = _group_clusters(boxes, cents, np.array([1, 0, 1]), areas)
+    assert grouped_boxes.tolist() == [[150, 140, 30, 40], [100, 100, 110, 50]]
+    np.testing.assert_allclose(grouped_centroids, [[165, 160], [152.5, 122.5]])
+    assert grouped_areas.tolist() == [1100, 3500]
+
+
+def test_detect_spots_batch_catalog():
+    """Testet, ob der Spot-Katalog pro Bild dieselben Spots wie find_spots_and_boxes enthält."""
+    from solar_tracking.sunspot_detection import SPOT_CATALOG_DTYPE, catalog_frame, detect_spots_batch
+
+    image, sun_radius, sun_center = _disk_with_spots()
+    frames = [image, np.roll(image, 7, axis=1), np.full_like(image, 128), np.roll(image, -5, axis=0)]
+
+    catalog = detect_spots_batch(frames, sun_radius, sun_center, workers=3)
+    assert catalog.dtype == SPOT_CATALOG_DTYPE
+    assert np.all(np.diff(catalog["frame"]) >= 0)
+    for frame_index, frame in enumerate(frames):
+        boxes, centroids = find_spots_and_boxes(frame, sun_radius, sun_center)
+        spots = catalog_frame(catalog, frame_index)
+        assert spots[["x", "y", "w", "h"]].tolist() == [tuple(int(v) for v in box) for box in boxes]
+        np.testing.assert_allclose(np.column_stack([spots["cx"], spots["cy"]]).reshape(-1, 2),
+                                   np.reshape(centroids, (-1, 2)), atol=1e-3)
+        assert np.all(spots["area"] >= 1000)
+    assert len(catalog_frame(catalog, 2)) == 0
+
+    # Nur jedes zweite Bild, die Bildindizes beziehen sich auf die ganze Serie
+    every_other = detect_spots_batch(frames, sun_radius, sun_center, every=2)
+    assert set(every_other["frame"]) == {0}
+    assert np.array_equal(every_other, catalog[catalog["frame"] % 2 == 0])
@@ -0,0 +1,156 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from solar_tracking.track_store import ROW_DTYPE, TrackStore
+
+
+def _tracks(n, offset=0.0, n_frames=3):
+    return [{"spot": i, "x1": 10.0 + i + offset, "y1": 20.0, "x2": 15.5 + i + offset, "y2": 21.25,
+             "trajectory": np.full((n_frames, 2), float(i))} for i in range(n)]
+
+
+def test_append_and_read(tmp_path):
+    """Testet Anhängen, Lesen nach Trace und Spot sowie die Trajektorien."""
+    store = TrackStore(tmp_path / "tracks")
+    assert store.read().dtype == ROW_DTYPE and len(store.read()) == 0
+
+    store.append(1, _tracks(2), 5)
+    store.append(2, _tracks(3, offset=100), 7, time_hours=[0, 0.5, 1])
+    store.append(1, _tracks(1, offset=200), 5)
+    assert store.append(1, [], 5) is None
+
+    rows = store.read()
+    assert list(rows["trace"]) == [1, 1, 2, 2, 2, 1]
+    assert list(store.read(trace=1)["x1"]) == [10, 11, 210]
+    assert list(store.read(trace=[2], spots=[0, 2])["x2"]) == [115.5, 117.5]
+    assert list(store.read(trace=2)["delta_time"]) == [7, 7, 7]
+
+    trajectories = list(store.trajectories(trace=2))
+    assert len(trajectories) == 1
+    chunk_rows, positions, time = trajectories[0]
+    assert positions.shape == (3, 3, 2)
+    assert list(time) == [0, 0.5, 1]
+    # Ein neues Objekt sieht dieselben Blöcke, temporäre Dateien bleiben nicht liegen
+    assert len(TrackStore(tmp_path / "tracks").read()) == 6
+    assert not list((tmp_path / "tracks").glob(".*"))
+
+
+def test_csv_export_and_import(tmp_path):
+    """Testet den Export im Format von data_points.csv und die Übernahme einer alten CSV-Datei."""
+    legacy = tmp_path / "data_points.csv"
+    legacy.write_text("xcoor[pix],ycorr[pix],x2[pix],y2[pix],delta_time [h]\n1,2,3,4,5\n")
+    store = TrackStore(tmp_path / "tracks")
+    store.import_csv(1, legacy)
+    store.append(1, _tracks(1), 9)
+    store.append(2, _tracks(1), 9)
+
+    exported = tmp_path / "export.csv"
+    store.export_csv(1, exported)
+
+    lines = exported.read_text().splitlines()
+    assert lines[0] == "xcoor[pix],ycorr[pix],x2[pix],y2[pix],delta_time [h]"
+    np.testing.assert_array_equal(np.genfromtxt(exported, delimiter=",", skip_header=True),
+                                  [[1, 2, 3, 4, 5], [10, 20, 15.5, 21.25, 9]])
+    # Eine bestehende Datei wird nie ersetzt (gleichzeitige append_csv gingen sonst verloren)
+    with pytest.raises(FileExistsError):
+        store.export_csv(1, legacy)
+    assert legacy.read_text().splitlines()[1] == "1,2,3,4,5"
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_read_opens_only_chunks_of_trace(tmp_path, monkeypatch):
+    """Testet, ob read und trajectories nur die Blöcke der gesuchten Trace-Serie öffnen."""
+    store = TrackStore(tmp_path / "tracks")
+    store.append(1, _tracks(2), 5)
+    store.append(2, _tracks(3), 7)
+    opened = []
+    load = np.load
+
+    def counting_load(path, *args, **kwargs):
+        opened.append(path.name)
+        return load(path, *args, **kwargs)
+
+    monkeypatch.setattr(np, "load", counting_load)
+
+    fresh = TrackStore(tmp_path / "tracks")
+    assert len(fresh.read(trace=2)) == 3
+    assert len(list(fresh.trajectories(trace=2))) == 1
+    assert opened and all(name.endswith("-t0002.npz") for name in opened)
+
+
+def test_append_csv_and_legacy_import_once(tmp_path):
+    """Testet das Anhängen an data_points.csv und die einmalige Übernahme einer alten CSV-Datei."""
+    csv_path = tmp_path / "data_points.csv"
+    csv_path.write_text("xcoor[pix],ycorr[pix],x2[pix],y2[pix],delta_time [h]\n1,2,3,4,5\n")
+    store = TrackStore(tmp_path / "tracks")
+    assert store.import_legacy_csv(1, csv_path) is not None
+    assert store.import_legacy_csv(1, csv_path) is None
+    assert TrackStore(tmp_path / "tracks").import_legacy_csv(1, csv_path) is None
+
+    chunk = store.append(1, _tracks(1), 9)
+    store.append_csv(1, chunk, csv_path)
+    np.testing.assert_array_equal(np.genfromtxt(csv_path, delimiter=",", skip_header=True),
+                                  [[1, 2, 3, 4, 5], [10, 20, 15.5, 21.25, 9]])
+    assert len(store.read(trace=1)) == 2
+
+    # Ohne Datei wird die ganze Trace-Serie exportiert
+    csv_path.unlink()
+    store.append_csv(1, store.append(1, _tracks(1, offset=1), 9), csv_path)
+    assert np.genfromtxt(csv_path, delimiter=",", skip_header=True).shape == (3, 5)
+
+
+def _import_worker(directory, csv_path):
+    TrackStore(directory).import_legacy_csv(1, csv_path)
+
+
+def test_concurrent_legacy_import(tmp_path):
+    """Testet, ob gleichzeitige Prozesse eine alte CSV-Datei nur einmal übernehmen."""
+    csv_path = tmp_path / "data_points.csv"
+    csv_path.write_text("xcoor[pix],ycorr[pix],x2[pix],y2[pix],delta_time [h]\n1,2,3,4,5\n6,7,8,9,10\n")
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_import_worker, args=(tmp_path / "tracks", csv_path)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert len(TrackStore(tmp_path / "tracks").read(trace=1)) == 2
+
+
+def _append_worker(directory, trace):
+    store = TrackStore(directory)
+    for k in range(10):
+        store.append(trace, _tracks(2, offset=k), 1)
+
+
+def test_concurrent_appends(tmp_path):
+    """Testet, ob gleichzeitig anhängende Prozesse keine Zeilen verlieren."""
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_append_worker, args=(tmp_path / "tracks", trace))
+                 for trace in (1, 2, 3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    rows = TrackStore(tmp_path / "tracks").read()
+    assert len(rows) == 60
+    for trace in (1, 2, 3):
+        assert sorted(rows[rows["trace"] == trace]["x1"]) == sorted(10.0 + k + i for k in range(10) for i in range(2))
+
+
+def test_legacy_import_retried_after_crash(tmp_path, monkeypatch):
+    """Testet, ob eine abgebrochene Übernahme einer alten CSV-Datei beim nächsten Aufruf nachgeholt wird."""
+    csv_path = tmp_path / "data_points.csv"
+    csv_path.write_text("xcoor[pix],ycorr[pix],x2[pix],y2[pix],delta_time [h]\n1,2,3,4,5\n")
+    store = TrackStore(tmp_path / "tracks")
+    with monkeypatch.context() as patch:
+        patch.setattr(TrackStore, "import_csv", lambda *args, **kwargs: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            store.import_legacy_csv(1, csv_path)
+    assert not list((tmp_path / "tracks").glob("*.legacy"))
+
+    assert store.import_legacy_csv(1, csv_path) is not None
+    assert store.import_legacy_csv(1, csv_path) is None
+    assert len(store.read(trace=1)) == 1
@@ -0,0 +1,172 @@
+import cv2
+import numpy as np
+
+from solar_tracking import tracking
+from solar_tracking.tracking import track_spots
+
+
+class FakeTracker:
+    """
+    Deterministischer Ersatz für den MIL-Tracker (der MIL-Tracker ist zufallsbasiert).
+
+    Die Box folgt dem dunkelsten Pixel in der Umgebung der letzten Box.
+    """
+    def init(self, image, box):
+        self.box = tuple(int(v) for v in box)
+        self.seen = []
+
+    def update(self, image):
+        self.seen.append(image.copy())
+        gray = image[:, :, 0]
+        x, y, w, h = self.box
+        window = gray[max(y, 0):y + h, max(x, 0):x + w]
+        dy, dx = np.unravel_index(np.argmin(window), window.shape)
+        cx, cy = max(x, 0) + dx, max(y, 0) + dy
+        self.box = (int(cx - w // 2), int(cy - h // 2), w, h)
+        return True, self.box
+
+
+def _moving_spots(n_frames=6, shift=3):
+    """Erzeugt eine Bildserie mit zwei dunklen Spots, die sich nach rechts bewegen."""
+    frames = []
+    for k in range(n_frames):
+        image = np.full((300, 300), 220, dtype=np.uint8)
+        cv2.circle(image, (80 + shift * k, 100), 12, 30, thickness=-1)
+        cv2.circle(image, (150 + shift * k, 200), 15, 40, thickness=-1)
+        image[100, 80 + shift * k] = 0
+        image[200, 150 + shift * k] = 0
+        frames.append(image)
+    return frames
+
+
+def test_track_spots_matches_per_spot_loop(monkeypatch):
+    """
+    Testet, ob der gemeinsame Durchlauf dieselben Endkoordinaten liefert wie
+    ein eigener Durchlauf der Bildserie pro Spot.
+    """
+    created = []
+
+    def fake_create():
+        created.append(FakeTracker())
+        return created[-1]
+
+    monkeypatch.setattr(tracking.cv2, "TrackerMIL_create", fake_create)
+    frames = _moving_spots()
+    bbox = [(68, 88, 24, 24), (135, 185, 30, 30)]
+    centroids = [np.array([80.0, 100.0]), np.array([150.0, 200.0])]
+
+    tracks = track_spots(frames[0], iter(frames[1:]), bbox, centroids)
+
+    for spot, track, shared in zip(bbox, tracks, created):
+        # Referenz: ein eigener Durchlauf über alle Bilder nur für diesen Spot
+        reference = FakeTracker()
+        reference.init(frames[0], (spot[0]-tracking.OVERSIZE, spot[1]-tracking.OVERSIZE,
+                                   spot[2]+tracking.OVERSIZE, spot[3]+tracking.OVERSIZE))
+        for image in frames[1:]:
+            success, box = reference.update(cv2.cvtColor(image, cv2.COLOR_GRAY2BGR))
+
+        assert all(np.array_equal(a, b) for a, b in zip(shared.seen, reference.seen))
+        assert (track["x1"], track["y1"]) == (int(spot[0] + spot[2] / 2), int(spot[1] + spot[3] / 2))
+        assert (track["x2"], track["y2"]) == (int(box[0] + box[2] / 2), int(box[1] + box[3] / 2))
+    assert tracks[0]["x2"] == 80 + 3 * 5
+
+
+def test_track_spots_records_trajectory(monkeypatch):
+    """Testet, ob die Positionen aller Spots in jedem Bild aufgezeichnet werden (NaN nach Verlust)."""
+    class LosingTracker(FakeTracker):
+        # Verliert den Spot ab dem vierten Bild
+        def update(self, image):
+            success, box = super().update(image)
+            return len(self.seen) < 3, box
+
+    created = []
+
+    def fake_create():
+        created.append((FakeTracker if not created else LosingTracker)())
+        return created[-1]
+
+    monkeypatch.setattr(tracking.cv2, "TrackerMIL_create", fake_create)
+    frames = _moving_spots(n_frames=70, shift=1)
+    bbox = [(68, 88, 24, 24), (135, 185, 30, 30)]
+    centroids = [np.array([80.0, 100.0]), np.array([150.0, 200.0])]
+
+    tracks = track_spots(frames[0], iter(frames[1:]), bbox, centroids)
+
+    first, second = tracks[0]["trajectory"], tracks[1]["trajectory"]
+    assert first.shape == second.shape == (70, 2)
+    assert first.base is second.base  # Ansichten auf ein gemeinsames Array
+    np.testing.assert_array_equal(first[:, 0], 80 + np.arange(70))
+    np.testing.assert_array_equal(first[:, 1], 100)
+    assert tuple(second[0]) == (150, 200)
+    assert np.all(~np.isnan(second[:3])) and np.all(np.isnan(second[3:]))
+
+
+def test_track_spots_abort():
+    """Testet, ob der Callback das Tracking abbrechen kann."""
+    frames = _moving_spots()
+    calls = []
+
+    def on_frame(frame_index, tracks, frame_bgr):
+        calls.append(frame_index)
+        return False
+
+    assert track_spots(frames[0], iter(frames[1:]), [(68, 88, 24, 24)], [(80, 100)], on_frame) is None
+    assert calls == [1]
+
+
+def _write_trace(root, frames, trace=1):
+    """Schreibt eine Bildserie als Trace-Ordner 'data/TR_0X' mit passender names.txt."""
+    from astropy.io import fits
+
+    trace_dir = root / "data" / f"TR_0{trace}"
+    trace_dir.mkdir(parents=True)
+    names = []
+    for k, image in enumerate(frames):
+        header = fits.Header()
+        header["RSUN_OBS"] = 140.0
+        header["CDELT1"] = 1.0
+        header["CRPIX1"] = image.shape[1] // 2
+        header["CRPIX2"] = image.shape[0] // 2
+        name = f"frame_{k:03d}.fits"
+        fits.HDUList([fits.PrimaryHDU(),
+                      fits.CompImageHDU(image.astype(np.float32), header=header,
+                                        compression_type="RICE_1")]).writeto(trace_dir / name)
+        names.append(name)
+    (trace_dir / "names.txt").write_text("\n".join(names) + "\n")
+    return trace_dir
+
+
+def test_run_tracking_headless_saves_tracks(monkeypatch, tmp_path):
+    """
+    Testet, ob run_tracking ohne Interaktion keine GUI-Funktionen aufruft und
+    die erfolgreich verfolgten Spots speichert.
+    """
+    def no_gui(*args, **kwargs):
+        raise AssertionError("Im Headless-Modus darf keine GUI-Funktion aufgerufen werden.")
+
+    for name in ("namedWindow", "imshow", "waitKey", "destroyWindow", "destroyAllWindows"):
+        monkeypatch.setattr(tracking.cv2, name, no_gui)
+    monkeypatch.setattr(tracking.cv2, "TrackerMIL_create", FakeTracker)
+
+    frames = []
+    for k in range(4):
+        image = np.full((300, 300), 220, dtype=np.uint8)
+        cv2.circle(image, (110 + 2 * k, 150), 22, 30, thickness=-1)
+        image[150, 110 + 2 * k] = 0
+        frames.append(image)
+    trace_dir = _write_trace(tmp_path, frames)
+    monkeypatch.chdir(tmp_path)
+
+    accepted = tracking.run_tracking(trace=1, interactive=False)
+
+    assert len(accepted) == 1
+    saved = np.genfromtxt(trace_dir / "data_points.csv", delimiter=",", skip_header=True)
+    assert saved.shape == (5,)
+    assert saved[2] == accepted[0]["x2"]
+    assert saved[4] == 3
+    from solar_tracking.track_store import TrackStore
+    [(rows, positions, time)] = list(TrackStore().trajectories(trace=1))
+    assert rows["x2"][0] == accepted[0]["x2"]
+    assert positions.shape == (4, 1, 2)
+    assert positions[-1, 0, 0] == accepted[0]["x2"]
+    assert list(time) == [0, 1, 2, 3]
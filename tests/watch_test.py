@@ -0,0 +1,202 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from solar_tracking.fitting import fit_func
+from solar_tracking.header_index import trace_header_index
+from solar_tracking.linking import step_hours
+from solar_tracking.rotation_analysis import fit_rotation_rates, trajectory_lon_and_lat
+from solar_tracking.synthetic import DIFFERENTIAL_ROTATION, SPOT_DTYPE, write_synthetic_trace
+from solar_tracking.track_store import TrackStore
+from solar_tracking.watch import TraceWatcher, watch_trace
+
+
+@pytest.fixture
+def trace_dir(tmp_path, monkeypatch):
+    """Leerer Trace-Ordner 'data/TR_01' im Arbeitsverzeichnis tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    directory = tmp_path / "data" / "TR_01"
+    directory.mkdir(parents=True)
+    return directory
+
+
+def _drop(paths, directory):
+    for path in paths:
+        shutil.copy(path, directory / path.name)
+
+
+def test_watch_processes_only_new_files(trace_dir, tmp_path):
+    """
+    Testet, ob neue Dateien inkrementell verarbeitet werden, unvollständige Dateien
+    warten und die fortgeschriebenen Rotationsraten der Anpassung aller Bilder entsprechen.
+    """
+    paths, _, _, _ = write_synthetic_trace(tmp_path / "stage", n_frames=6, size=1024, cadence=6)
+    watcher = TraceWatcher(1, tracker="roi")
+    assert watcher.poll() == 0
+
+    _drop(paths[:3], trace_dir)
+    (trace_dir / paths[3].name).write_bytes(paths[3].read_bytes()[:5000])  # noch im Schreiben
+    assert watcher.poll() == 3
+    assert len(watcher.session.tracks) == 5
+    assert watcher.poll() == 0
+
+    _drop(paths[3:], trace_dir)
+    assert watcher.poll() == 3
+    assert (trace_dir / "names.txt").read_text().split() == [path.name for path in paths]
+    assert np.all(watcher.omegas["active"]) and np.all(watcher.omegas["frames"] == 6)
+    omegas = watcher.omegas
+    watcher.close()
+
+    rows, positions, time = next(TrackStore().trajectories(trace=1))
+    np.testing.assert_allclose(time, [0, 6, 12, 18, 24, 30])
+    lat, lon = trajectory_lon_and_lat(positions, trace_header_index(1))
+    omega, omega_err = fit_rotation_rates(time, lon)
+    np.testing.assert_allclose(omegas["omega"], omega, atol=1e-9)
+    np.testing.assert_allclose(omegas["omega_err"], omega_err, rtol=1e-6)
+    expected = fit_func(omegas["lat"], *DIFFERENTIAL_ROTATION)
+    np.testing.assert_allclose(omegas["omega"], expected, atol=0.1)
+
+    saved = np.genfromtxt(trace_dir / "watch_omega.csv", delimiter=",", names=True)
+    assert not saved["active"].any() and len(saved) == 5
+
+
+def test_watch_adds_and_finishes_spots(trace_dir, tmp_path):
+    """Testet, ob neu erscheinende Spots aufgenommen und verschwundene abgeschlossen und gespeichert werden."""
+    no_spots = np.zeros(0, dtype=SPOT_DTYPE)
+    empty, _, _, _ = write_synthetic_trace(tmp_path / "a", n_frames=2, size=1024, cadence=6, spots=no_spots)
+    spotted, _, _, _ = write_synthetic_trace(tmp_path / "b", n_frames=4, size=1024, cadence=6,
+                                             start="2023-11-23T12:00:00")
+    gone, _, _, _ = write_synthetic_trace(tmp_path / "c", n_frames=2, size=1024, cadence=6,
+                                          start="2023-11-24T12:00:00", spots=no_spots)
+
+    watcher = watch_trace(1, interval=0, polls=1, tracker="roi")
+    assert watcher.n_frames == 0
+
+    watcher = TraceWatcher(1, tracker="roi", min_frames=3)
+    _drop(empty, trace_dir)
+    assert watcher.poll() == 2 and watcher.session.tracks == []
+    _drop(spotted, trace_dir)
+    watcher.poll()
+    assert len(watcher.session.tracks) == 5
+    assert len(TrackStore().read(trace=1)) == 0
+
+    _drop(gone, trace_dir)
+    watcher.poll()
+    assert watcher.session.tracks == []
+    rows, positions, time = next(TrackStore().trajectories(trace=1))
+    assert len(rows) == 5 and np.all(rows["delta_time"] == 18)
+    np.testing.assert_allclose(time, [12, 18, 24, 30])
+    assert not np.isnan(positions).any()
+    assert not watcher.omegas["active"].any()
+    saved = np.genfromtxt(trace_dir / "data_points.csv", delimiter=",", skip_header=True)
+    np.testing.assert_allclose(saved[:, 4], 18)
+    assert saved.shape == (5, 5)
+
+
+def test_watch_skips_out_of_order_file_once(trace_dir, tmp_path, capsys):
+    """Testet, ob eine verspätete ältere Datei einmal gemeldet und danach nicht mehr betrachtet wird."""
+    paths, _, _, _ = write_synthetic_trace(tmp_path / "stage", n_frames=3, size=1024, cadence=6)
+    watcher = TraceWatcher(1, tracker="roi")
+    _drop(paths[1:], trace_dir)
+    assert watcher.poll() == 2
+    _drop(paths[:1], trace_dir)
+    assert watcher.pending() == [] and watcher.pending() == []
+    assert capsys.readouterr().out.count("Warnung") == 1
+
+
+def test_watch_session_after_close_uses_own_time_steps(trace_dir, tmp_path):
+    """Testet, ob eine nach close neu begonnene Session bei unregelmäßiger Kadenz die echten Zeitschritte vorhersagt."""
+    first, _, _, _ = write_synthetic_trace(tmp_path / "a", n_frames=3, size=1024, cadence=6)
+    second, _, _, _ = write_synthetic_trace(tmp_path / "b", n_frames=3, size=1024, cadence=2,
+                                            start="2023-11-24T00:00:00")
+    watcher = TraceWatcher(1, tracker="roi")
+    _drop(first, trace_dir)
+    assert watcher.poll() == 3
+    watcher.close()
+
+    _drop(second, trace_dir)
+    assert watcher.poll() == 3
+    session = watcher.session
+    assert session.n_frames == 3
+    assert [step_hours(6.0, session.frame_hours, frame) for frame in (1, 2)] == [2.0, 2.0]
+
+
+def test_watch_restart_continues_without_duplicates(trace_dir, tmp_path):
+    """
+    Testet, ob ein neu gestarteter Watcher nach dem letzten Checkpoint fortsetzt:
+    keine Datei wird erneut verarbeitet und kein Spot doppelt gespeichert.
+    """
+    paths, _, _, _ = write_synthetic_trace(tmp_path / "stage", n_frames=6, size=1024, cadence=6)
+    _drop(paths[:3], trace_dir)
+    watcher = TraceWatcher(1, tracker="roi")
+    assert watcher.poll() == 3
+    del watcher  # Abbruch ohne close
+
+    _drop(paths[3:], trace_dir)
+    watcher = TraceWatcher(1, tracker="roi")
+    assert watcher.n_frames == 3 and len(watcher.session.tracks) == 5
+    assert watcher.poll() == 3
+    watcher.close()
+    rows = TrackStore().read(trace=1)
+    assert len(rows) == 5 and np.all(rows["delta_time"] == 30)
+
+    # Nach close: nichts Neues, nichts doppelt
+    watcher = TraceWatcher(1, tracker="roi")
+    assert watcher.poll() == 0
+    watcher.close()
+    assert len(TrackStore().read(trace=1)) == 5
+    assert len(np.genfromtxt(trace_dir / "data_points.csv", delimiter=",", skip_header=True)) == 5
+    with pytest.raises(ValueError):
+        TraceWatcher(1, tracker="link")
+
+
+def test_watch_resaves_pending_spots_once(trace_dir, tmp_path, monkeypatch):
+    """Testet, ob Spots, deren Speichern abgebrochen wurde, beim Neustart genau einmal gespeichert werden."""
+    paths, _, _, _ = write_synthetic_trace(tmp_path / "stage", n_frames=4, size=1024, cadence=6)
+    _drop(paths, trace_dir)
+    watcher = TraceWatcher(1, tracker="roi")
+    watcher.poll()
+    for spot_id in list(watcher._spots):
+        watcher._finish(spot_id)
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setattr(TrackStore, "append_csv", lambda *args: (_ for _ in ()).throw(KeyboardInterrupt))
+        watcher._commit()  # Block gespeichert, danach abgebrochen
+    assert len(TrackStore().read(trace=1)) == 5
+
+    restarted = TraceWatcher(1, tracker="roi")  # wiederholt das Speichern aus dem Checkpoint
+    assert len(TrackStore().read(trace=1)) == 5
+    # Die Raten der abgeschlossenen Spots kommen aus watch_omega.csv
+    assert len(restarted.omegas) == 5 and not restarted.omegas["active"].any()
+
+
+def test_watch_checkpoint_does_not_grow(trace_dir, tmp_path):
+    """Testet, ob der Checkpoint mit der Zahl der verarbeiteten Bilder nicht wächst."""
+    paths, _, _, _ = write_synthetic_trace(tmp_path / "stage", n_frames=6, size=1024, cadence=6,
+                                           spots=np.zeros(0, dtype=SPOT_DTYPE))
+    watcher = TraceWatcher(1, tracker="roi")
+    sizes = []
+    for path in paths:
+        _drop([path], trace_dir)
+        assert watcher.poll() == 1
+        sizes.append((trace_dir / "watch_checkpoint.pkl").stat().st_size)
+    assert len(set(sizes[2:])) == 1
+    assert len(watcher._hours._hours) == 1
+
+
+def test_watch_lists_directory_only_when_changed(trace_dir, tmp_path, monkeypatch):
+    """Testet, ob pending den Ordner nur nach einer Änderung neu liest."""
+    paths, _, _, _ = write_synthetic_trace(tmp_path / "stage", n_frames=2, size=1024, cadence=6)
+    _drop(paths[:1], trace_dir)
+    os.utime(trace_dir, ns=(0, 10**9))
+    watcher = TraceWatcher(1, tracker="roi")
+    assert watcher.poll() == 1
+    os.utime(trace_dir, ns=(0, 10**9))  # names.txt und der Checkpoint haben den Ordner geändert
+    assert len(watcher.pending()) == 0
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+    assert watcher.pending() == [] and not scans
+    _drop(paths[1:], trace_dir)
+    assert len(watcher.pending()) == 1 and len(scans) == 1